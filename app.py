@@ -1,12 +1,24 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, g, Response
+import os
 import uuid
+import time
+import hashlib
+import threading
+from functools import wraps
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from config import Config
 from database.db import validate_empleado, get_all_productos, get_categorias, guardar_venta, get_venta_by_id, guardar_cierre_caja, get_ventas_por_cajero_hoy, get_cierres_caja_by_cajero, get_ventas_by_cajero, buscar_cliente_por_correo, crear_cliente, get_all_clientes, get_ventas_by_cajero_turno, get_resumen_ventas_turno
-from database.db import get_descuento_activo_cliente, eliminar_descuento_permanente
-from database.redis_client import save_session, get_session, save_caja_inicial, save_orden, get_all_ordenes, get_orden, delete_orden, update_orden_status, actualizar_caja, get_caja_actual, get_ordenes_pendientes, get_caja_inicial_original, set_caja_inicial_original, get_fecha_inicio_sesion, set_fecha_inicio_sesion, limpiar_sesion_completa
+from database.db import get_descuento_activo_cliente, registrar_pago, get_clientes_por_ids, VentaDuplicada
+from database.historial_ordenes import iniciar_historial_ordenes
+from database.catalogo import get_productos_catalogo, get_categorias_catalogo, get_version_catalogo, compactar_items, expandir_orden, resumir_ordenes, calcular_puntos_orden
+from database.redis_client import save_session, get_session, get_estado_sesion, abrir_caja, save_orden, get_all_ordenes, get_orden, actualizar_caja, cobrar_en_caja, get_caja_actual, get_ordenes_pendientes, limpiar_sesion_completa
+from database.redis_client import marcar_orden_vista, registrar_evento_orden, get_eventos_ordenes_desde, get_snapshot_ordenes, transicionar_orden, cerrar_orden_pagada, barrer_ordenes_expiradas
+from database.redis_client import reservar_idempotencia, guardar_respuesta_idempotente, liberar_idempotencia
 from datetime import datetime
-from utils.pdf_generator import generar_recibo_pdf
+from utils.recibo_cache import buscar_recibo, precalentar_recibo
+from utils.pdf_trabajos import enviar_trabajo, generar_pdf, get_estado_trabajo, get_pdf_trabajo
+from utils.escpos import generar_recibo_escpos
+from utils.impresion import impresora_configurada, imprimir_recibo, imprimir_comanda, get_trabajo
 from routes.admin_routes import admin_bp
 from routes.gerente_routes import gerente_bp
 import io
@@ -14,8 +26,172 @@ import io
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Configurar SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# Configurar SocketIO (con cola en Redis para poder correr varios workers)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode='threading',
+    message_queue=Config.SOCKETIO_MESSAGE_QUEUE or None,
+    channel=Config.SOCKETIO_CHANNEL
+)
+
+def publicar_evento_orden(tipo, orden_id, **datos):
+    """
+    Registra el cambio de la orden (con su número de secuencia) y lo envía a
+    cocina y cajas. El mismo evento llega después al historial en PostgreSQL.
+    """
+    try:
+        evento = registrar_evento_orden(tipo, orden_id, **datos)
+        socketio.emit('orden_evento', evento, to=['cocineros', 'cajeros'])
+    except Exception as e:
+        # La orden ya se guardó; las pantallas se ponen al día al reconectarse
+        print(f"Error al publicar evento de orden: {e}")
+
+_barrido_pid = None
+_barrido_lock = threading.Lock()
+
+def _barrer_ordenes():
+    """Hilo de fondo: avisa a cocina y cajas de las órdenes que expiraron sin pagarse"""
+    while True:
+        time.sleep(Config.ORDENES_BARRIDO_SEG)
+        try:
+            for orden_id in barrer_ordenes_expiradas():
+                publicar_evento_orden('expirada', orden_id)
+        except Exception as e:
+            print(f"Error al barrer órdenes expiradas: {e}")
+
+def iniciar_barrido_ordenes():
+    """Arranca el barrido de órdenes expiradas una vez por proceso"""
+    global _barrido_pid
+
+    with _barrido_lock:
+        if _barrido_pid == os.getpid():
+            return
+        threading.Thread(target=_barrer_ordenes, name='barrido-ordenes', daemon=True).start()
+        _barrido_pid = os.getpid()
+
+def _clientes_de_ordenes(ordenes):
+    """Clientes de las órdenes en una sola consulta, cacheados durante la petición"""
+    cache = g.setdefault('clientes_ordenes', {})
+    faltantes = set()
+    for orden in ordenes:
+        try:
+            cliente_id = int(orden.get('cliente_id') or 0)
+        except (TypeError, ValueError):
+            continue
+        if cliente_id and cliente_id not in cache:
+            faltantes.add(cliente_id)
+    
+    if faltantes:
+        cache.update(get_clientes_por_ids(faltantes))
+        # Recordar también los que no existen para no volver a consultarlos
+        for cliente_id in faltantes:
+            cache.setdefault(cliente_id, None)
+    return cache
+
+def enriquecer_ordenes(ordenes):
+    """Agrega a cada orden el nombre, puntos y descuento activo de su cliente"""
+    try:
+        clientes = _clientes_de_ordenes(ordenes)
+    except Exception as e:
+        # Sin datos del cliente la orden sigue siendo útil
+        print(f"Error al obtener clientes de las órdenes: {e}")
+        return ordenes
+    
+    for orden in ordenes:
+        try:
+            cliente = clientes.get(int(orden.get('cliente_id') or 0))
+        except (TypeError, ValueError):
+            cliente = None
+        if cliente:
+            orden['cliente_nombre'] = cliente['nombre']
+            orden['cliente_puntos'] = cliente['puntos_acumulados']
+            orden['cliente_descuento'] = cliente['porcentaje_descuento']
+    return ordenes
+
+def orden_no_disponible(estado, accion='pagar'):
+    """Respuesta para una orden que ya no está pendiente"""
+    if estado is None:
+        return jsonify({'success': False, 'message': 'Orden no encontrada'}), 404
+    if estado == 'cobrando':
+        return jsonify({'success': False, 'message': 'La orden se está cobrando en otra caja'}), 409
+    return jsonify({'success': False, 'message': f'No se puede {accion} una orden {estado}'}), 400
+
+# Evento que avisa a cocina, cajas e historial de cada cambio de estado
+EVENTO_POR_ESTADO = {'cobrando': 'cobrando', 'pendiente': 'reabierta', 'cancelada': 'cancelada'}
+
+def cambiar_estado_orden(orden_id, desde, hacia):
+    """Cambia el estado de la orden (compare-and-set) y, si se aplicó, publica el evento"""
+    hecho, estado = transicionar_orden(orden_id, desde, hacia)
+    if hecho:
+        publicar_evento_orden(EVENTO_POR_ESTADO[hacia], orden_id)
+    return hecho, estado
+
+def cerrar_orden_cobrada(orden_id):
+    """La venta ya está en PostgreSQL: saca la orden de Redis y avisa a las pantallas"""
+    try:
+        if cerrar_orden_pagada(orden_id):
+            publicar_evento_orden('pagada', orden_id)
+    except Exception as e:
+        # Si quedó en Redis, el próximo intento de cobro choca con la venta única y la cierra
+        print(f"Error al cerrar orden pagada {orden_id}: {e}")
+
+IDEMPOTENCIA_MAX_CLAVE = 128
+
+def _guardar_respuesta(alcance, clave, huella, respuesta, cuerpo):
+    try:
+        guardar_respuesta_idempotente(alcance, clave, huella, respuesta.status_code, cuerpo, respuesta.mimetype)
+    except Exception as e:
+        print(f"Error al guardar respuesta idempotente: {e}")
+
+def idempotente(vista):
+    """
+    Ejecuta la ruta una sola vez por Idempotency-Key y sesión: los reintentos
+    de la caja reciben la primera respuesta exitosa sin repetir el trabajo.
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        clave = request.headers.get('Idempotency-Key')
+        session_id = session.get('session_id')
+        if not clave or not session_id:
+            return vista(*args, **kwargs)
+        if len(clave) > IDEMPOTENCIA_MAX_CLAVE:
+            return jsonify({'success': False, 'message': 'Idempotency-Key inválido'}), 400
+        
+        alcance = f"{request.endpoint}:{session_id}"
+        huella = hashlib.sha256(request.get_data()).hexdigest()
+        try:
+            previo = reservar_idempotencia(alcance, clave, huella)
+        except Exception as e:
+            # Sin Redis la ruta tampoco puede trabajar; que ella reporte el error
+            print(f"Error al reservar Idempotency-Key: {e}")
+            return vista(*args, **kwargs)
+        
+        if previo:
+            if previo.get('huella') != huella:
+                return jsonify({'success': False, 'message': 'El Idempotency-Key ya se usó con otra petición'}), 422
+            if previo['estado'] != 'completado':
+                return jsonify({'success': False, 'message': 'La petición ya se está procesando'}), 409, {'Retry-After': '1'}
+            respuesta = Response(previo['cuerpo'], status=previo['status'], mimetype=previo['mimetype'])
+            respuesta.headers['Idempotent-Replayed'] = 'true'
+            return respuesta
+        
+        respuesta = app.make_response(vista(*args, **kwargs))
+        
+        if 400 <= respuesta.status_code < 500:
+            # Rechazo sin efectos (pago insuficiente, orden vacía...): el reintento puede corregirlo
+            try:
+                liberar_idempotencia(alcance, clave)
+            except Exception as e:
+                print(f"Error al liberar Idempotency-Key: {e}")
+        elif respuesta.status_code < 400:
+            # Se guarda después de enviar la respuesta: la petición solo paga la reserva
+            cuerpo = respuesta.get_data(as_text=True)
+            respuesta.call_on_close(lambda: _guardar_respuesta(alcance, clave, huella, respuesta, cuerpo))
+        # Con un 500 la reserva se deja expirar: el error pudo dejar efectos a medias
+        return respuesta
+    
+    return envoltura
 
 
 app.register_blueprint(admin_bp)
@@ -65,12 +241,8 @@ def set_caja():
     except (ValueError, TypeError):
         return jsonify({'success': False, 'message': 'Monto inválido'}), 400
     
-    # Guardar monto inicial
-    save_caja_inicial(session_id, monto)
-    # Guardar monto inicial original (sin modificar)
-    set_caja_inicial_original(session_id, monto)
-    # Guardar fecha de inicio
-    set_fecha_inicio_sesion(session_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    # Guardar monto inicial, caja actual y fecha de inicio del turno
+    abrir_caja(session_id, monto, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
     
     return jsonify({'success': True, 'message': 'Caja inicial guardada'})
 
@@ -143,8 +315,8 @@ def cajero():
     # Detectar si es gerente usando el cajero
     es_gerente = empleado['rol'] == 'gerente'
     
-    categorias = get_categorias()
-    productos = get_all_productos()
+    categorias = get_categorias_catalogo()
+    productos = get_productos_catalogo()
     
     return render_template('cajero.html', 
                          empleado=empleado, 
@@ -158,10 +330,11 @@ def get_productos():
     if not session_id:
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
-    productos = get_all_productos()
+    productos = get_productos_catalogo()
     return jsonify({'success': True, 'productos': productos})
 
 @app.route('/api/crear-orden', methods=['POST'])
+@idempotente
 def crear_orden():
     session_id = session.get('session_id')
     if not session_id:
@@ -187,8 +360,14 @@ def crear_orden():
         # Generar ID único para la orden
         orden_id = str(uuid.uuid4())
         
+        # Renglones compactos contra el catálogo vigente
+        try:
+            items = compactar_items(items)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
         # Calcular total
-        total = sum(item['precio'] * item['cantidad'] for item in items)
+        total = sum(precio * cantidad for _, cantidad, precio, *_ in items)
         
         # Crear objeto de orden
         orden = {
@@ -196,6 +375,7 @@ def crear_orden():
             'cajero': empleado['nombre'],
             'cajero_id': empleado['id'],
             'items': items,
+            'catalogo_version': get_version_catalogo(),
             'total': float(total),
             'status': 'pendiente',
             'fecha': datetime.now().isoformat(),
@@ -207,10 +387,11 @@ def crear_orden():
         save_orden(orden_id, orden)
         
         # EMITIR EVENTO DE SOCKET PARA COCINEROS
-        socketio.emit('nueva_orden', {
-            'orden_id': orden_id,
-            'orden': orden
-        }, room='cocineros')
+        publicar_evento_orden('creada', orden_id, orden=enriquecer_ordenes(resumir_ordenes([orden]))[0])
+        
+        # Comanda impresa en cocina (si hay impresora configurada)
+        if impresora_configurada(Config.IMPRESORA_COCINA):
+            imprimir_comanda(expandir_orden(orden))
         
         return jsonify({
             'success': True,
@@ -233,9 +414,10 @@ def listar_ordenes():
     if not session_id:
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
-    # Obtener solo órdenes pendientes
-    ordenes = get_ordenes_pendientes()
-    return jsonify({'success': True, 'ordenes': ordenes})
+    # Obtener solo órdenes pendientes (con la secuencia para seguir por eventos)
+    # y los datos de sus clientes en una sola consulta
+    seq, ordenes = get_snapshot_ordenes()
+    return jsonify({'success': True, 'ordenes': enriquecer_ordenes(resumir_ordenes(ordenes)), 'seq': seq})
 
 @app.route('/api/orden/<orden_id>', methods=['GET'])
 def obtener_orden(orden_id):
@@ -247,9 +429,10 @@ def obtener_orden(orden_id):
     if not orden:
         return jsonify({'success': False, 'message': 'Orden no encontrada'}), 404
     
-    return jsonify({'success': True, 'orden': orden})
+    return jsonify({'success': True, 'orden': expandir_orden(orden)})
 
 @app.route('/api/procesar-pago', methods=['POST'])
+@idempotente
 def procesar_pago():
     session_id = session.get('session_id')
     if not session_id:
@@ -264,8 +447,6 @@ def procesar_pago():
     pago_con = data.get('pago_con')
     cliente_id = data.get('cliente_id')
     descuento_id = data.get('descuento_id')
-    descuento_porcentaje = data.get('descuento_porcentaje')
-    total_original = data.get('total_original')
     
     # Validar datos
     try:
@@ -278,8 +459,12 @@ def procesar_pago():
     if not orden:
         return jsonify({'success': False, 'message': 'Orden no encontrada'}), 404
     
-    if orden.get('status') == 'pagada':
-        return jsonify({'success': False, 'message': 'Esta orden ya fue pagada'}), 400
+    # 'cobrando' sigue al compare-and-set: un cobro abandonado se puede retomar
+    if orden.get('status', 'pendiente') not in ('pendiente', 'cobrando'):
+        return orden_no_disponible(orden['status'])
+    
+    # Renglones con nombre, costo y puntos para la venta
+    orden = expandir_orden(orden)
     
     # Usar cliente_id de la orden si existe y no viene del frontend
     if not cliente_id and orden.get('cliente_id'):
@@ -297,8 +482,11 @@ def procesar_pago():
             descuento = get_descuento_activo_cliente(cliente_id)
             
             if descuento and descuento['id'] == descuento_id:
-                # Calcular descuento
-                total_sin_descuento = float(total_original) if total_original else total_final
+                # Calcular descuento sobre el total de la orden y el porcentaje
+                # vigente, no sobre los que manda el navegador
+                descuento_porcentaje = descuento['porcentaje_descuento']
+                total_original = total_final
+                total_sin_descuento = total_final
                 descuento_monto = (total_sin_descuento * float(descuento_porcentaje)) / 100
                 total_final = total_sin_descuento - descuento_monto
                 descuento_aplicado = True
@@ -322,17 +510,23 @@ def procesar_pago():
     # Calcular cambio
     cambio = pago_con - total_final
     
-    # Verificar que hay suficiente efectivo para dar cambio
-    if cambio > 0:
-        caja_actual = get_caja_actual(session_id)
-        if caja_actual is not None:
-            caja_despues_cambio = caja_actual + total_final - cambio
-            if caja_despues_cambio < 0:
-                return jsonify({
-                    'success': False,
-                    'message': f'No hay suficiente efectivo en caja para dar cambio.\nCambio requerido: ${cambio:.2f}\nEfectivo disponible: ${caja_actual:.2f}\nPor favor solicite un monto más cercano al total.'
-                }), 400
+    # Tomar la orden para cobrarla: si otra caja (u otro clic) ya la tiene,
+    # este intento falla sin tocar la caja
+    tomada, estado = cambiar_estado_orden(orden_id, 'pendiente', 'cobrando')
+    if not tomada:
+        return orden_no_disponible(estado)
+    
+    # Verificar que hay efectivo para el cambio y sumar el total a la caja en
+    # un solo paso atómico (dos cobros simultáneos no pueden pisarse)
+    cobrado, caja_actualizada = cobrar_en_caja(session_id, total_final, cambio)
+    if not cobrado:
+        cambiar_estado_orden(orden_id, 'cobrando', 'pendiente')
+        return jsonify({
+            'success': False,
+            'message': f'No hay suficiente efectivo en caja para dar cambio.\nCambio requerido: ${cambio:.2f}\nEfectivo disponible: ${caja_actualizada:.2f}\nPor favor solicite un monto más cercano al total.'
+        }), 400
     
+    venta_id = None
     try:
         # Combinar notas de la orden con notas del descuento
         notas_finales = orden.get('notas', '')
@@ -342,46 +536,47 @@ def procesar_pago():
             else:
                 notas_finales = notas_descuento
         
-        # Guardar venta en PostgreSQL
-        venta_id = guardar_venta(
-            orden_id=orden_id,
-            cajero_id=empleado['id'],
-            cajero_nombre=empleado['nombre'],
-            total=total_final,
-            pago_con=pago_con,
-            cambio=cambio,
-            items=orden['items'],
-            cliente_id=cliente_id,
-            notas=notas_finales
-        )
-        
         # Calcular puntos ganados (5% del total) - SOLO para pago con efectivo
-        puntos_ganados = 0
-        puntos_nuevos = None
-        if cliente_id:
-            from database.db import agregar_puntos_cliente
-            puntos_ganados = int(total_final * 0.05)  # 5% en puntos del total con descuento
-            puntos_nuevos = agregar_puntos_cliente(cliente_id, puntos_ganados)
-        
-        # Si hubo descuento, eliminarlo de la base de datos
-        if descuento_aplicado and descuento_id:
-            try:
-                eliminar_descuento_permanente(descuento_id)
-                print(f"Descuento {descuento_id} eliminado exitosamente")
-            except Exception as e:
-                print(f"Error al eliminar descuento: {e}")
-                # No fallar la transacción si hay error al eliminar el descuento
+        puntos_ganados = int(total_final * 0.05) if cliente_id else 0  # 5% en puntos del total con descuento
         
-        # Actualizar monto en caja (sumar el total de la venta)
-        caja_actualizada = actualizar_caja(session_id, total_final)
+        # Guardar venta, sumar puntos y eliminar el descuento usado en una sola transacción
+        try:
+            venta_id, puntos_nuevos = registrar_pago(
+                orden_id=orden_id,
+                cajero_id=empleado['id'],
+                cajero_nombre=empleado['nombre'],
+                total=total_final,
+                pago_con=pago_con,
+                cambio=cambio,
+                items=orden['items'],
+                cliente_id=cliente_id,
+                notas=notas_finales,
+                puntos=puntos_ganados,
+                descuento_id=descuento_id if descuento_aplicado else None
+            )
+        except VentaDuplicada:
+            # Otra caja retomó la orden (pasó COBRO_PLAZO) y la cobró primero:
+            # regresar el efectivo de esta caja y cerrar la orden en Redis
+            if caja_actualizada is not None:
+                actualizar_caja(session_id, -total_final)
+            cerrar_orden_cobrada(orden_id)
+            return jsonify({'success': False, 'message': 'La orden ya fue cobrada en otra caja'}), 409
         
-        # Actualizar estado de orden en Redis
-        update_orden_status(orden_id, 'pagada')
+        # La venta ya está en PostgreSQL: cerrar la orden en Redis
+        cerrar_orden_cobrada(orden_id)
+        
+        # Con impresora de recibos se imprime directo en ESC/POS; si no, se prepara el PDF
+        trabajo_impresion = None
+        if impresora_configurada(Config.IMPRESORA_RECIBOS):
+            trabajo_impresion = imprimir_recibo(venta_id)
+        else:
+            precalentar_recibo(venta_id)
         
         response_data = {
             'success': True,
             'message': 'Pago procesado exitosamente',
             'venta_id': venta_id,
+            'trabajo_impresion': trabajo_impresion,
             'cambio': cambio,
             'caja_actual': caja_actualizada,
             'puntos_ganados': puntos_ganados if cliente_id else None,
@@ -401,6 +596,12 @@ def procesar_pago():
         print(f"Error al procesar pago: {e}")
         import traceback
         traceback.print_exc()
+        # Si la venta no se guardó, regresar a la caja lo que se sumó y
+        # dejar la orden otra vez pendiente
+        if venta_id is None:
+            if caja_actualizada is not None:
+                actualizar_caja(session_id, -total_final)
+            cambiar_estado_orden(orden_id, 'cobrando', 'pendiente')
         return jsonify({
             'success': False,
             'message': 'Error al procesar el pago'
@@ -413,26 +614,34 @@ def generar_recibo(venta_id):
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
     try:
-        # Obtener datos de la venta
-        venta = get_venta_by_id(venta_id)
+        # Obtener el PDF de la caché o generarlo en el pool de procesos de PDF
+        pdf, tiempos = buscar_recibo(venta_id)
         
-        if not venta:
-            return jsonify({'success': False, 'message': 'Venta no encontrada'}), 404
-        
-        # Generar PDF
-        pdf = generar_recibo_pdf(venta)
+        if pdf is None:
+            if not get_venta_by_id(venta_id):
+                return jsonify({'success': False, 'message': 'Venta no encontrada'}), 404
+            
+            pdf, estado = generar_pdf('recibo', venta_id=venta_id)
+            if estado is None:
+                return jsonify({'success': False, 'message': 'Hay demasiados PDFs en cola, intente de nuevo'}), 503
+            if pdf is None:
+                return jsonify({'success': False, 'message': 'Error al generar el recibo'}), 500
+            # Espera en cola, etapas del render en el proceso de PDF y el total del trabajo
+            tiempos = {'espera': estado['espera_ms'], **(estado.get('tiempos') or {}), 'render': estado['render_ms']}
         
         # Crear nombre de archivo
         fecha = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"recibo_{venta_id}_{fecha}.pdf"
         
-        # Enviar PDF como respuesta
-        return send_file(
+        # Enviar PDF como respuesta (con los tiempos de cada etapa en Server-Timing)
+        response = send_file(
             io.BytesIO(pdf),
             mimetype='application/pdf',
             as_attachment=True,
             download_name=filename
         )
+        response.headers['Server-Timing'] = ', '.join(f"{etapa};dur={ms}" for etapa, ms in tiempos.items())
+        return response
         
     except Exception as e:
         print(f"Error al generar recibo: {e}")
@@ -441,6 +650,106 @@ def generar_recibo(venta_id):
             'message': 'Error al generar el recibo'
         }), 500
 
+@app.route('/api/pdf/recibo/<int:venta_id>', methods=['POST'])
+def enviar_trabajo_recibo(venta_id):
+    session_id = session.get('session_id')
+    if not session_id:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    trabajo_id = enviar_trabajo('recibo', venta_id=venta_id)
+    if not trabajo_id:
+        return jsonify({'success': False, 'message': 'Hay demasiados PDFs en cola, intente de nuevo'}), 503
+    
+    return jsonify({'success': True, 'trabajo_id': trabajo_id}), 202
+
+def _trabajo_pdf_autorizado(trabajo_id):
+    """Obtiene el estado del trabajo si la sesión puede verlo (los reportes solo el administrador)"""
+    session_id = session.get('session_id')
+    empleado = get_session(session_id) if session_id else None
+    if not empleado:
+        return None, (jsonify({'success': False, 'message': 'No autorizado'}), 401)
+    
+    estado = get_estado_trabajo(trabajo_id)
+    if not estado:
+        return None, (jsonify({'success': False, 'message': 'Trabajo no encontrado'}), 404)
+    if estado.get('tipo') != 'recibo' and empleado['rol'] != 'administrador':
+        return None, (jsonify({'success': False, 'message': 'No autorizado'}), 401)
+    
+    return estado, None
+
+@app.route('/api/pdf/trabajos/<trabajo_id>', methods=['GET'])
+def estado_trabajo_pdf(trabajo_id):
+    estado, error = _trabajo_pdf_autorizado(trabajo_id)
+    if error:
+        return error
+    
+    return jsonify({'success': True, 'trabajo': estado})
+
+@app.route('/api/pdf/trabajos/<trabajo_id>/descargar', methods=['GET'])
+def descargar_trabajo_pdf(trabajo_id):
+    estado, error = _trabajo_pdf_autorizado(trabajo_id)
+    if error:
+        return error
+    
+    pdf = get_pdf_trabajo(trabajo_id) if estado['estado'] == 'completado' else None
+    if pdf is None:
+        return jsonify({'success': False, 'message': f"El PDF no está listo ({estado['estado']})"}), 409
+    
+    return send_file(
+        io.BytesIO(pdf),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f"{estado['tipo']}_{trabajo_id[:8]}.pdf"
+    )
+
+@app.route('/api/generar-recibo/<int:venta_id>/escpos', methods=['GET'])
+def generar_recibo_escpos_route(venta_id):
+    session_id = session.get('session_id')
+    if not session_id:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    try:
+        venta = get_venta_by_id(venta_id)
+        if not venta:
+            return jsonify({'success': False, 'message': 'Venta no encontrada'}), 404
+        
+        return send_file(
+            io.BytesIO(generar_recibo_escpos(venta, Config.IMPRESION_COLUMNAS)),
+            mimetype='application/octet-stream',
+            as_attachment=True,
+            download_name=f"recibo_{venta_id}.bin"
+        )
+    except Exception as e:
+        print(f"Error al generar recibo ESC/POS: {e}")
+        return jsonify({'success': False, 'message': 'Error al generar el recibo'}), 500
+
+@app.route('/api/imprimir-recibo/<int:venta_id>', methods=['POST'])
+def imprimir_recibo_route(venta_id):
+    session_id = session.get('session_id')
+    if not session_id:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    impresora = data.get('impresora') or Config.IMPRESORA_RECIBOS
+    
+    if not impresora_configurada(impresora):
+        return jsonify({'success': False, 'message': f'Impresora no configurada: {impresora}'}), 400
+    
+    trabajo_id = imprimir_recibo(venta_id, impresora)
+    return jsonify({'success': True, 'message': 'Recibo enviado a la impresora', 'trabajo_id': trabajo_id})
+
+@app.route('/api/impresion/<trabajo_id>', methods=['GET'])
+def estado_impresion(trabajo_id):
+    session_id = session.get('session_id')
+    if not session_id:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    trabajo = get_trabajo(trabajo_id)
+    if not trabajo:
+        return jsonify({'success': False, 'message': 'Trabajo no encontrado'}), 404
+    
+    return jsonify({'success': True, 'trabajo': trabajo})
+
 @app.route('/api/caja-actual', methods=['GET'])
 def obtener_caja_actual():
     session_id = session.get('session_id')
@@ -463,15 +772,17 @@ def resumen_caja():
     if not session_id:
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
-    empleado = get_session(session_id)
+    # Empleado y caja en una sola lectura del hash de la sesión
+    estado = get_estado_sesion(session_id)
+    empleado = estado['empleado']
     if not empleado:
         return jsonify({'success': False, 'message': 'Sesión expirada'}), 401
     
     try:
         # Obtener información de la caja
-        monto_inicial = get_caja_inicial_original(session_id)
-        caja_actual = get_caja_actual(session_id)
-        fecha_inicio = get_fecha_inicio_sesion(session_id)
+        monto_inicial = estado['caja_inicial']
+        caja_actual = estado['caja']
+        fecha_inicio = estado['fecha_inicio']
         
         if monto_inicial is None or caja_actual is None or fecha_inicio is None:
             return jsonify({'success': False, 'message': 'No se encontró información de caja'}), 404
@@ -511,15 +822,17 @@ def cerrar_caja():
     if not session_id:
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
-    empleado = get_session(session_id)
+    # Empleado y caja en una sola lectura del hash de la sesión
+    estado = get_estado_sesion(session_id)
+    empleado = estado['empleado']
     if not empleado:
         return jsonify({'success': False, 'message': 'Sesión expirada'}), 401
     
     try:
         # Obtener información de la caja
-        monto_inicial = get_caja_inicial_original(session_id)
-        monto_final = get_caja_actual(session_id)
-        fecha_inicio = get_fecha_inicio_sesion(session_id)
+        monto_inicial = estado['caja_inicial']
+        monto_final = estado['caja']
+        fecha_inicio = estado['fecha_inicio']
         
         if monto_inicial is None or monto_final is None or fecha_inicio is None:
             return jsonify({'success': False, 'message': 'No se encontró información de caja'}), 404
@@ -621,8 +934,16 @@ def listar_clientes():
     if not session_id:
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
-    clientes = get_all_clientes()
-    return jsonify({'success': True, 'clientes': clientes})
+    try:
+        clientes, siguiente = get_all_clientes(
+            request.args.get('limite', type=int),
+            request.args.get('despues_de'),
+            request.args.get('busqueda', '').strip() or None
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({'success': True, 'clientes': clientes, 'siguiente': siguiente})
 
 
 
@@ -649,6 +970,7 @@ def obtener_cliente(cliente_id):
 
 
 @app.route('/api/procesar-pago-puntos', methods=['POST'])
+@idempotente
 def procesar_pago_puntos():
     session_id = session.get('session_id')
     if not session_id:
@@ -666,22 +988,46 @@ def procesar_pago_puntos():
     if not cliente_id:
         return jsonify({'success': False, 'message': 'Cliente requerido para pago con puntos'}), 400
     
-    if not puntos_necesarios or puntos_necesarios <= 0:
-        return jsonify({'success': False, 'message': 'Puntos necesarios inválidos'}), 400
-    
     # Obtener orden
     orden = get_orden(orden_id)
     if not orden:
         return jsonify({'success': False, 'message': 'Orden no encontrada'}), 404
     
-    if orden.get('status') == 'pagada':
-        return jsonify({'success': False, 'message': 'Esta orden ya fue pagada'}), 400
+    # 'cobrando' sigue al compare-and-set: un cobro abandonado se puede retomar
+    if orden.get('status', 'pendiente') not in ('pendiente', 'cobrando'):
+        return orden_no_disponible(orden['status'])
+    
+    # Puntos según el índice de precios, no los que calculó el navegador
+    try:
+        puntos_orden = calcular_puntos_orden(orden['items'])
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if puntos_orden <= 0:
+        return jsonify({'success': False, 'message': 'Puntos necesarios inválidos'}), 400
+    
+    try:
+        puntos_cambiaron = puntos_necesarios is not None and int(puntos_necesarios) != puntos_orden
+    except (TypeError, ValueError):
+        puntos_cambiaron = True
+    if puntos_cambiaron:
+        return jsonify({
+            'success': False,
+            'message': f'El precio en puntos de la orden cambió: ahora son {puntos_orden} pts',
+            'puntos_necesarios': puntos_orden
+        }), 409
+    puntos_necesarios = puntos_orden
+    
+    # Renglones con nombre, costo y puntos para la venta
+    orden = expandir_orden(orden)
     
     total = float(orden['total'])
+    tomada = False
+    venta_id = None
     
     try:
         # Obtener cliente y verificar puntos
-        from database.db import get_cliente_by_id, descontar_puntos_cliente
+        from database.db import get_cliente_by_id
         
         cliente = get_cliente_by_id(cliente_id)
         if not cliente:
@@ -695,9 +1041,6 @@ def procesar_pago_puntos():
                 'message': f'Puntos insuficientes. Tiene {puntos_disponibles}, necesita {puntos_necesarios}'
             }), 400
         
-        # Descontar puntos ANTES de guardar la venta
-        puntos_restantes = descontar_puntos_cliente(cliente_id, puntos_necesarios)
-        
         # Preparar desglose de productos para las notas
         desglose_puntos = []
         for item in orden['items']:
@@ -708,21 +1051,43 @@ def procesar_pago_puntos():
         
         notas_pago = f"Pago con puntos.\nPuntos usados: {puntos_necesarios}\nDesglose:\n" + "\n".join(desglose_puntos)
         
-        # Guardar venta con método de pago "puntos"
-        venta_id = guardar_venta(
-            orden_id=orden_id,
-            cajero_id=empleado['id'],
-            cajero_nombre=empleado['nombre'],
-            total=total,
-            pago_con=0,  # Pago con puntos
-            cambio=0,
-            items=orden['items'],
-            cliente_id=cliente_id,
-            notas=notas_pago
-        )
+        # Tomar la orden para cobrarla (falla si otra caja ya la está cobrando)
+        tomada, estado = cambiar_estado_orden(orden_id, 'pendiente', 'cobrando')
+        if not tomada:
+            return orden_no_disponible(estado)
         
-        # Actualizar estado de orden en Redis
-        update_orden_status(orden_id, 'pagada')
+        # Guardar venta con método de pago "puntos" y descontar los puntos en la misma transacción
+        try:
+            venta_id, puntos_restantes = registrar_pago(
+                orden_id=orden_id,
+                cajero_id=empleado['id'],
+                cajero_nombre=empleado['nombre'],
+                total=total,
+                pago_con=0,  # Pago con puntos
+                cambio=0,
+                items=orden['items'],
+                cliente_id=cliente_id,
+                notas=notas_pago,
+                puntos=-puntos_necesarios
+            )
+        except VentaDuplicada:
+            # Otra caja retomó la orden (pasó COBRO_PLAZO) y la cobró primero
+            cerrar_orden_cobrada(orden_id)
+            return jsonify({'success': False, 'message': 'La orden ya fue cobrada en otra caja'}), 409
+        except ValueError:
+            # Otro pago consumió los puntos entre la validación y la transacción
+            cambiar_estado_orden(orden_id, 'cobrando', 'pendiente')
+            return jsonify({'success': False, 'message': 'Puntos insuficientes'}), 400
+        
+        # La venta ya está en PostgreSQL: cerrar la orden en Redis
+        cerrar_orden_cobrada(orden_id)
+        
+        # Con impresora de recibos se imprime directo en ESC/POS; si no, se prepara el PDF
+        trabajo_impresion = None
+        if impresora_configurada(Config.IMPRESORA_RECIBOS):
+            trabajo_impresion = imprimir_recibo(venta_id)
+        else:
+            precalentar_recibo(venta_id)
         
         # No actualizar caja porque fue pago con puntos (no ingresó dinero físico)
         
@@ -730,6 +1095,7 @@ def procesar_pago_puntos():
             'success': True,
             'message': 'Pago con puntos procesado exitosamente',
             'venta_id': venta_id,
+            'trabajo_impresion': trabajo_impresion,
             'puntos_usados': puntos_necesarios,
             'puntos_restantes': puntos_restantes
         })
@@ -738,6 +1104,8 @@ def procesar_pago_puntos():
         print(f"Error al procesar pago con puntos: {e}")
         import traceback
         traceback.print_exc()
+        if tomada and venta_id is None:
+            cambiar_estado_orden(orden_id, 'cobrando', 'pendiente')
         return jsonify({
             'success': False,
             'message': 'Error al procesar el pago con puntos'
@@ -754,17 +1122,10 @@ def cancelar_orden(orden_id):
         return jsonify({'success': False, 'message': 'Sesión expirada'}), 401
     
     try:
-        # Verificar que la orden existe
-        orden = get_orden(orden_id)
-        if not orden:
-            return jsonify({'success': False, 'message': 'Orden no encontrada'}), 404
-        
-        # Verificar que la orden no esté pagada
-        if orden.get('status') == 'pagada':
-            return jsonify({'success': False, 'message': 'No se puede cancelar una orden ya pagada'}), 400
-        
-        # Eliminar la orden de Redis
-        delete_orden(orden_id)
+        # Solo se cancela si sigue pendiente (no mientras otra caja la cobra)
+        cancelada, estado = cambiar_estado_orden(orden_id, 'pendiente', 'cancelada')
+        if not cancelada:
+            return orden_no_disponible(estado, 'cancelar')
         
         return jsonify({
             'success': True,
@@ -818,6 +1179,22 @@ def handle_connect():
 def handle_disconnect():
     print('Cliente desconectado')
 
+def _sincronizar_ordenes(ultimo_seq):
+    """
+    Envía a la pantalla (cocina o caja) solo los eventos posteriores a su última
+    secuencia, o la foto completa si no tiene secuencia o el stream ya no la alcanza.
+    """
+    try:
+        eventos = get_eventos_ordenes_desde(ultimo_seq) if ultimo_seq is not None else None
+    except (TypeError, ValueError):
+        eventos = None
+    
+    if eventos is None:
+        seq, ordenes = get_snapshot_ordenes()
+        emit('ordenes_actuales', {'ordenes': enriquecer_ordenes(resumir_ordenes(ordenes)), 'seq': seq})
+    else:
+        emit('ordenes_eventos', {'eventos': eventos})
+
 @socketio.on('join_cocinero')
 def handle_join_cocinero(data):
     """Cuando un cocinero se conecta, se une a la sala de cocineros"""
@@ -828,9 +1205,28 @@ def handle_join_cocinero(data):
             join_room('cocineros')
             print(f"Cocinero {empleado['nombre']} se unió a la sala")
             
-            # Enviar órdenes pendientes actuales
-            ordenes = get_ordenes_pendientes()
-            emit('ordenes_actuales', {'ordenes': ordenes})
+            # Ponerlo al día desde la última secuencia que conoce
+            _sincronizar_ordenes(data.get('ultimo_seq'))
+
+@socketio.on('join_cajero')
+def handle_join_cajero(data):
+    """Cuando una caja se conecta, se une a la sala de cajeros"""
+    session_id = data.get('session_id')
+    if session_id:
+        empleado = get_session(session_id)
+        if empleado and empleado['rol'] in ['cajero', 'gerente']:
+            join_room('cajeros')
+            _sincronizar_ordenes(data.get('ultimo_seq'))
+
+@socketio.on('sincronizar_ordenes')
+def handle_sincronizar_ordenes(data):
+    """La pantalla detectó un hueco en la secuencia de eventos (o es su latido) y pide ponerse al día"""
+    empleado = get_session(data.get('session_id')) if data.get('session_id') else None
+    if not empleado or empleado['rol'] not in ['cocinero', 'cajero', 'gerente']:
+        emit('error', {'message': 'No autorizado'})
+        return
+    
+    _sincronizar_ordenes(data.get('ultimo_seq'))
 
 @socketio.on('leave_cocinero')
 def handle_leave_cocinero():
@@ -854,18 +1250,67 @@ def handle_marcar_orden_vista(data):
         return
     
     if orden_id:
-        # Solo notificar que fue vista, NO eliminar de Redis
+        # Marcar como vista, NO eliminar de Redis
         print(f"Orden {orden_id} marcada como vista por {empleado['nombre']}")
         
-        # Emitir a todos los cocineros que la orden fue vista
-        socketio.emit('orden_vista', {
-            'orden_id': orden_id,
-            'cocinero': empleado['nombre']
-        }, room='cocineros')
+        # Guardarlo en la orden y avisar a todos los cocineros
+        if marcar_orden_vista(orden_id, empleado['nombre']):
+            publicar_evento_orden('vista', orden_id, cocinero=empleado['nombre'])
         
         emit('success', {'message': 'Orden marcada como vista'})
 
 
+def iniciar_workers(cantidad, puerto_base):
+    """
+    Levanta `cantidad` procesos del servidor en puertos consecutivos. Los
+    eventos de SocketIO viajan entre ellos por la cola de Redis; enfrente debe
+    ir un balanceador con sesiones pegajosas (ver README).
+    """
+    import subprocess
+    import sys
+
+    if not Config.SOCKETIO_MESSAGE_QUEUE:
+        raise RuntimeError("Se requiere SOCKETIO_MESSAGE_QUEUE para correr varios workers")
+
+    procesos = []
+    for i in range(cantidad):
+        puerto = puerto_base + i
+        procesos.append(subprocess.Popen([sys.executable, __file__, '--puerto', str(puerto), '--worker']))
+        print(f"Worker {i + 1} escuchando en el puerto {puerto}")
+
+    try:
+        for proceso in procesos:
+            proceso.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+        for proceso in procesos:
+            proceso.wait()
+
 if __name__ == '__main__':
-    # Usar socketio.run en lugar de app.run
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # python app.py                 -> un proceso en el puerto 5000 (desarrollo, con debug)
+    # python app.py --workers 4     -> 4 procesos en los puertos 5000-5003
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--puerto', type=int, default=5000)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        iniciar_workers(args.workers, args.puerto)
+    elif args.worker:
+        # Proceso lanzado por iniciar_workers: sin debug ni reloader
+        iniciar_historial_ordenes()
+        iniciar_barrido_ordenes()
+        socketio.run(app, host='0.0.0.0', port=args.puerto, allow_unsafe_werkzeug=True)
+    else:
+        # Con debug el reloader sirve desde un proceso hijo: los hilos de fondo van solo ahí
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            iniciar_historial_ordenes()
+            iniciar_barrido_ordenes()
+        # Usar socketio.run en lugar de app.run
+        socketio.run(app, debug=True, host='0.0.0.0', port=args.puerto)
\ No newline at end of file
@@ -13,10 +13,50 @@ class Config:
     POSTGRES_USER = os.getenv('POSTGRES_USER', 'postgres')
     POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', '')
     
+    # Pool de conexiones a PostgreSQL
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 2))
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 20))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # segundos esperando una conexión libre
+    DB_POOL_HEALTHCHECK = int(os.getenv('DB_POOL_HEALTHCHECK', 30))  # segundos inactiva antes de validar con SELECT 1
+    
     # Redis
     REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
     REDIS_DB = int(os.getenv('REDIS_DB', 0))
     
+    # Cola de mensajes de SocketIO: los emits de cualquier worker llegan a los
+    # clientes conectados a todos los workers. Vacío = un solo proceso, sin cola.
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}")
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'restaurant-socketio')
+    
+    # Caché de PDFs de recibos en Redis (LRU acotado por tamaño total)
+    RECIBOS_CACHE_MAX_MB = float(os.getenv('RECIBOS_CACHE_MAX_MB', 32))
+    
+    # Impresoras ESC/POS: nombre=destino separados por coma, con destino
+    # tcp://host:puerto o file:///ruta (ej. caja=tcp://192.168.1.50:9100,cocina=file:///dev/usb/lp0)
+    IMPRESORAS = os.getenv('IMPRESORAS', '')
+    IMPRESORA_RECIBOS = os.getenv('IMPRESORA_RECIBOS', 'caja')
+    IMPRESORA_COCINA = os.getenv('IMPRESORA_COCINA', 'cocina')
+    IMPRESION_COLUMNAS = int(os.getenv('IMPRESION_COLUMNAS', 48))
+    IMPRESION_REINTENTOS = int(os.getenv('IMPRESION_REINTENTOS', 3))
+    IMPRESION_TIMEOUT = float(os.getenv('IMPRESION_TIMEOUT', 5))  # segundos por intento
+    
+    # Generación de PDFs en procesos aparte (por worker)
+    PDF_PROCESOS = int(os.getenv('PDF_PROCESOS', 2))            # PDFs generándose a la vez
+    PDF_COLA_MAX = int(os.getenv('PDF_COLA_MAX', 100))          # trabajos en espera antes de rechazar
+    PDF_TIMEOUT_RECIBO = float(os.getenv('PDF_TIMEOUT_RECIBO', 15))
+    PDF_TIMEOUT_REPORTE = float(os.getenv('PDF_TIMEOUT_REPORTE', 120))
+    PDF_TRABAJO_TTL = int(os.getenv('PDF_TRABAJO_TTL', 600))    # segundos que se conserva el resultado
+    
+    # Idempotency-Key de crear-orden y pagos: cuánto se recuerda la primera respuesta
+    IDEMPOTENCIA_TTL = int(os.getenv('IDEMPOTENCIA_TTL', 86400))
+    
+    # Historial de órdenes en PostgreSQL (write-behind desde el stream de eventos)
+    HISTORIAL_LOTE_MS = int(os.getenv('HISTORIAL_LOTE_MS', 500))              # espera máxima para juntar un lote
+    HISTORIAL_LOTE_EVENTOS = int(os.getenv('HISTORIAL_LOTE_EVENTOS', 200))    # eventos que cierran el lote antes de tiempo
+    
+    # Cada cuántos segundos se buscan órdenes que expiraron sin pagarse para avisar a cocina y cajas
+    ORDENES_BARRIDO_SEG = float(os.getenv('ORDENES_BARRIDO_SEG', 30))
+    
     # Sesión
     SESSION_TIMEOUT = 900  # 15 minutos en segundos
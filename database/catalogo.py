@@ -0,0 +1,269 @@
+import os
+import time
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from database.redis_client import redis_client
+
+# Caché en memoria del menú (productos y categorías activas).
+# Cada proceso guarda un snapshot inmutable con la versión del catálogo con la
+# que se cargó. Las escrituras incrementan la versión en Redis y la publican
+# por pub/sub para que todos los workers descarten su snapshot.
+CATALOGO_VERSION_KEY = "catalogo:version"
+CATALOGO_CANAL = "catalogo:invalidaciones"
+
+_snapshot = None
+_version_conocida = 0
+_carga_lock = threading.Lock()
+
+# Entrada del índice de precios: lo que el servidor usa para cobrar, sin
+# depender de lo que mande el navegador
+PrecioProducto = namedtuple('PrecioProducto', ['precio', 'costo', 'precio_puntos', 'disponible'])
+
+_listener_pid = None
+_listener_activo = False
+_listener_lock = threading.Lock()
+
+def _leer_version():
+    """Obtiene la versión actual del catálogo desde Redis"""
+    version = redis_client.get(CATALOGO_VERSION_KEY)
+    return int(version) if version else 0
+
+def _escuchar_invalidaciones():
+    """Hilo que recibe las invalidaciones publicadas por cualquier worker"""
+    global _listener_activo, _version_conocida, _snapshot
+
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(CATALOGO_CANAL)
+            # Lo publicado antes de suscribirse se pierde: releer la versión
+            _version_conocida = max(_version_conocida, _leer_version())
+            _listener_activo = True
+            for mensaje in pubsub.listen():
+                version = int(mensaje['data'])
+                if version > _version_conocida:
+                    _version_conocida = version
+                snapshot = _snapshot
+                if snapshot is not None and snapshot['version'] < version:
+                    _snapshot = None
+        except Exception as e:
+            print(f"Error en listener del catálogo: {e}")
+        finally:
+            _listener_activo = False
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+        time.sleep(1)
+
+def _asegurar_listener():
+    """Arranca el listener de invalidaciones una vez por proceso"""
+    global _listener_pid
+
+    if _listener_pid == os.getpid():
+        return
+
+    with _listener_lock:
+        if _listener_pid != os.getpid():
+            hilo = threading.Thread(target=_escuchar_invalidaciones, name='catalogo-listener', daemon=True)
+            hilo.start()
+            _listener_pid = os.getpid()
+
+def _construir_snapshot(version, productos, categorias):
+    """Arma el snapshot inmutable indexado por ID y por categoría, con su índice de precios"""
+    por_categoria = {}
+    precios = {}
+    for producto in productos:
+        por_categoria.setdefault(producto['categoria_id'], []).append(producto)
+        precios[producto['id']] = PrecioProducto(
+            precio=float(producto['precio']),
+            costo=float(producto['costo'] or 0),
+            precio_puntos=int(producto['precio_puntos'] or 0),
+            disponible=producto['status'] == 'disponible'
+        )
+
+    return MappingProxyType({
+        'version': version,
+        'productos': tuple(productos),
+        'categorias': tuple(categorias),
+        'por_id': MappingProxyType({p['id']: p for p in productos}),
+        'por_categoria': MappingProxyType({k: tuple(v) for k, v in por_categoria.items()}),
+        'precios': MappingProxyType(precios),
+        'cargado_en': time.time()
+    })
+
+def get_catalogo():
+    """
+    Obtiene el snapshot vigente del catálogo, recargándolo de PostgreSQL solo
+    cuando su versión quedó atrás.
+    """
+    global _snapshot, _version_conocida
+
+    _asegurar_listener()
+
+    # Sin listener conectado no nos enteramos de invalidaciones: preguntar a Redis
+    if not _listener_activo:
+        _version_conocida = max(_version_conocida, _leer_version())
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot['version'] >= _version_conocida:
+        return snapshot
+
+    with _carga_lock:
+        snapshot = _snapshot
+        if snapshot is not None and snapshot['version'] >= _version_conocida:
+            return snapshot
+
+        from database.db import get_all_productos, get_categorias
+
+        # Leer la versión ANTES de consultar: si alguien escribe mientras
+        # cargamos, el snapshot queda con versión vieja y se recarga después
+        version = _leer_version()
+        productos = get_all_productos()
+        categorias = get_categorias()
+
+        snapshot = _construir_snapshot(version, productos, categorias)
+        _snapshot = snapshot
+        _version_conocida = max(_version_conocida, version)
+
+    return snapshot
+
+def get_productos_catalogo():
+    """Obtiene los productos del catálogo (copias, para no modificar el snapshot)"""
+    return [dict(p) for p in get_catalogo()['productos']]
+
+def get_categorias_catalogo():
+    """Obtiene las categorías activas del catálogo"""
+    return [dict(c) for c in get_catalogo()['categorias']]
+
+def get_version_catalogo():
+    """Obtiene la versión del snapshot vigente"""
+    return get_catalogo()['version']
+
+def get_indice_precios():
+    """Índice de precios por ID de producto del snapshot vigente"""
+    return get_catalogo()['precios']
+
+def invalidar_catalogo():
+    """
+    Invalida el catálogo en todos los workers. Se llama después de confirmar
+    cualquier cambio a productos o categorías.
+    """
+    global _snapshot, _version_conocida
+
+    _snapshot = None
+    try:
+        version = redis_client.incr(CATALOGO_VERSION_KEY)
+        _version_conocida = max(_version_conocida, version)
+        redis_client.publish(CATALOGO_CANAL, version)
+    except Exception as e:
+        print(f"Error al invalidar catálogo: {e}")
+
+# ===== ÓRDENES COMPACTAS =====
+# Las órdenes en Redis guardan cada renglón como [producto_id, cantidad, precio]
+# (más las notas del renglón si las hay) y la versión del catálogo con la que
+# se armaron. Nombre, costo y precio en puntos se completan con el snapshot
+# solo donde se muestran o se cobran. El precio sí se congela en la orden para
+# que un cambio de menú no altere una cuenta ya tomada.
+
+def compactar_items(items):
+    """
+    Convierte los renglones que manda la caja (id y cantidad) a tuplas
+    [id, cantidad, precio(, notas)] con el precio del índice del catálogo.
+    ValueError si un producto no existe, no está disponible o la cantidad no es válida.
+    """
+    precios = get_indice_precios()
+    compactos = []
+    for item in items:
+        try:
+            producto_id = int(item['id'])
+            cantidad = int(item['cantidad'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Renglón de la orden inválido")
+        precio = precios.get(producto_id)
+        if precio is None:
+            raise ValueError(f"El producto {producto_id} no existe")
+        if not precio.disponible:
+            raise ValueError(f"El producto {producto_id} no está disponible")
+        if cantidad <= 0:
+            raise ValueError("La cantidad debe ser mayor a cero")
+
+        renglon = [producto_id, cantidad, precio.precio]
+        if item.get('notas'):
+            renglon.append(item['notas'])
+        compactos.append(renglon)
+    return compactos
+
+def expandir_items(items):
+    """Completa los renglones compactos con nombre, costo y precio en puntos del catálogo"""
+    catalogo = get_catalogo()
+    por_id = catalogo['por_id']
+    precios = catalogo['precios']
+    expandidos = []
+    for renglon in items:
+        # Órdenes guardadas antes del formato compacto
+        if isinstance(renglon, dict):
+            expandidos.append(renglon)
+            continue
+
+        producto_id, cantidad, precio = renglon[:3]
+        producto = por_id.get(producto_id)
+        indice = precios.get(producto_id)
+        item = {
+            'id': producto_id,
+            'nombre': producto['nombre'] if producto else f"Producto {producto_id}",
+            'cantidad': cantidad,
+            'precio': precio,
+            'costo': indice.costo if indice else 0.0,
+            'precio_puntos': indice.precio_puntos if indice else 0
+        }
+        if len(renglon) > 3:
+            item['notas'] = renglon[3]
+        expandidos.append(item)
+    return expandidos
+
+def expandir_orden(orden):
+    """Copia de la orden con sus renglones completos, para mostrarla o cobrarla"""
+    orden = dict(orden)
+    orden['items'] = expandir_items(orden.get('items') or [])
+    return orden
+
+def expandir_ordenes(ordenes):
+    """Expande una lista de órdenes contra un mismo snapshot del catálogo"""
+    return [expandir_orden(orden) for orden in ordenes]
+
+# Lo que usan cocina y cajas para listar una orden; el costo y los puntos solo
+# se mandan al abrir la orden para cobrarla (/api/orden/<id>)
+CAMPOS_RENGLON_LISTA = ('id', 'nombre', 'cantidad', 'precio', 'notas')
+
+def resumir_ordenes(ordenes):
+    """Expande las órdenes con renglones ligeros, para eventos y listas de órdenes"""
+    resumidas = expandir_ordenes(ordenes)
+    for orden in resumidas:
+        orden['items'] = [
+            {campo: item[campo] for campo in CAMPOS_RENGLON_LISTA if campo in item}
+            for item in orden['items']
+        ]
+    return resumidas
+
+def calcular_puntos_orden(items):
+    """
+    Puntos que cuesta la orden según el índice de precios vigente.
+    ValueError si algún producto ya no existe o ya no está disponible.
+    """
+    precios = get_indice_precios()
+    puntos = 0
+    for renglon in items:
+        if isinstance(renglon, dict):
+            producto_id, cantidad = renglon.get('id'), renglon['cantidad']
+        else:
+            producto_id, cantidad = renglon[0], renglon[1]
+        precio = precios.get(producto_id)
+        if precio is None:
+            raise ValueError(f"El producto {producto_id} ya no existe")
+        if not precio.disponible:
+            raise ValueError(f"El producto {producto_id} no está disponible")
+        puntos += precio.precio_puntos * int(cantidad)
+    return puntos
@@ -1,75 +1,126 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from config import Config
+from psycopg2 import errors
+from psycopg2.extras import RealDictCursor, execute_values
+from database.pool import get_db_cursor
+from database.catalogo import invalidar_catalogo
+from database.reportes import invalidar_reportes_empleados
+from contextlib import contextmanager
+from datetime import datetime
+import base64
 import json
+import queue
+import threading
 
-def get_db_connection():
-    conn = psycopg2.connect(
-        host=Config.POSTGRES_HOST,
-        port=Config.POSTGRES_PORT,
-        database=Config.POSTGRES_DB,
-        user=Config.POSTGRES_USER,
-        password=Config.POSTGRES_PASSWORD
-    )
-    return conn
+# Paginación por keyset: tamaño de página por defecto y máximo permitido
+PAGINA_DEFAULT = 50
+PAGINA_MAX = 200
+
+class VentaDuplicada(Exception):
+    """La orden ya tiene una venta registrada (ventas.orden_id es único)"""
+
+@contextmanager
+def transaccion():
+    """
+    Unidad de trabajo: las funciones que reciben este cursor comparten una
+    sola conexión y se confirman (o revierten) juntas al salir del bloque.
+    """
+    with get_db_cursor() as cursor:
+        yield cursor
+
+@contextmanager
+def _usar_cursor(cursor=None):
+    """Reutiliza el cursor de una transacción en curso o abre uno nuevo del pool"""
+    if cursor is not None:
+        yield cursor
+    else:
+        with get_db_cursor() as nuevo:
+            yield nuevo
+
+def _limite_pagina(limite):
+    """Acota el tamaño de página solicitado a [1, PAGINA_MAX]"""
+    if not limite:
+        return PAGINA_DEFAULT
+    return max(1, min(int(limite), PAGINA_MAX))
+
+def _codificar_cursor(*valores):
+    """Convierte la llave de la última fila en un token opaco para la siguiente página"""
+    valores = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+def _texto(valor):
+    if not isinstance(valor, str):
+        raise ValueError(valor)
+    return valor
+
+# Tipo de cada componente de la llave del cursor, en orden
+CURSOR_FECHA_ID = (datetime.fromisoformat, int)
+CURSOR_TEXTO_ID = (_texto, int)
+
+def _decodificar_cursor(token, tipos):
+    """
+    Obtiene la llave guardada en el token, convirtiendo cada componente con su
+    tipo; lanza ValueError si el token no es válido (antes de llegar al SQL).
+    """
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            raise ValueError(valores)
+        return [tipo(valor) for tipo, valor in zip(tipos, valores)]
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+
+def _paginar(filas, limite, llave):
+    """
+    Recorta las filas (se piden limite + 1) y genera el token de la siguiente
+    página a partir de la llave de la última fila, o None si ya no hay más.
+    """
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, _codificar_cursor(*llave(filas[-1]))
 
 def validate_empleado(codigo):
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        "SELECT id, nombre, rol, codigo FROM empleado WHERE codigo = %s",
-        (codigo,)
-    )
-    empleado = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            "SELECT id, nombre, rol, codigo FROM empleado WHERE codigo = %s",
+            (codigo,)
+        )
+        empleado = cursor.fetchone()
     
     return dict(empleado) if empleado else None
 
 def get_all_productos():
     """Obtiene todos los productos con su categoría"""
-    conn = get_db_connection()  # Cambiar get_connection() por get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT 
-            p.id, 
-            p.categoria_id,
-            c.nombre as categoria,
-            p.nombre,
-            p.costo,
-            p.precio,
-            p.precio_puntos,
-            p.descripcion,
-            p.img,
-            p.status,
-            p.created_at
-        FROM producto p
-        INNER JOIN categoria c ON p.categoria_id = c.id
-        WHERE c.activo = true
-        ORDER BY c.orden, p.nombre
-    """)
-    
-    productos = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT 
+                p.id, 
+                p.categoria_id,
+                c.nombre as categoria,
+                p.nombre,
+                p.costo,
+                p.precio,
+                p.precio_puntos,
+                p.descripcion,
+                p.img,
+                p.status,
+                p.created_at
+            FROM producto p
+            INNER JOIN categoria c ON p.categoria_id = c.id
+            WHERE c.activo = true
+            ORDER BY c.orden, p.nombre
+        """)
+        
+        productos = cursor.fetchall()
     
     return [dict(prod) for prod in productos]
 
 def get_productos_by_categoria(categoria):
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        "SELECT id, categoria, nombre, costo, precio, descripcion, img, status FROM producto WHERE categoria = %s ORDER BY nombre",
-        (categoria,)
-    )
-    productos = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            "SELECT id, categoria, nombre, costo, precio, descripcion, img, status FROM producto WHERE categoria = %s ORDER BY nombre",
+            (categoria,)
+        )
+        productos = cursor.fetchall()
     
     # Convertir Decimal a float
     result = []
@@ -83,36 +134,28 @@ def get_productos_by_categoria(categoria):
 
 def get_categorias():
     """Obtiene todas las categorías activas (para cajero y clientes)"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT id, nombre, descripcion, orden, activo
-        FROM categoria
-        WHERE activo = true
-        ORDER BY orden, nombre
-    """)
-    
-    categorias = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT id, nombre, descripcion, orden, activo
+            FROM categoria
+            WHERE activo = true
+            ORDER BY orden, nombre
+        """)
+        
+        categorias = cursor.fetchall()
     
     return [dict(cat) for cat in categorias]
 
 def get_all_categorias_admin():
     """Obtiene TODAS las categorías (activas e inactivas) para administración"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT id, nombre, descripcion, orden, activo, created_at
-        FROM categoria
-        ORDER BY orden, nombre
-    """)
-    
-    categorias = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT id, nombre, descripcion, orden, activo, created_at
+            FROM categoria
+            ORDER BY orden, nombre
+        """)
+        
+        categorias = cursor.fetchall()
     
     result = []
     for cat in categorias:
@@ -124,21 +167,107 @@ def get_all_categorias_admin():
 
 
 
-def guardar_venta(orden_id, cajero_id, cajero_nombre, total, pago_con, cambio, items, cliente_id=None, notas=None):
-    """Guarda una venta en PostgreSQL"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _insertar_venta(cursor, orden_id, cajero_id, cajero_nombre, total, pago_con, cambio, items, cliente_id, notas, puntos_otorgados=0):
+    """Inserta el registro de la venta, sus renglones y su acumulado diario; regresa (ID, fecha)"""
+    cursor.execute(
+        """
+        INSERT INTO ventas (orden_id, cajero_id, cajero_nombre, cliente_id, total, pago_con, cambio, items, notas)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id, fecha_venta::date
+        """,
+        (orden_id, cajero_id, cajero_nombre, cliente_id, float(total), float(pago_con), float(cambio), json.dumps(items), notas)
+    )
+    venta_id, fecha = cursor.fetchone()
     
-    try:
+    # Renglones normalizados con precio y costo congelados al momento de la venta
+    if items:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO venta_item (venta_id, producto_id, nombre, cantidad, precio_unitario, costo_unitario, precio_puntos)
+            VALUES %s
+            """,
+            [
+                (
+                    venta_id,
+                    item.get('id'),
+                    item['nombre'],
+                    int(item['cantidad']),
+                    float(item['precio']),
+                    float(item.get('costo') or 0),
+                    int(item.get('precio_puntos') or 0)
+                )
+                for item in items
+            ]
+        )
+    
+    costo_total = sum(float(item.get('costo') or 0) * int(item['cantidad']) for item in items)
+    _acumular_resumen_diario(cursor, cajero_id, total, costo_total, puntos_otorgados)
+    
+    return venta_id, fecha
+
+def _acumular_resumen_diario(cursor, cajero_id, total, costo_total, puntos_otorgados):
+    """Suma la venta al acumulado del día y cajero (misma transacción que la venta)"""
+    cursor.execute(
+        """
+        INSERT INTO ventas_resumen_diario (fecha, cajero_id, cantidad_ordenes, ingresos, costos, puntos_otorgados)
+        VALUES (CURRENT_DATE, %s, 1, %s, %s, %s)
+        ON CONFLICT (fecha, cajero_id) DO UPDATE
+        SET cantidad_ordenes = ventas_resumen_diario.cantidad_ordenes + 1,
+            ingresos = ventas_resumen_diario.ingresos + EXCLUDED.ingresos,
+            costos = ventas_resumen_diario.costos + EXCLUDED.costos,
+            puntos_otorgados = ventas_resumen_diario.puntos_otorgados + EXCLUDED.puntos_otorgados
+        """,
+        (cajero_id, float(total), costo_total, puntos_otorgados)
+    )
+
+def reconstruir_resumen_ventas(fecha_inicio=None, fecha_fin=None):
+    """
+    Recalcula el acumulado diario a partir de ventas/venta_item para un rango
+    de fechas (todo el historial si no se indica). Regresa los días x cajero escritos.
+    """
+    fecha_inicio = fecha_inicio or '1900-01-01'
+    fecha_fin = fecha_fin or '9999-12-31'
+    
+    with get_db_cursor() as cursor:
+        # Bloquear escrituras concurrentes para no perder ni duplicar ventas del rango
+        cursor.execute("LOCK TABLE ventas_resumen_diario IN EXCLUSIVE MODE")
+        cursor.execute(
+            "DELETE FROM ventas_resumen_diario WHERE fecha BETWEEN %s::date AND %s::date",
+            (fecha_inicio, fecha_fin)
+        )
+        # Puntos otorgados: 5% del total en ventas en efectivo con cliente (misma regla que procesar_pago)
         cursor.execute(
             """
-            INSERT INTO ventas (orden_id, cajero_id, cajero_nombre, cliente_id, total, pago_con, cambio, items, notas)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
+            INSERT INTO ventas_resumen_diario (fecha, cajero_id, cantidad_ordenes, ingresos, costos, puntos_otorgados)
+            SELECT 
+                v.fecha_venta::date,
+                v.cajero_id,
+                COUNT(*),
+                SUM(v.total),
+                COALESCE(SUM(vi.costo), 0),
+                SUM(CASE WHEN v.cliente_id IS NOT NULL AND v.pago_con > 0 THEN FLOOR(v.total * 0.05) ELSE 0 END)
+            FROM ventas v
+            LEFT JOIN LATERAL (
+                SELECT SUM(costo_unitario * cantidad) as costo
+                FROM venta_item
+                WHERE venta_id = v.id
+            ) vi ON true
+            WHERE v.fecha_venta >= %s::date AND v.fecha_venta < %s::date + 1
+            GROUP BY v.fecha_venta::date, v.cajero_id
             """,
-            (orden_id, cajero_id, cajero_nombre, cliente_id, float(total), float(pago_con), float(cambio), json.dumps(items), notas)
+            (fecha_inicio, fecha_fin)
         )
-        venta_id = cursor.fetchone()[0]
+        filas = cursor.rowcount
+    
+    invalidar_reportes_empleados()
+    
+    return filas
+
+def guardar_venta(orden_id, cajero_id, cajero_nombre, total, pago_con, cambio, items, cliente_id=None, notas=None, cursor=None):
+    """Guarda una venta en PostgreSQL"""
+    with _usar_cursor(cursor) as cursor:
+        venta_id, fecha = _insertar_venta(cursor, orden_id, cajero_id, cajero_nombre, total, pago_con, cambio, items, cliente_id, notas)
         
         # Si hay un cliente, SOLO actualizar su última visita (NO sumar puntos aquí)
         if cliente_id:
@@ -150,37 +279,79 @@ def guardar_venta(orden_id, cajero_id, cajero_nombre, total, pago_con, cambio, i
                 """,
                 (cliente_id,)
             )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return venta_id
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    # Con un cursor externo la venta aún no se confirma, pero invalidar de más no hace daño
+    invalidar_reportes_empleados(fecha)
+    
+    return venta_id
+
+def registrar_pago(orden_id, cajero_id, cajero_nombre, total, pago_con, cambio, items,
+                   cliente_id=None, notas=None, puntos=0, descuento_id=None):
+    """
+    Registra un pago completo en una sola transacción: la venta, el cambio de
+    puntos del cliente (positivo si gana, negativo si paga con puntos), su
+    última visita y la eliminación del descuento usado.
+    
+    Regresa (venta_id, puntos_cliente). Si algún paso falla no se guarda nada;
+    si la orden ya se había cobrado lanza VentaDuplicada.
+    """
+    puntos_cliente = None
+    
+    try:
+        with transaccion() as cursor:
+            # Primero el cliente: el acumulado diario solo cuenta los puntos que
+            # de verdad se le sumaron
+            if cliente_id:
+                # Puntos y última visita en un solo UPDATE; nunca dejar el saldo negativo
+                cursor.execute(
+                    """
+                    UPDATE cliente 
+                    SET puntos_acumulados = puntos_acumulados + %s,
+                        ultima_visita = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    AND puntos_acumulados + %s >= 0
+                    RETURNING puntos_acumulados
+                    """,
+                    (puntos, cliente_id, puntos)
+                )
+                fila = cursor.fetchone()
+                # Solo el pago con puntos depende del saldo; si el cliente ya no
+                # existe, la venta en efectivo se registra sin sumar puntos
+                if fila is not None:
+                    puntos_cliente = fila[0]
+                elif puntos < 0:
+                    raise ValueError('Puntos insuficientes o cliente no encontrado')
+            
+            venta_id, fecha = _insertar_venta(cursor, orden_id, cajero_id, cajero_nombre, total, pago_con, cambio, items, cliente_id, notas,
+                                              puntos_otorgados=max(puntos, 0) if puntos_cliente is not None else 0)
+            
+            if descuento_id:
+                eliminar_descuento_permanente(descuento_id, cursor=cursor)
+    except errors.UniqueViolation as e:
+        if e.diag.constraint_name != 'idx_ventas_orden_unica':
+            raise
+        raise VentaDuplicada(orden_id) from e
+    
+    invalidar_reportes_empleados(fecha)
+    
+    return venta_id, puntos_cliente
 
 def get_ventas_by_cajero(cajero_id):
     """Obtiene todas las ventas de un cajero del día actual"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        """
-        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
-               fecha_venta, items
-        FROM ventas 
-        WHERE cajero_id = %s 
-        AND DATE(fecha_venta) = CURRENT_DATE
-        ORDER BY fecha_venta DESC
-        """,
-        (cajero_id,)
-    )
-    ventas = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
+                   fecha_venta, items
+            FROM ventas 
+            WHERE cajero_id = %s 
+            AND fecha_venta >= CURRENT_DATE
+            AND fecha_venta < CURRENT_DATE + 1
+            ORDER BY fecha_venta DESC
+            """,
+            (cajero_id,)
+        )
+        ventas = cursor.fetchall()
     
     result = []
     for v in ventas:
@@ -195,24 +366,19 @@ def get_ventas_by_cajero(cajero_id):
 
 def get_ventas_by_cajero_turno(cajero_id, fecha_inicio):
     """Obtiene las ventas de un cajero desde una fecha específica (inicio de turno)"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        """
-        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
-               fecha_venta, items
-        FROM ventas 
-        WHERE cajero_id = %s 
-        AND fecha_venta >= %s
-        ORDER BY fecha_venta DESC
-        """,
-        (cajero_id, fecha_inicio)
-    )
-    ventas = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
+                   fecha_venta, items
+            FROM ventas 
+            WHERE cajero_id = %s 
+            AND fecha_venta >= %s
+            ORDER BY fecha_venta DESC
+            """,
+            (cajero_id, fecha_inicio)
+        )
+        ventas = cursor.fetchall()
     
     result = []
     for v in ventas:
@@ -227,24 +393,19 @@ def get_ventas_by_cajero_turno(cajero_id, fecha_inicio):
 
 def get_resumen_ventas_turno(cajero_id, fecha_inicio):
     """Obtiene el resumen de ventas de un cajero desde el inicio de su turno"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        """
-        SELECT 
-            COUNT(*) as cantidad_ordenes,
-            COALESCE(SUM(total), 0) as total_ventas
-        FROM ventas 
-        WHERE cajero_id = %s 
-        AND fecha_venta >= %s
-        """,
-        (cajero_id, fecha_inicio)
-    )
-    result = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            SELECT 
+                COUNT(*) as cantidad_ordenes,
+                COALESCE(SUM(total), 0) as total_ventas
+            FROM ventas 
+            WHERE cajero_id = %s 
+            AND fecha_venta >= %s
+            """,
+            (cajero_id, fecha_inicio)
+        )
+        result = cursor.fetchone()
     
     if result:
         return {
@@ -255,42 +416,43 @@ def get_resumen_ventas_turno(cajero_id, fecha_inicio):
 
 def get_total_ventas_dia():
     """Obtiene el total de ventas del día actual"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        """
-        SELECT COALESCE(SUM(total), 0) as total
-        FROM ventas 
-        WHERE DATE(fecha_venta) = CURRENT_DATE
-        """
-    )
-    result = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COALESCE(SUM(ingresos), 0) as total
+            FROM ventas_resumen_diario 
+            WHERE fecha = CURRENT_DATE
+            """
+        )
+        result = cursor.fetchone()
     
     return float(result[0]) if result else 0.0
 
-def get_ventas_recientes(limit=50):
-    """Obtiene las ventas más recientes"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        """
-        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
-               fecha_venta, items
-        FROM ventas 
-        ORDER BY fecha_venta DESC
-        LIMIT %s
-        """,
-        (limit,)
-    )
-    ventas = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+def get_ventas_recientes(limite=PAGINA_DEFAULT, despues_de=None):
+    """
+    Obtiene una página de las ventas más recientes.
+    Regresa (ventas, siguiente); siguiente es el token para la página que sigue.
+    """
+    limite = _limite_pagina(limite)
+    condicion = ""
+    params = []
+    if despues_de:
+        condicion = "WHERE (fecha_venta, id) < (%s::timestamp, %s)"
+        params.extend(_decodificar_cursor(despues_de, CURSOR_FECHA_ID))
+
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            f"""
+            SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
+                   fecha_venta, items
+            FROM ventas 
+            {condicion}
+            ORDER BY fecha_venta DESC, id DESC
+            LIMIT %s
+            """,
+            params + [limite + 1]
+        )
+        ventas, siguiente = _paginar(cursor.fetchall(), limite, lambda v: (v['fecha_venta'], v['id']))
     
     result = []
     for v in ventas:
@@ -301,26 +463,22 @@ def get_ventas_recientes(limit=50):
         venta['fecha_venta'] = venta['fecha_venta'].strftime('%Y-%m-%d %H:%M:%S')
         result.append(venta)
     
-    return result
+    return result, siguiente
 
 def get_ventas_del_dia():
     """Obtiene las ventas del día actual"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        """
-        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
-               fecha_venta, items
-        FROM ventas 
-        WHERE DATE(fecha_venta) = CURRENT_DATE
-        ORDER BY fecha_venta DESC
-        """
-    )
-    ventas = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
+                   fecha_venta, items
+            FROM ventas 
+            WHERE fecha_venta >= CURRENT_DATE
+            AND fecha_venta < CURRENT_DATE + 1
+            ORDER BY fecha_venta DESC
+            """
+        )
+        ventas = cursor.fetchall()
     
     result = []
     for v in ventas:
@@ -335,22 +493,17 @@ def get_ventas_del_dia():
 
 def get_venta_by_id(venta_id):
     """Obtiene una venta específica por su ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        """
-        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
-               fecha_venta, items
-        FROM ventas 
-        WHERE id = %s
-        """,
-        (venta_id,)
-    )
-    venta = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, 
+                   fecha_venta, items
+            FROM ventas 
+            WHERE id = %s
+            """,
+            (venta_id,)
+        )
+        venta = cursor.fetchone()
     
     if venta:
         result = dict(venta)
@@ -364,10 +517,7 @@ def get_venta_by_id(venta_id):
 
 def guardar_cierre_caja(cajero_id, cajero_nombre, monto_inicial, total_ventas, cantidad_ordenes, monto_final, fecha_inicio):
     """Guarda un cierre de caja en PostgreSQL"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute(
             """
             INSERT INTO cierre_caja (cajero_id, cajero_nombre, monto_inicial, total_ventas, 
@@ -379,36 +529,24 @@ def guardar_cierre_caja(cajero_id, cajero_nombre, monto_inicial, total_ventas, c
              cantidad_ordenes, float(monto_final), fecha_inicio)
         )
         cierre_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return cierre_id
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    return cierre_id
 
 def get_ventas_por_cajero_hoy(cajero_id):
     """Obtiene el resumen de ventas del cajero en el día actual"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        """
-        SELECT 
-            COUNT(*) as cantidad_ordenes,
-            COALESCE(SUM(total), 0) as total_ventas
-        FROM ventas 
-        WHERE cajero_id = %s 
-        AND DATE(fecha_venta) = CURRENT_DATE
-        """,
-        (cajero_id,)
-    )
-    result = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            SELECT 
+                COALESCE(SUM(cantidad_ordenes), 0) as cantidad_ordenes,
+                COALESCE(SUM(ingresos), 0) as total_ventas
+            FROM ventas_resumen_diario 
+            WHERE cajero_id = %s 
+            AND fecha = CURRENT_DATE
+            """,
+            (cajero_id,)
+        )
+        result = cursor.fetchone()
     
     if result:
         return {
@@ -419,24 +557,19 @@ def get_ventas_por_cajero_hoy(cajero_id):
 
 def get_cierres_caja_by_cajero(cajero_id, limit=10):
     """Obtiene los últimos cierres de caja de un cajero"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        """
-        SELECT id, cajero_nombre, monto_inicial, total_ventas, cantidad_ordenes,
-               monto_final, fecha_inicio, fecha_cierre
-        FROM cierre_caja
-        WHERE cajero_id = %s
-        ORDER BY fecha_cierre DESC
-        LIMIT %s
-        """,
-        (cajero_id, limit)
-    )
-    cierres = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            """
+            SELECT id, cajero_nombre, monto_inicial, total_ventas, cantidad_ordenes,
+                   monto_final, fecha_inicio, fecha_cierre
+            FROM cierre_caja
+            WHERE cajero_id = %s
+            ORDER BY fecha_cierre DESC
+            LIMIT %s
+            """,
+            (cajero_id, limit)
+        )
+        cierres = cursor.fetchall()
     
     result = []
     for c in cierres:
@@ -453,17 +586,12 @@ def get_cierres_caja_by_cajero(cajero_id, limit=10):
 # Funciones para gestión de clientes
 def buscar_cliente_por_correo(correo):
     """Busca un cliente por su correo electrónico"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        "SELECT id, nombre, correo, puntos_acumulados, ultima_visita FROM cliente WHERE correo = %s",
-        (correo,)
-    )
-    cliente = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            "SELECT id, nombre, correo, puntos_acumulados, ultima_visita FROM cliente WHERE correo = %s",
+            (correo,)
+        )
+        cliente = cursor.fetchone()
     
     if cliente:
         result = dict(cliente)
@@ -473,10 +601,7 @@ def buscar_cliente_por_correo(correo):
 
 def crear_cliente(nombre, correo):
     """Crea un nuevo cliente"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute(
             """
             INSERT INTO cliente (nombre, correo, puntos_acumulados)
@@ -486,28 +611,38 @@ def crear_cliente(nombre, correo):
             (nombre, correo)
         )
         cliente_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return cliente_id
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
-
-def get_all_clientes():
-    """Obtiene todos los clientes"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
     
-    cursor.execute(
-        "SELECT id, nombre, correo, puntos_acumulados, ultima_visita, created_at FROM cliente ORDER BY nombre"
-    )
-    clientes = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    return cliente_id
+
+def get_all_clientes(limite=PAGINA_DEFAULT, despues_de=None, busqueda=None):
+    """
+    Obtiene una página de clientes ordenados por nombre, opcionalmente
+    filtrados por nombre o correo. Regresa (clientes, siguiente).
+    """
+    limite = _limite_pagina(limite)
+    condiciones = []
+    params = []
+    if busqueda:
+        condiciones.append("(nombre ILIKE %s OR correo ILIKE %s)")
+        patron = f"%{busqueda}%"
+        params.extend([patron, patron])
+    if despues_de:
+        condiciones.append("(nombre, id) > (%s, %s)")
+        params.extend(_decodificar_cursor(despues_de, CURSOR_TEXTO_ID))
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            f"""
+            SELECT id, nombre, correo, puntos_acumulados, ultima_visita, created_at
+            FROM cliente
+            {where}
+            ORDER BY nombre, id
+            LIMIT %s
+            """,
+            params + [limite + 1]
+        )
+        clientes, siguiente = _paginar(cursor.fetchall(), limite, lambda c: (c['nombre'], c['id']))
     
     result = []
     for c in clientes:
@@ -516,23 +651,18 @@ def get_all_clientes():
         cliente['created_at'] = cliente['created_at'].strftime('%Y-%m-%d %H:%M:%S') if cliente['created_at'] else None
         result.append(cliente)
     
-    return result
+    return result, siguiente
 
 
 def get_cliente_by_id(cliente_id):
     """Obtiene un cliente por su ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
     try:
-        cursor.execute(
-            "SELECT id, nombre, correo, puntos_acumulados, ultima_visita, created_at FROM cliente WHERE id = %s",
-            (cliente_id,)
-        )
-        cliente = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
+        with get_db_cursor(RealDictCursor) as cursor:
+            cursor.execute(
+                "SELECT id, nombre, correo, puntos_acumulados, ultima_visita, created_at FROM cliente WHERE id = %s",
+                (cliente_id,)
+            )
+            cliente = cursor.fetchone()
         
         if cliente:
             result = dict(cliente)
@@ -542,17 +672,47 @@ def get_cliente_by_id(cliente_id):
         return None
     except Exception as e:
         print(f"Error en get_cliente_by_id: {e}")
-        cursor.close()
-        conn.close()
         return None
 
+def get_clientes_por_ids(cliente_ids):
+    """
+    Obtiene en una sola consulta varios clientes con su descuento activo.
+    Regresa un diccionario {cliente_id: cliente}.
+    """
+    ids = list({int(cliente_id) for cliente_id in cliente_ids if cliente_id})
+    if not ids:
+        return {}
+    
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT 
+                c.id,
+                c.nombre,
+                c.correo,
+                c.puntos_acumulados,
+                d.id as descuento_id,
+                d.porcentaje_descuento
+            FROM cliente c
+            LEFT JOIN descuento_cliente d ON d.cliente_id = c.id
+                AND d.activo = true
+                AND (d.fecha_fin IS NULL OR d.fecha_fin >= CURRENT_TIMESTAMP)
+            WHERE c.id = ANY(%s)
+        """, (ids,))
+        
+        clientes = cursor.fetchall()
     
-def descontar_puntos_cliente(cliente_id, puntos):
-    """Descuenta puntos de un cliente"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    result = {}
+    for c in clientes:
+        cliente = dict(c)
+        if cliente['porcentaje_descuento'] is not None:
+            cliente['porcentaje_descuento'] = float(cliente['porcentaje_descuento'])
+        result[cliente['id']] = cliente
     
-    try:
+    return result
+
+def descontar_puntos_cliente(cliente_id, puntos, cursor=None):
+    """Descuenta puntos de un cliente"""
+    with _usar_cursor(cursor) as cursor:
         cursor.execute(
             """
             UPDATE cliente 
@@ -564,22 +724,12 @@ def descontar_puntos_cliente(cliente_id, puntos):
             (puntos, cliente_id)
         )
         puntos_restantes = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return puntos_restantes
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    return puntos_restantes
 
-def agregar_puntos_cliente(cliente_id, puntos):
+def agregar_puntos_cliente(cliente_id, puntos, cursor=None):
     """Agrega puntos a un cliente"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with _usar_cursor(cursor) as cursor:
         cursor.execute(
             """
             UPDATE cliente 
@@ -591,35 +741,24 @@ def agregar_puntos_cliente(cliente_id, puntos):
             (puntos, cliente_id)
         )
         puntos_nuevos = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return puntos_nuevos
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    return puntos_nuevos
     
 def get_all_empleados():
     """Obtiene todos los empleados del sistema"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT 
-            id, 
-            nombre, 
-            rol, 
-            codigo,
-            created_at
-        FROM empleado
-        ORDER BY nombre
-    """)
-    
-    empleados = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT 
+                id, 
+                nombre, 
+                rol, 
+                codigo,
+                created_at
+            FROM empleado
+            ORDER BY nombre
+        """)
+        
+        empleados = cursor.fetchall()
     
     result = []
     for emp in empleados:
@@ -631,36 +770,26 @@ def get_all_empleados():
 
 def get_reportes_financieros_empleados(fecha_inicio, fecha_fin):
     """Obtiene reportes financieros agrupados por empleado"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
     try:
-        cursor.execute("""
-            SELECT 
-                e.id as empleado_id,
-                e.nombre as empleado_nombre,
-                e.rol as empleado_rol,
-                COUNT(v.id) as cantidad_ordenes,
-                COALESCE(SUM(v.total), 0) as ingresos_totales,
-                COALESCE(SUM(
-                    (SELECT SUM((item->>'costo')::numeric * (item->>'cantidad')::integer)
-                     FROM jsonb_array_elements(v.items) as item)
-                ), 0) as costos_totales,
-                COALESCE(SUM(v.total) - SUM(
-                    (SELECT SUM((item->>'costo')::numeric * (item->>'cantidad')::integer)
-                     FROM jsonb_array_elements(v.items) as item)
-                ), 0) as ganancias_netas
-            FROM empleado e
-            LEFT JOIN ventas v ON e.id = v.cajero_id 
-                AND v.fecha_venta BETWEEN %s::timestamp AND (%s || ' 23:59:59')::timestamp
-            WHERE e.rol IN ('cajero', 'gerente', 'administrador')
-            GROUP BY e.id, e.nombre, e.rol
-            ORDER BY ingresos_totales DESC
-        """, (fecha_inicio, fecha_fin))
-        
-        reportes = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with get_db_cursor(RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT 
+                    e.id as empleado_id,
+                    e.nombre as empleado_nombre,
+                    e.rol as empleado_rol,
+                    COALESCE(SUM(r.cantidad_ordenes), 0) as cantidad_ordenes,
+                    COALESCE(SUM(r.ingresos), 0) as ingresos_totales,
+                    COALESCE(SUM(r.costos), 0) as costos_totales,
+                    COALESCE(SUM(r.ingresos - r.costos), 0) as ganancias_netas
+                FROM empleado e
+                LEFT JOIN ventas_resumen_diario r ON e.id = r.cajero_id 
+                    AND r.fecha BETWEEN %s::date AND %s::date
+                WHERE e.rol IN ('cajero', 'gerente', 'administrador')
+                GROUP BY e.id, e.nombre, e.rol
+                ORDER BY ingresos_totales DESC
+            """, (fecha_inicio, fecha_fin))
+            
+            reportes = cursor.fetchall()
         
         result = []
         for reporte in reportes:
@@ -678,34 +807,80 @@ def get_reportes_financieros_empleados(fecha_inicio, fecha_fin):
         
     except Exception as e:
         print(f"Error en get_reportes_financieros_empleados: {e}")
-        cursor.close()
-        conn.close()
         raise e
 
-def get_ventas_por_empleado(empleado_id, fecha_inicio, fecha_fin):
-    """Obtiene todas las ventas de un empleado en un rango de fechas"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT 
-            id, 
-            orden_id, 
-            cajero_nombre, 
-            total, 
-            pago_con, 
-            cambio,
-            fecha_venta,
-            items
-        FROM ventas 
-        WHERE cajero_id = %s 
-        AND fecha_venta BETWEEN %s::timestamp AND (%s || ' 23:59:59')::timestamp
-        ORDER BY fecha_venta DESC
-    """, (empleado_id, fecha_inicio, fecha_fin))
-    
-    ventas = cursor.fetchall()
-    cursor.close()
-    conn.close()
+def get_reporte_productos(fecha_inicio, fecha_fin):
+    """Obtiene la mezcla de productos vendidos y su margen en un rango de fechas"""
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT 
+                vi.producto_id,
+                MAX(vi.nombre) as producto_nombre,
+                SUM(vi.cantidad) as cantidad_vendida,
+                SUM(vi.precio_unitario * vi.cantidad) as ingresos,
+                SUM(vi.costo_unitario * vi.cantidad) as costos
+            FROM ventas v
+            INNER JOIN venta_item vi ON vi.venta_id = v.id
+            WHERE v.fecha_venta >= %s::date
+            AND v.fecha_venta < %s::date + 1
+            GROUP BY vi.producto_id
+            ORDER BY cantidad_vendida DESC
+        """, (fecha_inicio, fecha_fin))
+        
+        productos = cursor.fetchall()
+    
+    total_vendido = sum(int(p['cantidad_vendida']) for p in productos)
+    
+    result = []
+    for p in productos:
+        ingresos = float(p['ingresos'])
+        costos = float(p['costos'])
+        result.append({
+            'producto_id': p['producto_id'],
+            'producto_nombre': p['producto_nombre'],
+            'cantidad_vendida': int(p['cantidad_vendida']),
+            'porcentaje_mezcla': round(int(p['cantidad_vendida']) * 100 / total_vendido, 2) if total_vendido else 0.0,
+            'ingresos': ingresos,
+            'costos': costos,
+            'ganancia': ingresos - costos,
+            'margen': round((ingresos - costos) * 100 / ingresos, 2) if ingresos else 0.0
+        })
+    
+    return result
+
+def get_ventas_por_empleado(empleado_id, fecha_inicio, fecha_fin, limite=PAGINA_DEFAULT, despues_de=None):
+    """
+    Obtiene una página de las ventas de un empleado en un rango de fechas.
+    Regresa (ventas, siguiente).
+    """
+    limite = _limite_pagina(limite)
+    condicion = ""
+    params = [empleado_id, fecha_inicio, fecha_fin]
+    if despues_de:
+        condicion = "AND (fecha_venta, id) < (%s::timestamp, %s)"
+        params.extend(_decodificar_cursor(despues_de, CURSOR_FECHA_ID))
+
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(f"""
+            SELECT 
+                id, 
+                orden_id, 
+                cajero_nombre, 
+                total, 
+                pago_con, 
+                cambio,
+                fecha_venta,
+                items
+            FROM ventas 
+            WHERE cajero_id = %s 
+            AND fecha_venta >= %s::date
+            AND fecha_venta < %s::date + 1
+            {condicion}
+            ORDER BY fecha_venta DESC, id DESC
+            LIMIT %s
+        """, params + [limite + 1])
+        
+        ventas, siguiente = _paginar(cursor.fetchall(), limite, lambda v: (v['fecha_venta'], v['id']))
     
     result = []
     for v in ventas:
@@ -716,67 +891,198 @@ def get_ventas_por_empleado(empleado_id, fecha_inicio, fecha_fin):
         venta['fecha_venta'] = venta['fecha_venta'].strftime('%Y-%m-%d %H:%M:%S')
         result.append(venta)
     
-    return result
+    return result, siguiente
+
+# ===== EXPORTACIÓN DE VENTAS =====
+# Un renglón por producto vendido (las ventas sin renglones salen una vez con
+# los campos del producto vacíos). Lo genera PostgreSQL con COPY y se pasa al
+# cliente por bloques, sin armar dicts ni convertir Decimal/fechas en Python.
+_CONSULTA_EXPORTAR_VENTAS = """
+    SELECT
+        v.id as venta_id,
+        v.orden_id,
+        v.fecha_venta,
+        v.cajero_id,
+        v.cajero_nombre,
+        v.cliente_id,
+        v.total,
+        v.pago_con,
+        v.cambio,
+        vi.producto_id,
+        vi.nombre as producto,
+        vi.cantidad,
+        vi.precio_unitario,
+        vi.costo_unitario,
+        vi.precio_puntos
+    FROM ventas v
+    LEFT JOIN venta_item vi ON vi.venta_id = v.id
+    WHERE v.fecha_venta >= %s::date
+    AND v.fecha_venta < %s::date + 1
+    ORDER BY v.fecha_venta, v.id, vi.id
+"""
+
+EXPORTAR_BLOQUE = 64 * 1024     # bytes por bloque enviado al cliente
+EXPORTAR_BLOQUES_EN_COLA = 8    # bloques en memoria como máximo por exportación
+
+_FIN_EXPORTACION = object()
+
+class _EscritorCola:
+    """Archivo para copy_expert que junta lo que llega en bloques y los pasa a una cola acotada"""
+
+    def __init__(self, cola, cancelado):
+        self.cola = cola
+        self.cancelado = cancelado
+        self.partes = []
+        self.pendiente = 0
+
+    def write(self, datos):
+        self.partes.append(datos)
+        self.pendiente += len(datos)
+        if self.pendiente >= EXPORTAR_BLOQUE:
+            self.vaciar()
+
+    def vaciar(self):
+        if self.partes:
+            self.poner(b''.join(self.partes))
+            self.partes = []
+            self.pendiente = 0
+
+    def poner(self, item):
+        # La cola llena detiene al COPY hasta que el cliente lea; si el cliente
+        # se fue, abortar el COPY con una excepción
+        while True:
+            if self.cancelado.is_set():
+                raise IOError('Exportación cancelada por el cliente')
+            try:
+                self.cola.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+def _sql_exportar_ventas(cursor, fecha_inicio, fecha_fin, formato):
+    consulta = cursor.mogrify(_CONSULTA_EXPORTAR_VENTAS, (fecha_inicio, fecha_fin)).decode()
+    if formato == 'csv':
+        return f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+    if formato == 'ndjson':
+        # Una línea JSON por renglón. Formato csv con comilla y separador que
+        # nunca aparecen en el JSON, para que COPY no escape nada
+        return (
+            f"COPY (SELECT row_to_json(t)::text FROM ({consulta}) t) "
+            "TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+        )
+    raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+def exportar_ventas(fecha_inicio, fecha_fin, formato='csv'):
+    """
+    Genera las ventas del rango (con sus productos) como bloques de bytes en
+    CSV o NDJSON. La memoria usada es la misma sin importar cuántas ventas haya.
+    """
+    if formato not in ('csv', 'ndjson'):
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+    cola = queue.Queue(maxsize=EXPORTAR_BLOQUES_EN_COLA)
+    cancelado = threading.Event()
+    escritor = _EscritorCola(cola, cancelado)
+
+    def copiar():
+        try:
+            with get_db_cursor() as cursor:
+                cursor.copy_expert(_sql_exportar_ventas(cursor, fecha_inicio, fecha_fin, formato), escritor, size=EXPORTAR_BLOQUE)
+            escritor.vaciar()
+            escritor.poner(_FIN_EXPORTACION)
+        except Exception as e:
+            if not cancelado.is_set():
+                print(f"Error al exportar ventas: {e}")
+                try:
+                    escritor.poner(e)
+                except IOError:
+                    pass
+
+    hilo = threading.Thread(target=copiar, name='exportar-ventas', daemon=True)
+    hilo.start()
+
+    try:
+        while True:
+            bloque = cola.get()
+            if bloque is _FIN_EXPORTACION:
+                return
+            if isinstance(bloque, Exception):
+                raise bloque
+            yield bloque
+    finally:
+        # Si el cliente cortó la descarga, liberar al hilo para que aborte el COPY
+        cancelado.set()
+        while not cola.empty():
+            try:
+                cola.get_nowait()
+            except queue.Empty:
+                break
 
 # ===== FUNCIONES PARA DESCUENTOS =====
 def crear_descuento_cliente(cliente_id, porcentaje_descuento, fecha_fin=None, notas=None):
-    """Crea un descuento para un cliente (cliente_id puede ser NULL para descuentos generales)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        # Si hay cliente_id, desactivar descuentos anteriores de ese cliente
-        if cliente_id:
-            cursor.execute(
-                "UPDATE descuento_cliente SET activo = false WHERE cliente_id = %s AND activo = true",
-                (cliente_id,)
-            )
-        
-        # Crear nuevo descuento
-        cursor.execute(
-            """
-            INSERT INTO descuento_cliente (cliente_id, porcentaje_descuento, fecha_fin, notas)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id
-            """,
-            (cliente_id, porcentaje_descuento, fecha_fin, notas)
-        )
-        descuento_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return descuento_id
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    """
+    Crea un descuento para un cliente (cliente_id puede ser NULL para
+    descuentos generales). El nuevo reemplaza al descuento activo del cliente;
+    si otro se creó al mismo tiempo, el índice único de descuentos activos
+    rechaza uno de los dos INSERT y ese se reintenta.
+    """
+    for intento in range(3):
+        try:
+            with get_db_cursor() as cursor:
+                # Si hay cliente_id, desactivar descuentos anteriores de ese cliente
+                if cliente_id:
+                    cursor.execute(
+                        "UPDATE descuento_cliente SET activo = false WHERE cliente_id = %s AND activo = true",
+                        (cliente_id,)
+                    )
+                
+                # Crear nuevo descuento
+                cursor.execute(
+                    """
+                    INSERT INTO descuento_cliente (cliente_id, porcentaje_descuento, fecha_fin, notas)
+                    VALUES (%s, %s, %s, %s)
+                    RETURNING id
+                    """,
+                    (cliente_id, porcentaje_descuento, fecha_fin, notas)
+                )
+                return cursor.fetchone()[0]
+        except errors.UniqueViolation as e:
+            if e.diag.constraint_name != 'idx_descuento_cliente_activo' or intento == 2:
+                raise
+
+def get_all_descuentos(limite=PAGINA_DEFAULT, despues_de=None):
+    """
+    Obtiene una página de descuentos (más recientes primero) con información
+    del cliente (si existe). Regresa (descuentos, siguiente).
+    """
+    limite = _limite_pagina(limite)
+    condicion = ""
+    params = []
+    if despues_de:
+        condicion = "WHERE (d.created_at, d.id) < (%s::timestamp, %s)"
+        params.extend(_decodificar_cursor(despues_de, CURSOR_FECHA_ID))
 
-def get_all_descuentos():
-    """Obtiene todos los descuentos con información del cliente (si existe)"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT 
-            d.id,
-            d.cliente_id,
-            COALESCE(c.nombre, 'Sin cliente asignado') as cliente_nombre,
-            COALESCE(c.correo, '-') as cliente_correo,
-            d.porcentaje_descuento,
-            d.activo,
-            d.fecha_inicio,
-            d.fecha_fin,
-            d.notas,
-            d.created_at
-        FROM descuento_cliente d
-        LEFT JOIN cliente c ON d.cliente_id = c.id
-        ORDER BY d.created_at DESC
-    """)
-    
-    descuentos = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(f"""
+            SELECT 
+                d.id,
+                d.cliente_id,
+                COALESCE(c.nombre, 'Sin cliente asignado') as cliente_nombre,
+                COALESCE(c.correo, '-') as cliente_correo,
+                d.porcentaje_descuento,
+                d.activo,
+                d.fecha_inicio,
+                d.fecha_fin,
+                d.notas,
+                d.created_at
+            FROM descuento_cliente d
+            LEFT JOIN cliente c ON d.cliente_id = c.id
+            {condicion}
+            ORDER BY d.created_at DESC, d.id DESC
+            LIMIT %s
+        """, params + [limite + 1])
+        
+        descuentos, siguiente = _paginar(cursor.fetchall(), limite, lambda d: (d['created_at'], d['id']))
     
     result = []
     for desc in descuentos:
@@ -787,29 +1093,25 @@ def get_all_descuentos():
         descuento['created_at'] = descuento['created_at'].strftime('%Y-%m-%d %H:%M:%S') if descuento['created_at'] else None
         result.append(descuento)
     
-    return result
+    return result, siguiente
 
 def get_descuento_activo_cliente(cliente_id):
     """Obtiene el descuento activo de un cliente"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT 
-            id,
-            cliente_id,
-            porcentaje_descuento,
-            fecha_fin
-        FROM descuento_cliente
-        WHERE cliente_id = %s 
-        AND activo = true
-        AND (fecha_fin IS NULL OR fecha_fin >= CURRENT_TIMESTAMP)
-        LIMIT 1
-    """, (cliente_id,))
-    
-    descuento = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT 
+                id,
+                cliente_id,
+                porcentaje_descuento,
+                fecha_fin
+            FROM descuento_cliente
+            WHERE cliente_id = %s 
+            AND activo = true
+            AND (fecha_fin IS NULL OR fecha_fin >= CURRENT_TIMESTAMP)
+            LIMIT 1
+        """, (cliente_id,))
+        
+        descuento = cursor.fetchone()
     
     if descuento:
         result = dict(descuento)
@@ -819,69 +1121,57 @@ def get_descuento_activo_cliente(cliente_id):
 
 def eliminar_descuento(descuento_id):
     """Elimina un descuento (lo marca como inactivo)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute(
             "UPDATE descuento_cliente SET activo = false WHERE id = %s",
             (descuento_id,)
         )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    return True
 
-def eliminar_descuento_permanente(descuento_id):
+def eliminar_descuento_permanente(descuento_id, cursor=None):
     """Elimina un descuento permanentemente de la base de datos"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with _usar_cursor(cursor) as cursor:
         cursor.execute(
             "DELETE FROM descuento_cliente WHERE id = %s",
             (descuento_id,)
         )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
-
-def get_ordenes_por_cliente(cliente_id):
-    """Obtiene todas las órdenes de un cliente específico"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
     
+    return True
+
+def get_ordenes_por_cliente(cliente_id, limite=PAGINA_DEFAULT, despues_de=None):
+    """
+    Obtiene una página de las órdenes de un cliente (más recientes primero).
+    Regresa (ordenes, siguiente).
+    """
+    limite = _limite_pagina(limite)
+    condicion = ""
+    params = [cliente_id]
+    if despues_de:
+        condicion = "AND (fecha_venta, id) < (%s::timestamp, %s)"
+        params.extend(_decodificar_cursor(despues_de, CURSOR_FECHA_ID))
+
     try:
-        cursor.execute("""
-            SELECT 
-                id,
-                orden_id,
-                cajero_nombre,
-                total,
-                pago_con,
-                cambio,
-                items,
-                fecha_venta,
-                notas
-            FROM ventas
-            WHERE cliente_id = %s
-            ORDER BY fecha_venta DESC
-        """, (cliente_id,))
-        
-        ordenes = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with get_db_cursor(RealDictCursor) as cursor:
+            cursor.execute(f"""
+                SELECT 
+                    id,
+                    orden_id,
+                    cajero_nombre,
+                    total,
+                    pago_con,
+                    cambio,
+                    items,
+                    fecha_venta,
+                    notas
+                FROM ventas
+                WHERE cliente_id = %s
+                {condicion}
+                ORDER BY fecha_venta DESC, id DESC
+                LIMIT %s
+            """, params + [limite + 1])
+            
+            ordenes, siguiente = _paginar(cursor.fetchall(), limite, lambda o: (o['fecha_venta'], o['id']))
         
         result = []
         for orden in ordenes:
@@ -893,41 +1183,41 @@ def get_ordenes_por_cliente(cliente_id):
             # items ya es JSONB, se convierte automáticamente
             result.append(orden_dict)
         
-        return result
+        return result, siguiente
         
     except Exception as e:
         print(f"Error en get_ordenes_por_cliente: {e}")
-        cursor.close()
-        conn.close()
         raise e
-    
+
+def contar_ordenes_cliente(cliente_id):
+    """Obtiene el total de órdenes de un cliente"""
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM ventas WHERE cliente_id = %s", (cliente_id,))
+        return cursor.fetchone()[0]
+
 # ===== FUNCIONES PARA CONFIGURACIÓN DEL TICKET =====
 def get_configuracion_ticket():
     """Obtiene la configuración actual del ticket"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT 
-            id,
-            nombre_negocio,
-            direccion,
-            telefono,
-            rfc,
-            mensaje_agradecimiento,
-            mostrar_puntos,
-            encabezado,
-            pie_pagina,
-            logo_url,
-            updated_at
-        FROM configuracion_ticket
-        ORDER BY id DESC
-        LIMIT 1
-    """)
-    
-    config = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT 
+                id,
+                nombre_negocio,
+                direccion,
+                telefono,
+                rfc,
+                mensaje_agradecimiento,
+                mostrar_puntos,
+                encabezado,
+                pie_pagina,
+                logo_url,
+                updated_at
+            FROM configuracion_ticket
+            ORDER BY id DESC
+            LIMIT 1
+        """)
+        
+        config = cursor.fetchone()
     
     if config:
         result = dict(config)
@@ -937,10 +1227,7 @@ def get_configuracion_ticket():
 
 def actualizar_configuracion_ticket(empleado_id, config_data):
     """Actualiza la configuración del ticket"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         # Primero verificar si existe configuración
         cursor.execute("SELECT id FROM configuracion_ticket LIMIT 1")
         existe = cursor.fetchone()
@@ -998,22 +1285,15 @@ def actualizar_configuracion_ticket(empleado_id, config_data):
             ))
         
         config_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return config_id
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    from utils.pdf_generator import invalidar_configuracion_ticket
+    invalidar_configuracion_ticket()
+    
+    return config_id
 
 def crear_categoria_db(nombre, descripcion, orden):
     """Crea una nueva categoría"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute(
             """
             INSERT INTO categoria (nombre, descripcion, orden)
@@ -1023,22 +1303,14 @@ def crear_categoria_db(nombre, descripcion, orden):
             (nombre, descripcion, orden)
         )
         categoria_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return categoria_id
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    invalidar_catalogo()
+    
+    return categoria_id
 
 def actualizar_categoria_db(categoria_id, nombre, descripcion, orden):
     """Actualiza una categoría existente"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute(
             """
             UPDATE categoria 
@@ -1047,83 +1319,58 @@ def actualizar_categoria_db(categoria_id, nombre, descripcion, orden):
             """,
             (nombre, descripcion, orden, categoria_id)
         )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    invalidar_catalogo()
+    
+    return True
 
 def eliminar_categoria_db(categoria_id):
     """Elimina una categoría (la marca como inactiva)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         # Marcar como inactiva en lugar de eliminar
         cursor.execute(
             "UPDATE categoria SET activo = false WHERE id = %s",
             (categoria_id,)
         )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    invalidar_catalogo()
+    
+    return True
 
 def activar_categoria_db(categoria_id):
     """Activa una categoría inactiva"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute(
             "UPDATE categoria SET activo = true WHERE id = %s",
             (categoria_id,)
         )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    invalidar_catalogo()
+    
+    return True
 
 
 def get_producto_by_id(producto_id):
     """Obtiene un producto por su ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute("""
-        SELECT 
-            p.id, 
-            p.categoria_id,
-            c.nombre as categoria,
-            p.nombre,
-            p.costo,
-            p.precio,
-            p.precio_puntos,
-            p.descripcion,
-            p.img,
-            p.status
-        FROM producto p
-        INNER JOIN categoria c ON p.categoria_id = c.id
-        WHERE p.id = %s
-    """, (producto_id,))
-    
-    producto = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT 
+                p.id, 
+                p.categoria_id,
+                c.nombre as categoria,
+                p.nombre,
+                p.costo,
+                p.precio,
+                p.precio_puntos,
+                p.descripcion,
+                p.img,
+                p.status
+            FROM producto p
+            INNER JOIN categoria c ON p.categoria_id = c.id
+            WHERE p.id = %s
+        """, (producto_id,))
+        
+        producto = cursor.fetchone()
     
     if producto:
         result = dict(producto)
@@ -1134,10 +1381,7 @@ def get_producto_by_id(producto_id):
 
 def crear_producto_db(data):
     """Crea un nuevo producto"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute("""
             INSERT INTO producto (categoria_id, nombre, costo, precio, precio_puntos, descripcion, img, status)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
@@ -1153,22 +1397,14 @@ def crear_producto_db(data):
             data['status']
         ))
         producto_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return producto_id
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    invalidar_catalogo()
+    
+    return producto_id
 
 def actualizar_producto_db(producto_id, data):
     """Actualiza un producto existente"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute("""
             UPDATE producto 
             SET categoria_id = %s, nombre = %s, costo = %s, precio = %s, 
@@ -1185,43 +1421,27 @@ def actualizar_producto_db(producto_id, data):
             data['status'],
             producto_id
         ))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    invalidar_catalogo()
+    
+    return True
 
 def cambiar_status_producto_db(producto_id, status):
     """Cambia el status de un producto"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute(
             "UPDATE producto SET status = %s WHERE id = %s",
             (status, producto_id)
         )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    invalidar_catalogo()
+    
+    return True
     
 
 def crear_empleado_db(data):
     """Crea un nuevo empleado"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute("""
             INSERT INTO empleado (nombre, codigo, rol)
             VALUES (%s, %s, %s)
@@ -1232,22 +1452,15 @@ def crear_empleado_db(data):
             data['rol']
         ))
         empleado_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return empleado_id
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
+    
+    # El reporte por empleado lista a todos los empleados con su nombre y rol
+    invalidar_reportes_empleados()
+    
+    return empleado_id
 
 def actualizar_empleado_db(empleado_id, data):
     """Actualiza un empleado existente"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with get_db_cursor() as cursor:
         cursor.execute("""
             UPDATE empleado 
             SET nombre = %s, codigo = %s, rol = %s
@@ -1258,12 +1471,13 @@ def actualizar_empleado_db(empleado_id, data):
             data['rol'],
             empleado_id
         ))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.rollback()
-        cursor.close()
-        conn.close()
-        raise e
\ No newline at end of file
+    
+    invalidar_reportes_empleados()
+    
+    return True
+
+if __name__ == '__main__':
+    # python -m database.db [fecha_inicio] [fecha_fin]  -> reconstruye el acumulado diario de ventas
+    import sys
+    filas = reconstruir_resumen_ventas(*sys.argv[1:3])
+    print(f"Acumulado diario reconstruido: {filas} registros (día x cajero)")
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import socket
+import threading
+from datetime import datetime
+
+import redis
+from psycopg2.extras import execute_values
+
+from config import Config
+from database.pool import get_db_cursor
+from database.redis_client import redis_client, ORDENES_STREAM_KEY
+
+# Historial de órdenes en PostgreSQL (write-behind). Las rutas solo registran
+# el evento en el stream de Redis, como ya lo hacían para las pantallas; un
+# hilo por worker lo consume con un grupo de consumidores y lo escribe en la
+# tabla orden en lotes (cada HISTORIAL_LOTE_MS o HISTORIAL_LOTE_EVENTOS). Un
+# evento solo se confirma (XACK) después del COMMIT: si PostgreSQL falla, el
+# lote se reintenta, y si un worker muere otro reclama sus eventos.
+HISTORIAL_GRUPO = "historial-ordenes"
+HISTORIAL_RECLAMAR_MS = 60000  # eventos sin confirmar de un consumidor caído
+HISTORIAL_ESPERA_MS = 5000     # bloqueo de XREADGROUP sin eventos
+
+ESTADO_POR_EVENTO = {
+    'creada': 'pendiente', 'cobrando': 'cobrando', 'reabierta': 'pendiente',
+    'pagada': 'pagada', 'cancelada': 'cancelada', 'expirada': 'expirada'
+}
+# 'expirada': la orden pasó SESSION_TIMEOUT en Redis sin pagarse (abandonada)
+ESTADOS_CERRADOS = ('pagada', 'cancelada', 'expirada')
+
+# Una fila por orden y lote; los datos de la orden y de cocina solo se llenan
+# si vienen en el lote, y el estado solo avanza con un evento más reciente
+_UPSERT_ORDENES = """
+    INSERT INTO orden (orden_id, cajero_id, cajero_nombre, cliente_id, items, total, notas,
+                       status, status_seq, creada_en, vista_por, vista_en, cerrada_en)
+    VALUES %s
+    ON CONFLICT (orden_id) DO UPDATE SET
+        cajero_id = COALESCE(EXCLUDED.cajero_id, orden.cajero_id),
+        cajero_nombre = COALESCE(EXCLUDED.cajero_nombre, orden.cajero_nombre),
+        cliente_id = COALESCE(EXCLUDED.cliente_id, orden.cliente_id),
+        items = COALESCE(EXCLUDED.items, orden.items),
+        total = COALESCE(EXCLUDED.total, orden.total),
+        notas = COALESCE(EXCLUDED.notas, orden.notas),
+        creada_en = COALESCE(EXCLUDED.creada_en, orden.creada_en),
+        vista_por = COALESCE(EXCLUDED.vista_por, orden.vista_por),
+        vista_en = COALESCE(EXCLUDED.vista_en, orden.vista_en),
+        status = CASE WHEN EXCLUDED.status_seq > orden.status_seq THEN EXCLUDED.status ELSE orden.status END,
+        cerrada_en = CASE WHEN EXCLUDED.status_seq > orden.status_seq THEN EXCLUDED.cerrada_en ELSE orden.cerrada_en END,
+        status_seq = GREATEST(EXCLUDED.status_seq, orden.status_seq)
+"""
+
+_escritor_pid = None
+_escritor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'lotes': 0,
+    'eventos': 0,
+    'ordenes': 0,
+    'errores': 0,
+    'reclamados': 0,
+    'ultimo_lote_ms': 0.0
+}
+
+def _entero(valor):
+    try:
+        return int(valor) if valor not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+def _consolidar(entradas):
+    """
+    Junta los eventos del lote en una fila por orden: un INSERT ... ON CONFLICT
+    no puede tocar la misma fila dos veces.
+    """
+    filas = {}
+    for entrada_id, campos in entradas:
+        # Eventos que el stream ya recortó (quedaron sin confirmar demasiado tiempo)
+        if not campos:
+            continue
+
+        seq = int(entrada_id.split('-')[0])
+        tipo = campos.get('tipo')
+        datos = json.loads(campos.get('datos') or '{}')
+        fecha = datetime.fromtimestamp(float(campos['ts'])) if campos.get('ts') else None
+
+        fila = filas.setdefault(campos['orden_id'], {
+            'orden_id': campos['orden_id'], 'cajero_id': None, 'cajero_nombre': None,
+            'cliente_id': None, 'items': None, 'total': None, 'notas': None,
+            'status': 'pendiente', 'status_seq': 0, 'creada_en': None,
+            'vista_por': None, 'vista_en': None, 'cerrada_en': None
+        })
+
+        if tipo == 'creada':
+            orden = datos.get('orden') or {}
+            fila.update(
+                cajero_id=_entero(orden.get('cajero_id')),
+                cajero_nombre=orden.get('cajero'),
+                cliente_id=_entero(orden.get('cliente_id')),
+                items=json.dumps(orden.get('items') or []),
+                total=orden.get('total'),
+                notas=orden.get('notas'),
+                creada_en=orden.get('fecha') or fecha
+            )
+        elif tipo == 'vista':
+            fila['vista_por'] = datos.get('cocinero')
+            fila['vista_en'] = fecha
+
+        if tipo in ESTADO_POR_EVENTO and seq > fila['status_seq']:
+            fila['status'] = ESTADO_POR_EVENTO[tipo]
+            fila['status_seq'] = seq
+            fila['cerrada_en'] = fecha if fila['status'] in ESTADOS_CERRADOS else None
+
+    return filas
+
+def _escribir_lote(entradas):
+    """Escribe el lote en una sola transacción y luego confirma los eventos en Redis"""
+    inicio = time.perf_counter()
+    filas = _consolidar(entradas)
+
+    if filas:
+        columnas = ('orden_id', 'cajero_id', 'cajero_nombre', 'cliente_id', 'items', 'total', 'notas',
+                    'status', 'status_seq', 'creada_en', 'vista_por', 'vista_en', 'cerrada_en')
+        with get_db_cursor() as cursor:
+            execute_values(
+                cursor,
+                _UPSERT_ORDENES,
+                [tuple(fila[c] for c in columnas) for fila in filas.values()],
+                page_size=len(filas)
+            )
+
+    redis_client.xack(ORDENES_STREAM_KEY, HISTORIAL_GRUPO, *[entrada_id for entrada_id, _ in entradas])
+
+    with _stats_lock:
+        _stats['lotes'] += 1
+        _stats['eventos'] += len(entradas)
+        _stats['ordenes'] += len(filas)
+        _stats['ultimo_lote_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+
+def _leer(consumidor, desde, cantidad, bloqueo=None):
+    respuesta = redis_client.xreadgroup(
+        HISTORIAL_GRUPO, consumidor, {ORDENES_STREAM_KEY: desde},
+        count=cantidad, block=bloqueo
+    )
+    return respuesta[0][1] if respuesta else []
+
+def _leer_lote(consumidor):
+    """
+    Espera el primer evento y a partir de él junta más hasta completar
+    HISTORIAL_LOTE_EVENTOS o agotar HISTORIAL_LOTE_MS.
+    """
+    maximo = Config.HISTORIAL_LOTE_EVENTOS
+    entradas = _leer(consumidor, '>', maximo, HISTORIAL_ESPERA_MS)
+    if not entradas:
+        return []
+
+    limite = time.monotonic() + Config.HISTORIAL_LOTE_MS / 1000
+    while len(entradas) < maximo:
+        espera = int((limite - time.monotonic()) * 1000)
+        if espera <= 0:
+            break
+        nuevas = _leer(consumidor, '>', maximo - len(entradas), espera)
+        if not nuevas:
+            break
+        entradas.extend(nuevas)
+    return entradas
+
+def _reclamar(consumidor):
+    """Toma los eventos que otro consumidor (un worker caído) dejó sin confirmar"""
+    resultado = redis_client.xautoclaim(
+        ORDENES_STREAM_KEY, HISTORIAL_GRUPO, consumidor,
+        min_idle_time=HISTORIAL_RECLAMAR_MS, count=Config.HISTORIAL_LOTE_EVENTOS, justid=True
+    )
+    reclamados = len(resultado[1]) if resultado else 0
+    if reclamados:
+        with _stats_lock:
+            _stats['reclamados'] += reclamados
+    return reclamados
+
+def _crear_grupo():
+    try:
+        # Desde el inicio del stream: el upsert es idempotente
+        redis_client.xgroup_create(ORDENES_STREAM_KEY, HISTORIAL_GRUPO, id='0', mkstream=True)
+    except redis.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+def _escribir_historial():
+    """Hilo escritor: consume el stream de eventos y lo persiste en lotes"""
+    consumidor = f"{socket.gethostname()}-{os.getpid()}"
+    # Al arrancar (y después de un error) primero va lo pendiente de este consumidor
+    pendientes = True
+    ultimo_reclamo = 0
+    espera_error = 1
+
+    while True:
+        try:
+            _crear_grupo()
+
+            if time.monotonic() - ultimo_reclamo > HISTORIAL_RECLAMAR_MS / 1000:
+                ultimo_reclamo = time.monotonic()
+                if _reclamar(consumidor):
+                    pendientes = True
+
+            if pendientes:
+                entradas = _leer(consumidor, '0', Config.HISTORIAL_LOTE_EVENTOS)
+                pendientes = bool(entradas)
+            else:
+                entradas = _leer_lote(consumidor)
+
+            if entradas:
+                _escribir_lote(entradas)
+            espera_error = 1
+        except Exception as e:
+            print(f"Error al escribir historial de órdenes: {e}")
+            with _stats_lock:
+                _stats['errores'] += 1
+            pendientes = True
+            time.sleep(espera_error)
+            espera_error = min(espera_error * 2, 30)
+
+def iniciar_historial_ordenes():
+    """Arranca el escritor del historial una vez por proceso"""
+    global _escritor_pid
+
+    if _escritor_pid == os.getpid():
+        return
+
+    with _escritor_lock:
+        if _escritor_pid != os.getpid():
+            threading.Thread(target=_escribir_historial, name='historial-ordenes', daemon=True).start()
+            _escritor_pid = os.getpid()
+
+def get_historial_stats():
+    """Lotes escritos por este proceso y eventos del grupo aún sin confirmar"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    stats['pid'] = os.getpid()
+    stats['activo'] = _escritor_pid == os.getpid()
+    try:
+        stats['sin_confirmar'] = redis_client.xpending(ORDENES_STREAM_KEY, HISTORIAL_GRUPO)['pending']
+    except redis.ResponseError:
+        stats['sin_confirmar'] = None
+    return stats
@@ -56,6 +56,32 @@ CREATE TABLE IF NOT EXISTS ventas (
     FOREIGN KEY (cliente_id) REFERENCES cliente(id)
 );
 
+-- Renglones de cada venta con precio y costo congelados al momento de la venta
+CREATE TABLE IF NOT EXISTS venta_item (
+    id SERIAL PRIMARY KEY,
+    venta_id INTEGER NOT NULL,
+    producto_id INTEGER,
+    nombre VARCHAR(100) NOT NULL,
+    cantidad INTEGER NOT NULL,
+    precio_unitario DECIMAL(10, 2) NOT NULL,
+    costo_unitario DECIMAL(10, 2) NOT NULL,
+    precio_puntos INTEGER DEFAULT 0,
+    FOREIGN KEY (venta_id) REFERENCES ventas(id) ON DELETE CASCADE,
+    FOREIGN KEY (producto_id) REFERENCES producto(id)
+);
+
+-- Acumulado de ventas por día y cajero (se actualiza en la misma transacción que cada venta)
+CREATE TABLE IF NOT EXISTS ventas_resumen_diario (
+    fecha DATE NOT NULL,
+    cajero_id INTEGER NOT NULL,
+    cantidad_ordenes INTEGER NOT NULL DEFAULT 0,
+    ingresos DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    costos DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    puntos_otorgados INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, cajero_id),
+    FOREIGN KEY (cajero_id) REFERENCES empleado(id)
+);
+
 CREATE TABLE IF NOT EXISTS cierre_caja (
     id SERIAL PRIMARY KEY,
     cajero_id INTEGER NOT NULL,
@@ -102,15 +128,19 @@ CREATE TABLE IF NOT EXISTS configuracion_ticket (
 
 -- Índices para búsquedas rápidas
 CREATE INDEX IF NOT EXISTS idx_producto_categoria ON producto(categoria_id);
-CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas(fecha_venta);
-CREATE INDEX IF NOT EXISTS idx_ventas_cajero ON ventas(cajero_id);
-CREATE INDEX IF NOT EXISTS idx_ventas_orden ON ventas(orden_id);
-CREATE INDEX IF NOT EXISTS idx_ventas_cliente ON ventas(cliente_id);
+CREATE INDEX IF NOT EXISTS idx_ventas_fecha_id ON ventas(fecha_venta, id);
+CREATE INDEX IF NOT EXISTS idx_ventas_cajero_fecha ON ventas(cajero_id, fecha_venta);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ventas_orden_unica ON ventas(orden_id);
+CREATE INDEX IF NOT EXISTS idx_ventas_cliente_fecha ON ventas(cliente_id, fecha_venta);
+CREATE INDEX IF NOT EXISTS idx_venta_item_venta ON venta_item(venta_id);
+CREATE INDEX IF NOT EXISTS idx_venta_item_producto ON venta_item(producto_id);
 CREATE INDEX IF NOT EXISTS idx_cierre_caja_fecha ON cierre_caja(fecha_cierre);
 CREATE INDEX IF NOT EXISTS idx_cierre_caja_cajero ON cierre_caja(cajero_id);
 CREATE INDEX IF NOT EXISTS idx_cliente_correo ON cliente(correo);
+CREATE INDEX IF NOT EXISTS idx_cliente_nombre_id ON cliente(nombre, id);
 CREATE INDEX IF NOT EXISTS idx_descuento_cliente ON descuento_cliente(cliente_id);
 CREATE INDEX IF NOT EXISTS idx_descuento_activo ON descuento_cliente(activo);
+CREATE INDEX IF NOT EXISTS idx_descuento_created_id ON descuento_cliente(created_at, id);
 
 
 -- Datos de ejemplo para empleados
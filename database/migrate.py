@@ -0,0 +1,224 @@
+import os
+import re
+import sys
+
+from psycopg2.extras import RealDictCursor
+from database.pool import get_db_connection, get_db_cursor
+
+# Migraciones versionadas: database/migrations/NNN_descripcion.sql
+# Cada archivo se aplica una sola vez, en su propia transacción, y queda
+# registrado en la tabla schema_migrations.
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Índices que deben existir para las consultas de ventas y descuentos
+INDICES_REQUERIDOS = {
+    'idx_ventas_cajero_fecha': ('ventas', '(cajero_id, fecha_venta)'),
+    'idx_ventas_cliente_fecha': ('ventas', '(cliente_id, fecha_venta)'),
+    'idx_descuento_cliente_activo': ('descuento_cliente', 'UNIQUE (cliente_id) WHERE activo'),
+    'idx_ventas_fecha_id': ('ventas', '(fecha_venta, id)'),
+    'idx_cliente_nombre_id': ('cliente', '(nombre, id)'),
+    'idx_descuento_created_id': ('descuento_cliente', '(created_at, id)'),
+    'idx_orden_status_creada': ('orden', '(status, creada_en)'),
+    'idx_ventas_orden_unica': ('ventas', 'UNIQUE (orden_id)'),
+}
+
+# Consultas de db.py que deben usar índices (parámetros de ejemplo)
+CONSULTAS_EXPLAIN = [
+    ('get_ventas_by_cajero', """
+        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, fecha_venta, items
+        FROM ventas
+        WHERE cajero_id = %(cajero_id)s
+        AND fecha_venta >= CURRENT_DATE
+        AND fecha_venta < CURRENT_DATE + 1
+        ORDER BY fecha_venta DESC
+    """),
+    ('get_ventas_del_dia', """
+        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, fecha_venta, items
+        FROM ventas
+        WHERE fecha_venta >= CURRENT_DATE
+        AND fecha_venta < CURRENT_DATE + 1
+        ORDER BY fecha_venta DESC
+    """),
+    ('get_resumen_ventas_turno', """
+        SELECT COUNT(*) as cantidad_ordenes, COALESCE(SUM(total), 0) as total_ventas
+        FROM ventas
+        WHERE cajero_id = %(cajero_id)s
+        AND fecha_venta >= CURRENT_DATE
+    """),
+    ('get_ventas_por_empleado', """
+        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, fecha_venta, items
+        FROM ventas
+        WHERE cajero_id = %(cajero_id)s
+        AND fecha_venta >= %(fecha_inicio)s::date
+        AND fecha_venta < %(fecha_fin)s::date + 1
+        ORDER BY fecha_venta DESC, id DESC
+        LIMIT 51
+    """),
+    ('get_ordenes_por_cliente', """
+        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, items, fecha_venta, notas
+        FROM ventas
+        WHERE cliente_id = %(cliente_id)s
+        AND (fecha_venta, id) < (NOW(), 0)
+        ORDER BY fecha_venta DESC, id DESC
+        LIMIT 51
+    """),
+    ('get_ventas_recientes', """
+        SELECT id, orden_id, cajero_nombre, total, pago_con, cambio, fecha_venta, items
+        FROM ventas
+        WHERE (fecha_venta, id) < (NOW(), 0)
+        ORDER BY fecha_venta DESC, id DESC
+        LIMIT 51
+    """),
+    ('get_all_clientes', """
+        SELECT id, nombre, correo, puntos_acumulados, ultima_visita, created_at
+        FROM cliente
+        WHERE (nombre, id) > ('M', 0)
+        ORDER BY nombre, id
+        LIMIT 51
+    """),
+    ('get_descuento_activo_cliente', """
+        SELECT id, cliente_id, porcentaje_descuento, fecha_fin
+        FROM descuento_cliente
+        WHERE cliente_id = %(cliente_id)s
+        AND activo = true
+        AND (fecha_fin IS NULL OR fecha_fin >= CURRENT_TIMESTAMP)
+        LIMIT 1
+    """),
+]
+
+def _asegurar_tabla_migraciones(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            nombre VARCHAR(255) NOT NULL,
+            aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def listar_migraciones():
+    """Obtiene las migraciones disponibles como [(version, nombre, ruta)] ordenadas"""
+    migraciones = []
+    for archivo in os.listdir(MIGRATIONS_DIR):
+        match = re.match(r'^(\d+)_.+\.sql$', archivo)
+        if match:
+            migraciones.append((int(match.group(1)), archivo, os.path.join(MIGRATIONS_DIR, archivo)))
+    return sorted(migraciones)
+
+def get_migraciones_aplicadas():
+    """Obtiene las versiones ya aplicadas"""
+    with get_db_cursor() as cursor:
+        _asegurar_tabla_migraciones(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {fila[0] for fila in cursor.fetchall()}
+
+def aplicar_migraciones():
+    """Aplica las migraciones pendientes en orden; regresa los nombres aplicados"""
+    aplicadas = get_migraciones_aplicadas()
+    nuevas = []
+
+    for version, nombre, ruta in listar_migraciones():
+        if version in aplicadas:
+            continue
+
+        with open(ruta, encoding='utf-8') as f:
+            sql = f.read()
+
+        # Una transacción por migración: si falla no queda a medias ni registrada
+        with get_db_cursor() as cursor:
+            cursor.execute(sql)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, nombre) VALUES (%s, %s)",
+                (version, nombre)
+            )
+        print(f"Migración aplicada: {nombre}")
+        nuevas.append(nombre)
+
+    return nuevas
+
+def verificar_indices():
+    """Verifica que existan los índices requeridos; regresa la lista de faltantes"""
+    with get_db_cursor(RealDictCursor) as cursor:
+        cursor.execute(
+            "SELECT indexname, tablename, indexdef FROM pg_indexes WHERE indexname = ANY(%s)",
+            (list(INDICES_REQUERIDOS.keys()),)
+        )
+        existentes = {fila['indexname']: fila for fila in cursor.fetchall()}
+
+    faltantes = []
+    for nombre, (tabla, definicion) in INDICES_REQUERIDOS.items():
+        indice = existentes.get(nombre)
+        if not indice or indice['tablename'] != tabla:
+            faltantes.append(nombre)
+            print(f"FALTA   {nombre} ON {tabla} {definicion}")
+        else:
+            print(f"OK      {indice['indexdef']}")
+
+    return faltantes
+
+def explicar_consultas(filas_sinteticas=0):
+    """
+    Imprime el plan (EXPLAIN ANALYZE) de las consultas de ventas y descuentos.
+
+    Con filas_sinteticas > 0 inserta primero esa cantidad de ventas de prueba
+    y actualiza estadísticas; todo se revierte al terminar.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if filas_sinteticas:
+                cursor.execute("""
+                    INSERT INTO ventas (orden_id, cajero_id, cajero_nombre, cliente_id, total, pago_con, cambio, items, fecha_venta)
+                    SELECT
+                        'sintetica-' || g,
+                        e.ids[1 + g %% array_length(e.ids, 1)],
+                        'Sintético',
+                        CASE WHEN g %% 3 = 0 THEN c.ids[1 + g %% array_length(c.ids, 1)] END,
+                        100, 100, 0, '[]'::jsonb,
+                        NOW() - (g %% 365) * INTERVAL '1 day' - (g %% 86400) * INTERVAL '1 second'
+                    FROM generate_series(1, %s) g,
+                         (SELECT array_agg(id) as ids FROM empleado) e,
+                         (SELECT array_agg(id) as ids FROM cliente) c
+                """, (filas_sinteticas,))
+                cursor.execute("ANALYZE ventas")
+                print(f"Insertadas {filas_sinteticas} ventas sintéticas (se revertirán)\n")
+
+            cursor.execute("SELECT MIN(id) FROM empleado")
+            cajero_id = cursor.fetchone()[0]
+            cursor.execute("SELECT MIN(id) FROM cliente")
+            cliente_id = cursor.fetchone()[0]
+            params = {
+                'cajero_id': cajero_id,
+                'cliente_id': cliente_id,
+                'fecha_inicio': '2000-01-01',
+                'fecha_fin': '2000-01-31'
+            }
+
+            for nombre, sql in CONSULTAS_EXPLAIN:
+                cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+                plan = [fila[0] for fila in cursor.fetchall()]
+                usa_indice = any('Index' in linea for linea in plan)
+                print(f"===== {nombre} ({'usa índice' if usa_indice else 'SIN ÍNDICE'}) =====")
+                print('\n'.join(plan))
+                print()
+        finally:
+            cursor.close()
+            # Nunca conservar los datos sintéticos
+            conn.rollback()
+
+if __name__ == '__main__':
+    # python -m database.migrate                 -> aplica migraciones pendientes
+    # python -m database.migrate verificar       -> verifica índices requeridos
+    # python -m database.migrate explain [filas] -> planes de las consultas (con N ventas sintéticas)
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'aplicar'
+
+    if comando == 'aplicar':
+        nuevas = aplicar_migraciones()
+        print(f"{len(nuevas)} migraciones aplicadas" if nuevas else "La base de datos está al día")
+        sys.exit(1 if verificar_indices() else 0)
+    elif comando == 'verificar':
+        sys.exit(1 if verificar_indices() else 0)
+    elif comando == 'explain':
+        explicar_consultas(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    else:
+        print(f"Comando desconocido: {comando}")
+        sys.exit(2)
@@ -0,0 +1,31 @@
+-- Tabla normalizada de renglones de venta y migración de ventas.items (JSONB)
+CREATE TABLE IF NOT EXISTS venta_item (
+    id SERIAL PRIMARY KEY,
+    venta_id INTEGER NOT NULL,
+    producto_id INTEGER,
+    nombre VARCHAR(100) NOT NULL,
+    cantidad INTEGER NOT NULL,
+    precio_unitario DECIMAL(10, 2) NOT NULL,
+    costo_unitario DECIMAL(10, 2) NOT NULL,
+    precio_puntos INTEGER DEFAULT 0,
+    FOREIGN KEY (venta_id) REFERENCES ventas(id) ON DELETE CASCADE,
+    FOREIGN KEY (producto_id) REFERENCES producto(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_venta_item_venta ON venta_item(venta_id);
+CREATE INDEX IF NOT EXISTS idx_venta_item_producto ON venta_item(producto_id);
+
+-- Copiar los items de las ventas existentes (solo las que aún no tienen renglones)
+INSERT INTO venta_item (venta_id, producto_id, nombre, cantidad, precio_unitario, costo_unitario, precio_puntos)
+SELECT
+    v.id,
+    p.id,
+    LEFT(COALESCE(item->>'nombre', p.nombre, 'Producto'), 100),
+    COALESCE((item->>'cantidad')::integer, 1),
+    COALESCE((item->>'precio')::numeric, 0),
+    COALESCE((item->>'costo')::numeric, p.costo, 0),
+    COALESCE((item->>'precio_puntos')::integer, 0)
+FROM ventas v
+CROSS JOIN LATERAL jsonb_array_elements(v.items) AS item
+LEFT JOIN producto p ON p.id = NULLIF(item->>'id', '')::integer
+WHERE NOT EXISTS (SELECT 1 FROM venta_item vi WHERE vi.venta_id = v.id);
@@ -0,0 +1,32 @@
+-- Acumulado diario de ventas por cajero y reconstrucción del historial
+CREATE TABLE IF NOT EXISTS ventas_resumen_diario (
+    fecha DATE NOT NULL,
+    cajero_id INTEGER NOT NULL,
+    cantidad_ordenes INTEGER NOT NULL DEFAULT 0,
+    ingresos DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    costos DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    puntos_otorgados INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, cajero_id),
+    FOREIGN KEY (cajero_id) REFERENCES empleado(id)
+);
+
+LOCK TABLE ventas_resumen_diario IN EXCLUSIVE MODE;
+
+DELETE FROM ventas_resumen_diario;
+
+-- Puntos otorgados: 5% del total en ventas en efectivo con cliente (misma regla que procesar_pago)
+INSERT INTO ventas_resumen_diario (fecha, cajero_id, cantidad_ordenes, ingresos, costos, puntos_otorgados)
+SELECT
+    v.fecha_venta::date,
+    v.cajero_id,
+    COUNT(*),
+    SUM(v.total),
+    COALESCE(SUM(vi.costo), 0),
+    SUM(CASE WHEN v.cliente_id IS NOT NULL AND v.pago_con > 0 THEN FLOOR(v.total * 0.05) ELSE 0 END)
+FROM ventas v
+LEFT JOIN LATERAL (
+    SELECT SUM(costo_unitario * cantidad) AS costo
+    FROM venta_item
+    WHERE venta_id = v.id
+) vi ON true
+GROUP BY v.fecha_venta::date, v.cajero_id;
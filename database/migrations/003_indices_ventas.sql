@@ -0,0 +1,13 @@
+-- Índices compuestos para las consultas por cajero/cliente y rango de fechas.
+-- Reemplazan a los índices de una sola columna, que quedan cubiertos por el prefijo.
+CREATE INDEX IF NOT EXISTS idx_ventas_cajero_fecha ON ventas(cajero_id, fecha_venta);
+CREATE INDEX IF NOT EXISTS idx_ventas_cliente_fecha ON ventas(cliente_id, fecha_venta);
+
+DROP INDEX IF EXISTS idx_ventas_cajero;
+DROP INDEX IF EXISTS idx_ventas_cliente;
+
+-- Descuento activo por cliente. No es único para que la migración no falle en
+-- bases con descuentos activos duplicados; 007 los limpia y lo hace único.
+CREATE INDEX IF NOT EXISTS idx_descuento_cliente_activo
+ON descuento_cliente(cliente_id)
+WHERE activo = true;
@@ -0,0 +1,7 @@
+-- Índices para la paginación por keyset (orden estable: llave + id)
+CREATE INDEX IF NOT EXISTS idx_cliente_nombre_id ON cliente(nombre, id);
+CREATE INDEX IF NOT EXISTS idx_descuento_created_id ON descuento_cliente(created_at, id);
+
+-- (fecha_venta, id) cubre también las consultas por rango de fecha_venta
+CREATE INDEX IF NOT EXISTS idx_ventas_fecha_id ON ventas(fecha_venta, id);
+DROP INDEX IF EXISTS idx_ventas_fecha;
@@ -0,0 +1,22 @@
+-- Historial de órdenes (creadas, vistas en cocina, pagadas y canceladas).
+-- Lo llena en lotes el escritor en segundo plano a partir del stream de
+-- eventos de órdenes en Redis; las órdenes que expiran sin pagarse
+-- (abandonadas) quedan en 'expirada'.
+CREATE TABLE IF NOT EXISTS orden (
+    orden_id VARCHAR(36) PRIMARY KEY,
+    cajero_id INTEGER,
+    cajero_nombre VARCHAR(100),
+    cliente_id INTEGER,
+    items JSONB,
+    total DECIMAL(10, 2),
+    notas TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    status_seq BIGINT NOT NULL DEFAULT 0,
+    creada_en TIMESTAMP,
+    vista_por VARCHAR(100),
+    vista_en TIMESTAMP,
+    cerrada_en TIMESTAMP,
+    FOREIGN KEY (cajero_id) REFERENCES empleado(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_orden_status_creada ON orden(status, creada_en);
@@ -0,0 +1,6 @@
+-- Una sola venta por orden: si un cobro lento termina después de que otra
+-- caja retomó la orden (COBRO_PLAZO), el segundo INSERT falla en lugar de
+-- registrar y cobrar la orden dos veces. Si ya hay órdenes duplicadas en
+-- ventas, hay que resolverlas antes de aplicar esta migración.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ventas_orden_unica ON ventas(orden_id);
+DROP INDEX IF EXISTS idx_ventas_orden;
@@ -0,0 +1,18 @@
+-- Un solo descuento activo por cliente. Si un cliente quedó con varios
+-- activos, se conserva el más reciente y los demás se desactivan antes de
+-- crear el índice único (reemplaza al índice parcial de 003).
+UPDATE descuento_cliente d
+SET activo = false
+WHERE d.activo = true
+AND d.cliente_id IS NOT NULL
+AND EXISTS (
+    SELECT 1 FROM descuento_cliente n
+    WHERE n.cliente_id = d.cliente_id
+    AND n.activo = true
+    AND n.id > d.id
+);
+
+DROP INDEX IF EXISTS idx_descuento_cliente_activo;
+CREATE UNIQUE INDEX idx_descuento_cliente_activo
+ON descuento_cliente(cliente_id)
+WHERE activo = true;
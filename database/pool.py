@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from config import Config
+
+# Estado del pool (uno por proceso)
+_pool = None
+_pool_pid = None
+_slots = None
+_pool_lock = threading.Lock()
+
+# Última vez que cada conexión regresó al pool (para el health check)
+_ultimo_uso = {}
+
+_stats_lock = threading.Lock()
+_stats = {
+    'checkouts': 0,
+    'waits': 0,
+    'wait_time_total': 0.0,
+    'timeouts': 0,
+    'health_check_failures': 0,
+    'in_use': 0
+}
+
+def _crear_pool():
+    """Crea el pool de conexiones con los parámetros de Config"""
+    return pg_pool.ThreadedConnectionPool(
+        Config.DB_POOL_MIN,
+        Config.DB_POOL_MAX,
+        host=Config.POSTGRES_HOST,
+        port=Config.POSTGRES_PORT,
+        database=Config.POSTGRES_DB,
+        user=Config.POSTGRES_USER,
+        password=Config.POSTGRES_PASSWORD
+    )
+
+def _get_pool():
+    """Obtiene el pool del proceso actual, creándolo si no existe o si el proceso fue bifurcado"""
+    global _pool, _pool_pid, _slots
+
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool, _slots
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # Las conexiones heredadas de otro proceso no se pueden reutilizar
+            _ultimo_uso.clear()
+            _pool = _crear_pool()
+            _pool_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(Config.DB_POOL_MAX)
+
+    return _pool, _slots
+
+def _incrementar_stat(nombre, valor=1):
+    with _stats_lock:
+        _stats[nombre] += valor
+
+def _conexion_saludable(conn):
+    """Verifica que la conexión siga viva antes de entregarla"""
+    if conn.closed:
+        return False
+
+    ultimo_uso = _ultimo_uso.get(id(conn))
+    if ultimo_uso is not None and time.monotonic() - ultimo_uso < Config.DB_POOL_HEALTHCHECK:
+        return True
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _checkout():
+    """Toma una conexión sana del pool, esperando si todas están ocupadas"""
+    pool, slots = _get_pool()
+
+    if not slots.acquire(blocking=False):
+        _incrementar_stat('waits')
+        inicio = time.monotonic()
+        adquirido = slots.acquire(timeout=Config.DB_POOL_TIMEOUT)
+        _incrementar_stat('wait_time_total', time.monotonic() - inicio)
+        if not adquirido:
+            _incrementar_stat('timeouts')
+            raise pg_pool.PoolError(
+                f"No hay conexiones disponibles después de {Config.DB_POOL_TIMEOUT}s"
+            )
+
+    try:
+        # Descartar conexiones caídas hasta obtener una sana
+        for _ in range(Config.DB_POOL_MAX + 1):
+            conn = pool.getconn()
+            if _conexion_saludable(conn):
+                break
+            _incrementar_stat('health_check_failures')
+            _ultimo_uso.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        else:
+            raise pg_pool.PoolError("No se pudo obtener una conexión sana del pool")
+    except Exception:
+        slots.release()
+        raise
+
+    _incrementar_stat('checkouts')
+    _incrementar_stat('in_use')
+    return pool, slots, conn
+
+def _checkin(pool, slots, conn):
+    """Regresa una conexión al pool (o la descarta si quedó cerrada)"""
+    try:
+        if conn.closed:
+            _ultimo_uso.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        else:
+            _ultimo_uso[id(conn)] = time.monotonic()
+            pool.putconn(conn)
+    finally:
+        _incrementar_stat('in_use', -1)
+        slots.release()
+
+@contextmanager
+def get_db_connection():
+    """
+    Toma una conexión del pool para un bloque `with`.
+
+    Hace commit al salir sin errores y rollback si ocurre una excepción,
+    así la conexión siempre regresa al pool sin transacciones abiertas.
+    """
+    pool, slots, conn = _checkout()
+    try:
+        yield conn
+        if not conn.closed:
+            conn.commit()
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        raise
+    finally:
+        _checkin(pool, slots, conn)
+
+@contextmanager
+def get_db_cursor(cursor_factory=None):
+    """Atajo para obtener un cursor dentro de una conexión del pool"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=cursor_factory)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+def get_pool_stats():
+    """Obtiene las estadísticas del pool de conexiones de este proceso"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    stats['pid'] = os.getpid()
+    stats['min_size'] = Config.DB_POOL_MIN
+    stats['max_size'] = Config.DB_POOL_MAX
+    stats['wait_time_total'] = round(stats['wait_time_total'], 4)
+    stats['idle'] = len(_pool._pool) if _pool is not None and _pool_pid == os.getpid() else 0
+    return stats
+
+def close_pool():
+    """Cierra todas las conexiones del pool"""
+    global _pool, _pool_pid, _slots
+
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+        _slots = None
+        _ultimo_uso.clear()
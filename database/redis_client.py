@@ -1,5 +1,8 @@
 import redis
 import json
+import time
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
 from config import Config
 
 redis_client = redis.Redis(
@@ -9,151 +12,621 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# Mismo Redis sin decodificar respuestas, para valores binarios (PDFs)
+redis_binario = redis.Redis(
+    host=Config.REDIS_HOST,
+    port=Config.REDIS_PORT,
+    db=Config.REDIS_DB
+)
+
+# ===== SESIÓN =====
+# Todo el estado de una sesión de cajero vive en un solo hash con un TTL
+# deslizante que se renueva en cada lectura:
+#   sesion:{id} -> empleado (JSON), caja y caja_inicial (centavos), fecha_inicio
+SESION_KEY = "sesion:{}"
+
+# Layout anterior (una key por dato); se migra al hash la primera vez que se lee
+_SESION_LEGACY_KEYS = ("session:{}", "caja:{}", "caja_inicial:{}", "fecha_inicio:{}")
+
+def _sesion_key(session_id):
+    return SESION_KEY.format(session_id)
+
+def _migrar_sesion_legacy(session_id):
+    """Copia una sesión viva del layout anterior al hash y borra las keys viejas"""
+    legacy = [k.format(session_id) for k in _SESION_LEGACY_KEYS]
+    pipe = redis_client.pipeline(transaction=False)
+    for key in legacy:
+        pipe.get(key)
+    pipe.ttl(legacy[0])
+    empleado, caja, caja_inicial, fecha_inicio, ttl = pipe.execute()
+
+    if not empleado:
+        return {}
+
+    estado = {'empleado': empleado}
+    if caja is not None:
+        estado['caja'] = _a_centavos(_de_centavos(caja))
+    if caja_inicial is not None:
+        estado['caja_inicial'] = _a_centavos(_de_centavos(caja_inicial))
+    if fecha_inicio is not None:
+        estado['fecha_inicio'] = fecha_inicio
+
+    pipe = redis_client.pipeline()
+    pipe.hset(_sesion_key(session_id), mapping=estado)
+    pipe.expire(_sesion_key(session_id), ttl if ttl and ttl > 0 else Config.SESSION_TIMEOUT)
+    pipe.delete(*legacy)
+    pipe.execute()
+    return {k: str(v) for k, v in estado.items()}
+
+def _leer_sesion(session_id):
+    """Lee el hash de la sesión y renueva su TTL en un solo round trip"""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(_sesion_key(session_id))
+    pipe.expire(_sesion_key(session_id), Config.SESSION_TIMEOUT)
+    estado, _ = pipe.execute()
+    return estado or _migrar_sesion_legacy(session_id)
+
+def _guardar_en_sesion(session_id, **campos):
+    pipe = redis_client.pipeline()
+    pipe.hset(_sesion_key(session_id), mapping=campos)
+    pipe.expire(_sesion_key(session_id), Config.SESSION_TIMEOUT)
+    pipe.execute()
+
+def get_estado_sesion(session_id):
+    """
+    Obtiene todo el estado de la sesión en una sola lectura:
+    {'empleado', 'caja', 'caja_inicial', 'fecha_inicio'} (None si falta alguno).
+    """
+    estado = _leer_sesion(session_id)
+    return {
+        'empleado': json.loads(estado['empleado']) if estado.get('empleado') else None,
+        'caja': _de_centavos(estado.get('caja')),
+        'caja_inicial': _de_centavos(estado.get('caja_inicial')),
+        'fecha_inicio': estado.get('fecha_inicio') or None
+    }
+
 def save_session(session_id, data):
-    redis_client.setex(
-        f"session:{session_id}",
-        Config.SESSION_TIMEOUT,
-        json.dumps(data)
-    )
+    _guardar_en_sesion(session_id, empleado=json.dumps(data))
 
 def get_session(session_id):
-    data = redis_client.get(f"session:{session_id}")
-    return json.loads(data) if data else None
+    return get_estado_sesion(session_id)['empleado']
 
 def delete_session(session_id):
-    redis_client.delete(f"session:{session_id}")
+    redis_client.delete(_sesion_key(session_id))
 
-def save_caja_inicial(session_id, monto):
-    key = f"caja:{session_id}"
-    redis_client.setex(key, Config.SESSION_TIMEOUT, monto)
+# ===== CAJA =====
+# El efectivo de la caja se guarda en centavos (entero) para poder usar
+# operaciones atómicas de Redis y no acumular errores de punto flotante.
+# Lua: ajusta la caja de la sesión solo si existe y, si se pide, solo si
+# alcanza para dar el cambio; en la misma operación renueva el TTL.
+# Regresa {1, nuevo} si se aplicó, {0, actual} si no alcanza y {-1, 0} si no hay caja.
+_AJUSTAR_CAJA_LUA = """
+local actual = redis.call('HGET', KEYS[1], 'caja')
+if not actual then
+    return {-1, 0}
+end
+actual = tonumber(actual)
+local monto = tonumber(ARGV[1])
+local cambio = tonumber(ARGV[2])
+if ARGV[4] == '1' and cambio > 0 and actual + monto - cambio < 0 then
+    return {0, actual}
+end
+local nuevo = actual + monto
+redis.call('HSET', KEYS[1], 'caja', nuevo)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, nuevo}
+"""
+_ajustar_caja = redis_client.register_script(_AJUSTAR_CAJA_LUA)
 
-def get_caja_inicial(session_id):
-    return redis_client.get(f"caja:{session_id}")
+def _a_centavos(monto):
+    """Convierte un monto en pesos a centavos exactos (redondeo comercial)"""
+    return int(Decimal(str(monto)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+
+def _de_centavos(valor):
+    """Convierte el valor guardado en Redis a pesos; acepta el formato anterior en pesos"""
+    if valor is None:
+        return None
+    if '.' in valor:
+        return float(Decimal(valor).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+    return int(valor) / 100
+
+def abrir_caja(session_id, monto, fecha_inicio):
+    """Guarda el monto inicial, la caja actual y la fecha de inicio del turno en una sola escritura"""
+    centavos = _a_centavos(monto)
+    _guardar_en_sesion(
+        session_id,
+        caja=centavos,
+        caja_inicial=centavos,
+        fecha_inicio=str(fecha_inicio)
+    )
 
 def get_caja_inicial_original(session_id):
     """Obtiene el monto inicial de caja (sin modificaciones)"""
-    monto = redis_client.get(f"caja_inicial:{session_id}")
-    return float(monto) if monto else None
+    return get_estado_sesion(session_id)['caja_inicial']
 
-def set_caja_inicial_original(session_id, monto):
-    """Guarda el monto inicial de caja en una key separada"""
-    redis_client.setex(
-        f"caja_inicial:{session_id}",
-        Config.SESSION_TIMEOUT,
-        str(float(monto))
+def actualizar_caja(session_id, monto_agregar):
+    """Suma (o resta) un monto a la caja de forma atómica; regresa el nuevo monto o None"""
+    aplicado, centavos = _ajustar_caja(
+        keys=[_sesion_key(session_id)],
+        args=[_a_centavos(monto_agregar), 0, Config.SESSION_TIMEOUT, '0']
     )
+    return centavos / 100 if aplicado == 1 else None
 
-def actualizar_caja(session_id, monto_agregar):
-    """Actualiza el monto de la caja sumando la ganancia"""
-    caja_actual = get_caja_inicial(session_id)
-    if caja_actual:
-        nuevo_monto = float(caja_actual) + float(monto_agregar)
-        key = f"caja:{session_id}"
-        redis_client.setex(key, Config.SESSION_TIMEOUT, nuevo_monto)
-        return nuevo_monto
-    return None
+def cobrar_en_caja(session_id, total, cambio):
+    """
+    Verifica que haya efectivo para dar el cambio y suma el total a la caja en
+    una sola operación atómica.
+
+    Regresa (aplicado, caja): aplicado es False si no alcanza para el cambio
+    (caja es el efectivo disponible) y caja es None si la sesión no tiene caja.
+    """
+    aplicado, centavos = _ajustar_caja(
+        keys=[_sesion_key(session_id)],
+        args=[_a_centavos(total), _a_centavos(cambio), Config.SESSION_TIMEOUT, '1']
+    )
+    if aplicado == -1:
+        return True, None
+    return aplicado == 1, centavos / 100
 
 def get_caja_actual(session_id):
     """Obtiene el monto actual de la caja"""
-    monto = redis_client.get(f"caja:{session_id}")
-    return float(monto) if monto else None
+    return get_estado_sesion(session_id)['caja']
+
+# ===== ÓRDENES =====
+# Índice de órdenes activas: un sorted set por fecha de creación y un set por
+# estado. Evita recorrer el keyspace con KEYS orden:* para listar órdenes.
+ORDENES_INDEX_KEY = "ordenes:activas"
+ORDENES_STATUS_KEY = "ordenes:status:{}"
+ESTADOS_ORDEN = ('pendiente', 'cobrando', 'pagada', 'cancelada')
+
+def _score_orden(data):
+    """Obtiene el score (timestamp de creación) de una orden para el índice"""
+    try:
+        return datetime.fromisoformat(data['fecha']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+def _indexar_orden(pipe, orden_id, data):
+    """Agrega al pipeline los comandos para registrar la orden en el índice"""
+    status = data.get('status', 'pendiente')
+    # NX conserva la fecha de creación original cuando la orden se vuelve a guardar
+    pipe.zadd(ORDENES_INDEX_KEY, {orden_id: _score_orden(data)}, nx=True)
+    for estado in ESTADOS_ORDEN:
+        if estado != status:
+            pipe.srem(ORDENES_STATUS_KEY.format(estado), orden_id)
+    pipe.sadd(ORDENES_STATUS_KEY.format(status), orden_id)
+
+def _desindexar_ordenes(pipe, orden_ids):
+    """Agrega al pipeline los comandos para quitar órdenes del índice"""
+    pipe.zrem(ORDENES_INDEX_KEY, *orden_ids)
+    for estado in ESTADOS_ORDEN:
+        pipe.srem(ORDENES_STATUS_KEY.format(estado), *orden_ids)
 
 def save_orden(orden_id, data):
-    """Guarda una orden en Redis"""
-    redis_client.setex(
+    """
+    Guarda una orden en Redis. Los renglones van compactos ([id, cantidad,
+    precio]); ver database.catalogo.compactar_items.
+    """
+    pipe = redis_client.pipeline()
+    pipe.setex(
         f"orden:{orden_id}",
         Config.SESSION_TIMEOUT,
-        json.dumps(data)
+        json.dumps(data, separators=(',', ':'))
     )
+    _indexar_orden(pipe, orden_id, data)
+    pipe.execute()
 
 def get_orden(orden_id):
     """Obtiene una orden específica"""
     data = redis_client.get(f"orden:{orden_id}")
     return json.loads(data) if data else None
 
-def get_all_ordenes():
-    """Obtiene todas las órdenes activas"""
-    keys = redis_client.keys("orden:*")
+def _listar_ordenes(status=None):
+    """
+    Lista las órdenes del índice en orden de creación: un ZRANGE (más los sets
+    de los estados si se filtra) y un MGET. Las órdenes que ya expiraron en
+    Redis se omiten; las saca del índice barrer_ordenes_expiradas, que además
+    avisa a las pantallas.
+    """
+    if isinstance(status, str):
+        status = (status,)
+    
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrange(ORDENES_INDEX_KEY, 0, -1)
+    for estado in status or ():
+        pipe.smembers(ORDENES_STATUS_KEY.format(estado))
+    resultados = pipe.execute()
+    
+    orden_ids = resultados[0]
+    if status:
+        con_status = set().union(*resultados[1:])
+        orden_ids = [oid for oid in orden_ids if oid in con_status]
+    
+    if not orden_ids:
+        return []
+    
+    valores = redis_client.mget([f"orden:{oid}" for oid in orden_ids])
+    
     ordenes = []
-    for key in keys:
-        data = redis_client.get(key)
-        if data:
-            try:
-                orden = json.loads(data)
-                # Asegurar que orden_id esté presente
-                if 'orden_id' not in orden:
-                    orden['orden_id'] = key.split('orden:')[-1] if ':' in key else key.replace('orden:', '')
-                ordenes.append(orden)
-            except json.JSONDecodeError:
-                print(f"Error al decodificar orden: {key}")
-                continue
+    for orden_id, data in zip(orden_ids, valores):
+        if data is None:
+            continue
+        try:
+            orden = json.loads(data)
+        except json.JSONDecodeError:
+            print(f"Error al decodificar orden: orden:{orden_id}")
+            continue
+        # El set de estado puede ir un paso atrás del JSON; el JSON manda
+        if status and orden.get('status') not in status:
+            continue
+        # Asegurar que orden_id esté presente
+        if 'orden_id' not in orden:
+            orden['orden_id'] = orden_id
+        ordenes.append(orden)
+    
     return ordenes
 
+def barrer_ordenes_expiradas():
+    """
+    Saca del índice las órdenes cuyo JSON ya expiró (SESSION_TIMEOUT sin
+    pagarse) y regresa sus IDs. Cada orden la regresa un solo proceso: solo
+    cuenta quien logró el ZREM, así que varios workers pueden barrer a la vez
+    sin publicar dos veces la misma expiración.
+    """
+    orden_ids = redis_client.zrange(ORDENES_INDEX_KEY, 0, -1)
+    if not orden_ids:
+        return []
+    
+    pipe = redis_client.pipeline(transaction=False)
+    for orden_id in orden_ids:
+        pipe.exists(f"orden:{orden_id}")
+    expiradas = [oid for oid, existe in zip(orden_ids, pipe.execute()) if not existe]
+    if not expiradas:
+        return []
+    
+    pipe = redis_client.pipeline()
+    for orden_id in expiradas:
+        pipe.zrem(ORDENES_INDEX_KEY, orden_id)
+    for estado in ESTADOS_ORDEN:
+        pipe.srem(ORDENES_STATUS_KEY.format(estado), *expiradas)
+    quitadas = pipe.execute()[:len(expiradas)]
+    return [oid for oid, quitada in zip(expiradas, quitadas) if quitada]
+
+def get_all_ordenes():
+    """Obtiene todas las órdenes activas"""
+    return _listar_ordenes()
+
 def delete_orden(orden_id):
     """Elimina una orden de Redis"""
-    redis_client.delete(f"orden:{orden_id}")
+    pipe = redis_client.pipeline()
+    pipe.delete(f"orden:{orden_id}")
+    _desindexar_ordenes(pipe, [orden_id])
+    pipe.execute()
 
-def update_orden_status(orden_id, status):
-    """Actualiza el estado de una orden"""
-    orden = get_orden(orden_id)
-    if orden:
-        if status == 'pagada':
-            # Si la orden está pagada, la eliminamos de Redis
-            # porque ya está guardada en PostgreSQL
-            delete_orden(orden_id)
-            return True
-        else:
-            orden['status'] = status
-            save_orden(orden_id, orden)
+# ===== MÁQUINA DE ESTADOS DE LA ORDEN =====
+# pendiente -> cobrando -> pagada, pendiente -> cancelada. Cada cambio es un
+# compare-and-set en Lua sobre la propia orden: dos cajas (o dos clics) que
+# intentan cobrarla a la vez no pueden pasar ambas a 'cobrando', y no hay
+# ningún lock compartido entre órdenes distintas. Un cobro que falla regresa
+# a 'pendiente'; uno abandonado (el worker murió a medias) se puede retomar
+# cuando pasa COBRO_PLAZO. Si el primero solo era lento, el índice único de
+# ventas.orden_id impide que ambos registren la venta. Pagada y cancelada
+# sacan la orden de Redis.
+TRANSICIONES_ORDEN = {
+    'pendiente': ('cobrando', 'cancelada'),
+    'cobrando': ('pagada', 'pendiente'),
+}
+ESTADOS_FINALES = ('pagada', 'cancelada')
+COBRO_PLAZO = 120  # segundos
+
+# KEYS: orden, índice, sets de estado (en el orden de ESTADOS_ORDEN)
+# ARGV: estado esperado, estado nuevo, ahora, plazo de cobro, orden_id, ¿final?,
+#       posición del estado nuevo en ESTADOS_ORDEN
+_TRANSICIONAR_ORDEN_LUA = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return {0, ''}
+end
+local orden = cjson.decode(data)
+local actual = orden['status'] or 'pendiente'
+local permitido = actual == ARGV[1]
+if not permitido and ARGV[1] == 'pendiente' and actual == 'cobrando' then
+    permitido = tonumber(orden['cobrando_desde'] or 0) + tonumber(ARGV[4]) < tonumber(ARGV[3])
+end
+if not permitido then
+    return {0, actual}
+end
+for i = 3, #KEYS do
+    redis.call('SREM', KEYS[i], ARGV[5])
+end
+if ARGV[6] == '1' then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[5])
+    return {1, actual}
+end
+orden['status'] = ARGV[2]
+if ARGV[2] == 'cobrando' then
+    orden['cobrando_desde'] = tonumber(ARGV[3])
+else
+    orden['cobrando_desde'] = nil
+end
+redis.call('SET', KEYS[1], cjson.encode(orden), 'KEEPTTL')
+redis.call('SADD', KEYS[3 + tonumber(ARGV[7])], ARGV[5])
+return {1, actual}
+"""
+_transicionar_orden = redis_client.register_script(_TRANSICIONAR_ORDEN_LUA)
+
+# Modifica un campo solo si la orden sigue existiendo (no la revive si se pagó)
+_MARCAR_VISTA_LUA = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return false
+end
+local orden = cjson.decode(data)
+orden['vista_por'] = ARGV[1]
+data = cjson.encode(orden)
+redis.call('SET', KEYS[1], data, 'KEEPTTL')
+return data
+"""
+_marcar_vista = redis_client.register_script(_MARCAR_VISTA_LUA)
+
+def transicionar_orden(orden_id, desde, hacia):
+    """
+    Cambia la orden de `desde` a `hacia` solo si sigue en `desde`.
+    Regresa (True, estado_anterior) o (False, estado_actual); el estado
+    actual es None si la orden ya no existe.
+    """
+    if hacia not in TRANSICIONES_ORDEN.get(desde, ()):
+        raise ValueError(f"Transición de orden inválida: {desde} -> {hacia}")
+    
+    final = hacia in ESTADOS_FINALES
+    hecho, actual = _transicionar_orden(
+        keys=[f"orden:{orden_id}", ORDENES_INDEX_KEY] + [ORDENES_STATUS_KEY.format(e) for e in ESTADOS_ORDEN],
+        args=[desde, hacia, time.time(), COBRO_PLAZO, orden_id, '1' if final else '0',
+              ESTADOS_ORDEN.index(hacia)]
+    )
+    return bool(hecho), actual or None
+
+def cerrar_orden_pagada(orden_id):
+    """
+    Saca de Redis una orden cuya venta ya está en PostgreSQL. Si mientras
+    tanto otra caja la regresó a 'pendiente' (o la retomó pasado COBRO_PLAZO),
+    la vuelve a tomar para cerrarla. Regresa True si esta llamada la cerró y
+    False si ya no existía.
+    """
+    for _ in range(3):
+        cerrada, estado = transicionar_orden(orden_id, 'cobrando', 'pagada')
+        if cerrada:
             return True
-    return False
+        if estado is None:
+            return False
+        transicionar_orden(orden_id, 'pendiente', 'cobrando')
+    raise RuntimeError(f"No se pudo cerrar la orden pagada {orden_id} (estado: {estado})")
+
+def update_orden_status(orden_id, status):
+    """Actualiza el estado de una orden (pendiente -> status), solo si sigue pendiente"""
+    hecho, _ = transicionar_orden(orden_id, 'pendiente', status)
+    return hecho
 
 def get_ordenes_pendientes():
-    """Obtiene solo las órdenes pendientes (no pagadas)"""
-    keys = redis_client.keys("orden:*")
-    ordenes = []
-    for key in keys:
-        data = redis_client.get(key)
-        if data:
-            try:
-                orden = json.loads(data)
-                # Solo incluir órdenes pendientes
-                if orden.get('status') == 'pendiente':
-                    if 'orden_id' not in orden:
-                        orden['orden_id'] = key.split('orden:')[-1] if ':' in key else key.replace('orden:', '')
-                    ordenes.append(orden)
-            except json.JSONDecodeError:
-                print(f"Error al decodificar orden: {key}")
-                continue
-    return ordenes
+    """Obtiene las órdenes sin pagar (pendientes y las que se están cobrando)"""
+    return _listar_ordenes(('pendiente', 'cobrando'))
 
-def get_fecha_inicio_sesion(session_id):
-    """Obtiene la fecha de inicio de sesión"""
-    fecha = redis_client.get(f"fecha_inicio:{session_id}")
-    return fecha if fecha else None
+def marcar_orden_vista(orden_id, cocinero):
+    """Registra en la orden qué cocinero la vio (sobrevive a recargas de la cocina)"""
+    data = _marcar_vista(keys=[f"orden:{orden_id}"], args=[cocinero])
+    return json.loads(data) if data else None
 
-def set_fecha_inicio_sesion(session_id, fecha):
-    """Guarda la fecha de inicio de sesión"""
-    redis_client.setex(
-        f"fecha_inicio:{session_id}",
-        Config.SESSION_TIMEOUT,
-        str(fecha)
+# ===== EVENTOS DE ÓRDENES =====
+# Cada cambio a una orden (creada, vista, cobrando, reabierta, pagada,
+# cancelada) recibe un número de secuencia creciente y se guarda en un stream
+# acotado. Las pantallas de cocina retoman desde su última secuencia y solo
+# piden la foto completa si el stream ya se recortó más allá de su posición.
+ORDENES_SEQ_KEY = "ordenes:seq"
+ORDENES_STREAM_KEY = "ordenes:eventos"
+# También acota cuánto puede atrasarse el historial en PostgreSQL (database.historial_ordenes)
+ORDENES_STREAM_MAXLEN = 5000
+
+# Lua: INCR y XADD juntos, para que el ID del stream ({seq}-0) nunca llegue
+# fuera de orden cuando dos workers registran eventos al mismo tiempo.
+_REGISTRAR_EVENTO_LUA = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[1], seq .. '-0', 'tipo', ARGV[2], 'orden_id', ARGV[3], 'datos', ARGV[4], 'ts', ARGV[5])
+return seq
+"""
+_registrar_evento = redis_client.register_script(_REGISTRAR_EVENTO_LUA)
+
+def registrar_evento_orden(tipo, orden_id, **datos):
+    """Registra un evento de orden y regresa el evento con su número de secuencia"""
+    seq = _registrar_evento(
+        keys=[ORDENES_SEQ_KEY, ORDENES_STREAM_KEY],
+        args=[ORDENES_STREAM_MAXLEN, tipo, orden_id, json.dumps(datos), time.time()]
     )
+    return {'seq': seq, 'tipo': tipo, 'orden_id': orden_id, **datos}
 
-def limpiar_sesion_completa(session_id):
-    """Elimina todos los datos de Redis relacionados con una sesión"""
-    # Eliminar sesión del empleado
-    redis_client.delete(f"session:{session_id}")
+def get_eventos_ordenes_desde(ultimo_seq):
+    """
+    Obtiene los eventos posteriores a ultimo_seq, en orden.
+    Regresa None si ya no se pueden reconstruir (el stream se recortó o la
+    secuencia se reinició) y el cliente necesita la foto completa.
+    """
+    ultimo_seq = int(ultimo_seq)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.get(ORDENES_SEQ_KEY)
+    pipe.xrange(ORDENES_STREAM_KEY, min=f"{ultimo_seq + 1}-0")
+    actual, entradas = pipe.execute()
+    actual = int(actual or 0)
+
+    if ultimo_seq > actual:
+        return None
+    if ultimo_seq == actual:
+        return []
+    if not entradas or int(entradas[0][0].split('-')[0]) != ultimo_seq + 1:
+        return None
+
+    eventos = []
+    for entrada_id, campos in entradas:
+        evento = json.loads(campos['datos'])
+        evento.update({
+            'seq': int(entrada_id.split('-')[0]),
+            'tipo': campos['tipo'],
+            'orden_id': campos['orden_id']
+        })
+        eventos.append(evento)
+    return eventos
+
+def get_snapshot_ordenes():
+    """
+    Foto completa de las órdenes pendientes y la secuencia a partir de la cual
+    aplicar eventos. La secuencia se lee antes que las órdenes: un evento que
+    ya esté reflejado en la foto puede repetirse, pero nunca perderse.
+    """
+    seq = int(redis_client.get(ORDENES_SEQ_KEY) or 0)
+    return seq, get_ordenes_pendientes()
+
+def reconstruir_indice_ordenes():
+    """
+    Reconstruye el índice de órdenes a partir de las keys orden:* existentes.
+    Usa SCAN (no bloquea Redis), reindexa cada orden sobre el índice vivo y
+    luego quita las entradas cuya orden ya no existe.
+    """
+    total = 0
+    keys = []
+    for key in redis_client.scan_iter(match="orden:*", count=500):
+        keys.append(key)
+        if len(keys) >= 500:
+            total += _indexar_lote(keys)
+            keys = []
+    if keys:
+        total += _indexar_lote(keys)
     
-    # Eliminar información de caja
-    redis_client.delete(f"caja:{session_id}")
-    redis_client.delete(f"caja_inicial:{session_id}")
+    # Quitar del índice las órdenes que ya no existen
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrange(ORDENES_INDEX_KEY, 0, -1)
+    for estado in ESTADOS_ORDEN:
+        pipe.smembers(ORDENES_STATUS_KEY.format(estado))
+    resultados = pipe.execute()
+    indexadas = set(resultados[0]).union(*resultados[1:])
     
-    # Eliminar fecha de inicio
-    redis_client.delete(f"fecha_inicio:{session_id}")
+    if indexadas:
+        indexadas = list(indexadas)
+        pipe = redis_client.pipeline(transaction=False)
+        for orden_id in indexadas:
+            pipe.exists(f"orden:{orden_id}")
+        existe = pipe.execute()
+        huerfanas = [oid for oid, ok in zip(indexadas, existe) if not ok]
+        if huerfanas:
+            pipe = redis_client.pipeline()
+            _desindexar_ordenes(pipe, huerfanas)
+            pipe.execute()
+    
+    return total
+
+def _indexar_lote(keys):
+    """Indexa un lote de keys orden:*"""
+    valores = redis_client.mget(keys)
+    pipe = redis_client.pipeline(transaction=False)
+    total = 0
+    for key, data in zip(keys, valores):
+        if not data:
+            continue
+        try:
+            orden = json.loads(data)
+        except json.JSONDecodeError:
+            print(f"Error al decodificar orden: {key}")
+            continue
+        _indexar_orden(pipe, key.split('orden:', 1)[-1], orden)
+        total += 1
+    pipe.execute()
+    return total
+
+# ===== IDEMPOTENCIA =====
+# Las cajas mandan un Idempotency-Key en crear-orden y en los pagos. La primera
+# petición reserva la clave con SET NX; al terminar bien se guarda su respuesta
+# y los reintentos con la misma clave la reciben sin volver a ejecutar nada.
+IDEMPOTENCIA_KEY = "idempotencia:{}:{}"
+IDEMPOTENCIA_TTL_PROCESO = 60  # segundos que dura la reserva si el worker muere a medias
+
+# Reserva la clave o regresa lo que ya tiene, en un solo viaje
+_RESERVAR_IDEMPOTENCIA_LUA = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return false
+end
+return redis.call('GET', KEYS[1])
+"""
+_reservar_idempotencia = redis_client.register_script(_RESERVAR_IDEMPOTENCIA_LUA)
+
+def reservar_idempotencia(alcance, clave, huella):
+    """
+    Reserva la clave para la petición actual. Regresa None si es la primera vez,
+    o el registro existente: {'estado': 'en_proceso'|'completado', 'huella', ...}.
+    """
+    registro = _reservar_idempotencia(
+        keys=[IDEMPOTENCIA_KEY.format(alcance, clave)],
+        args=[json.dumps({'estado': 'en_proceso', 'huella': huella}), IDEMPOTENCIA_TTL_PROCESO]
+    )
+    return json.loads(registro) if registro else None
+
+def guardar_respuesta_idempotente(alcance, clave, huella, status, cuerpo, mimetype):
+    """Guarda la respuesta de la petición para repetirla a los reintentos"""
+    redis_client.set(
+        IDEMPOTENCIA_KEY.format(alcance, clave),
+        json.dumps({
+            'estado': 'completado',
+            'huella': huella,
+            'status': status,
+            'cuerpo': cuerpo,
+            'mimetype': mimetype
+        }, separators=(',', ':')),
+        ex=Config.IDEMPOTENCIA_TTL
+    )
+
+def liberar_idempotencia(alcance, clave):
+    """Suelta la reserva (la petición falló) para que el reintento se ejecute"""
+    redis_client.delete(IDEMPOTENCIA_KEY.format(alcance, clave))
+
+# ===== CONTADORES COMPARTIDOS =====
+# Estadísticas que se actualizan en cualquier proceso (workers web y procesos
+# de render de PDF) y se consultan desde otro: un hash por grupo con HINCRBY.
+
+def sumar_contadores(key, **valores):
+    """Suma a los contadores del hash; nunca falla (las estadísticas son opcionales)"""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for campo, valor in valores.items():
+            if isinstance(valor, float):
+                pipe.hincrbyfloat(key, campo, valor)
+            else:
+                pipe.hincrby(key, campo, valor)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error al actualizar contadores {key}: {e}")
+
+def leer_contadores(key, iniciales):
+    """Lee los contadores del hash con el tipo de su valor inicial (el inicial si aún no existen)"""
+    valores = redis_client.hgetall(key)
+    return {campo: type(inicial)(float(valores[campo])) if campo in valores else inicial
+            for campo, inicial in iniciales.items()}
+
+def get_fecha_inicio_sesion(session_id):
+    """Obtiene la fecha de inicio de sesión"""
+    return get_estado_sesion(session_id)['fecha_inicio']
+
+def limpiar_sesion_completa(session_id):
+    """Elimina todos los datos de Redis relacionados con una sesión"""
+    # Hash de la sesión (empleado, caja, fecha de inicio) y keys del layout anterior
+    redis_client.delete(
+        _sesion_key(session_id),
+        *[k.format(session_id) for k in _SESION_LEGACY_KEYS]
+    )
     
     # Eliminar todas las órdenes pendientes (opcional, ya que son generales no por sesión)
     # Si quieres eliminar solo las órdenes del cajero específico, necesitarías
     # agregar el session_id o cajero_id a la key de las órdenes
     
     return True
+
+if __name__ == '__main__':
+    # python -m database.redis_client  -> reconstruye el índice de órdenes activas
+    indexadas = reconstruir_indice_ordenes()
+    print(f"Índice de órdenes reconstruido: {indexadas} órdenes activas")
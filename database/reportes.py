@@ -0,0 +1,103 @@
+import json
+from datetime import datetime
+
+from database.redis_client import redis_client
+
+# Caché en Redis del reporte financiero por empleado, una entrada por rango
+# (fecha_inicio, fecha_fin). Un índice ordenado por fecha_fin permite borrar
+# solo los rangos que contienen el día de una venta nueva. El contador de
+# versión evita guardar un reporte calculado mientras entraba una venta.
+REPORTE_EMPLEADOS_KEY = "reporte:empleados:{}:{}"
+REPORTES_INDICE_KEY = "reportes:empleados:indice"
+REPORTES_VERSION_KEY = "reportes:empleados:version"
+REPORTES_TTL = 6 * 3600
+
+# Guarda el reporte solo si ninguna venta invalidó reportes desde que se leyó la versión
+_GUARDAR_REPORTE_LUA = """
+local version = redis.call('GET', KEYS[3]) or '0'
+if version ~= ARGV[2] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[4])
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+return 1
+"""
+
+# Borra los rangos cacheados con fecha_inicio <= dia <= fecha_fin (fechas ISO,
+# comparables como texto). Sin día, borra todos.
+_INVALIDAR_REPORTES_LUA = """
+redis.call('INCR', KEYS[2])
+local candidatos
+if ARGV[1] == '' then
+    candidatos = redis.call('ZRANGE', KEYS[1], 0, -1)
+else
+    candidatos = redis.call('ZRANGEBYSCORE', KEYS[1], ARGV[2], '+inf')
+end
+local borrados = 0
+for _, key in ipairs(candidatos) do
+    local inicio = string.match(key, '^reporte:empleados:([%d%-]+):')
+    if ARGV[1] == '' or (inicio and inicio <= ARGV[1]) then
+        redis.call('DEL', key)
+        redis.call('ZREM', KEYS[1], key)
+        borrados = borrados + 1
+    end
+end
+return borrados
+"""
+
+_guardar_reporte = redis_client.register_script(_GUARDAR_REPORTE_LUA)
+_invalidar_reportes = redis_client.register_script(_INVALIDAR_REPORTES_LUA)
+
+def normalizar_rango(fecha_inicio, fecha_fin):
+    """Valida el rango y lo regresa como fechas ISO; ValueError si no es válido"""
+    inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
+    fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
+    if inicio > fin:
+        raise ValueError("La fecha de inicio es posterior a la fecha de fin")
+    return inicio.isoformat(), fin.isoformat()
+
+def get_reportes_empleados(fecha_inicio, fecha_fin):
+    """
+    Obtiene el reporte financiero por empleado del rango, consultando
+    PostgreSQL solo si no está en caché.
+    """
+    from database.db import get_reportes_financieros_empleados
+
+    fecha_inicio, fecha_fin = normalizar_rango(fecha_inicio, fecha_fin)
+    key = REPORTE_EMPLEADOS_KEY.format(fecha_inicio, fecha_fin)
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.get(REPORTES_VERSION_KEY)
+        cacheado, version = pipe.execute()
+        if cacheado:
+            return json.loads(cacheado)
+    except Exception as e:
+        print(f"Error al leer caché de reportes: {e}")
+        return get_reportes_financieros_empleados(fecha_inicio, fecha_fin)
+
+    reportes = get_reportes_financieros_empleados(fecha_inicio, fecha_fin)
+
+    try:
+        _guardar_reporte(
+            keys=[key, REPORTES_INDICE_KEY, REPORTES_VERSION_KEY],
+            args=[json.dumps(reportes), version or '0', datetime.strptime(fecha_fin, '%Y-%m-%d').toordinal(), REPORTES_TTL]
+        )
+    except Exception as e:
+        print(f"Error al guardar reporte en caché: {e}")
+
+    return reportes
+
+def invalidar_reportes_empleados(fecha=None):
+    """
+    Invalida los reportes cacheados cuyo rango contiene la fecha (una venta
+    nueva), o todos si no se indica fecha (reconstrucción del resumen).
+    """
+    try:
+        _invalidar_reportes(
+            keys=[REPORTES_INDICE_KEY, REPORTES_VERSION_KEY],
+            args=[fecha.isoformat(), fecha.toordinal()] if fecha else ['', 0]
+        )
+    except Exception as e:
+        print(f"Error al invalidar reportes: {e}")
@@ -1,18 +1,26 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, send_file, Response
 from database.redis_client import get_session
+from database.pool import get_pool_stats
+from utils.pdf_generator import get_recibo_stats
+from utils.recibo_cache import get_cache_recibos_stats
+from utils.impresion import get_estado_impresoras
+from utils.pdf_trabajos import enviar_trabajo, generar_pdf, get_pdf_stats
+from database.catalogo import get_productos_catalogo
+from database.reportes import get_reportes_empleados, normalizar_rango
+from database.historial_ordenes import get_historial_stats
 from database.db import (
     get_all_empleados,
     get_ventas_por_empleado,
-    get_reportes_financieros_empleados,
+    get_reporte_productos,
     get_all_clientes,
     get_all_productos,
     get_categorias,
     get_all_categorias_admin, 
     crear_descuento_cliente,
     get_all_descuentos,
-    eliminar_descuento_permanente
+    eliminar_descuento_permanente,
+    exportar_ventas
 )
-from utils.pdf_reports import generar_reporte_empleados_pdf
 import io
 from datetime import datetime, timedelta
 
@@ -54,27 +62,69 @@ def obtener_reportes_empleados():
         fecha_inicio = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
     
     try:
-        reportes = get_reportes_financieros_empleados(fecha_inicio, fecha_fin)
+        reportes = get_reportes_empleados(fecha_inicio, fecha_fin)
         return jsonify({'success': True, 'reportes': reportes})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Error al obtener reportes: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': 'Error al obtener reportes'}), 500
 
-@admin_bp.route('/api/exportar-reporte-pdf', methods=['POST'])
-def exportar_reporte_pdf():
+@admin_bp.route('/api/reporte-productos', methods=['GET'])
+def obtener_reporte_productos():
     empleado = verificar_admin()
     if not empleado:
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
-    data = request.get_json()
-    reportes = data.get('reportes', [])
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+    
+    # Si no se proporcionan fechas, usar últimos 30 días
+    if not fecha_inicio or not fecha_fin:
+        fecha_fin = datetime.now().strftime('%Y-%m-%d')
+        fecha_inicio = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    
+    try:
+        productos = get_reporte_productos(fecha_inicio, fecha_fin)
+        return jsonify({'success': True, 'productos': productos})
+    except Exception as e:
+        print(f"Error al obtener reporte de productos: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': 'Error al obtener reporte de productos'}), 500
+
+def _rango_exportacion():
+    """Rango del reporte a exportar (últimos 30 días si no se indica); ValueError si no es válido"""
+    data = request.get_json(silent=True) or {}
     fecha_inicio = data.get('fecha_inicio')
     fecha_fin = data.get('fecha_fin')
     
+    if not fecha_inicio or not fecha_fin:
+        fecha_fin = datetime.now().strftime('%Y-%m-%d')
+        fecha_inicio = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    
+    return normalizar_rango(fecha_inicio, fecha_fin)
+
+@admin_bp.route('/api/exportar-reporte-pdf', methods=['POST'])
+def exportar_reporte_pdf():
+    empleado = verificar_admin()
+    if not empleado:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
     try:
-        pdf = generar_reporte_empleados_pdf(reportes, fecha_inicio, fecha_fin)
+        # El reporte se calcula en el servidor (con caché por rango), no se recibe del navegador
+        fecha_inicio, fecha_fin = _rango_exportacion()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        pdf, estado = generar_pdf('reporte_empleados', fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+        if estado is None:
+            return jsonify({'success': False, 'message': 'Hay demasiados PDFs en cola, intente de nuevo'}), 503
+        if pdf is None:
+            return jsonify({'success': False, 'message': 'Error al generar PDF'}), 500
         
         fecha = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"reporte_empleados_{fecha}.pdf"
@@ -91,6 +141,86 @@ def exportar_reporte_pdf():
         traceback.print_exc()
         return jsonify({'success': False, 'message': 'Error al generar PDF'}), 500
 
+@admin_bp.route('/api/exportar-reporte-pdf/trabajo', methods=['POST'])
+def enviar_trabajo_reporte_pdf():
+    empleado = verificar_admin()
+    if not empleado:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    try:
+        fecha_inicio, fecha_fin = _rango_exportacion()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    trabajo_id = enviar_trabajo('reporte_empleados', fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
+    if not trabajo_id:
+        return jsonify({'success': False, 'message': 'Hay demasiados PDFs en cola, intente de nuevo'}), 503
+    
+    return jsonify({'success': True, 'trabajo_id': trabajo_id}), 202
+
+@admin_bp.route('/api/exportar-ventas', methods=['GET'])
+def exportar_ventas_route():
+    empleado = verificar_admin()
+    if not empleado:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': 'Formato no soportado (csv o ndjson)'}), 400
+    
+    try:
+        fecha_inicio, fecha_fin = normalizar_rango(request.args.get('fecha_inicio', ''), request.args.get('fecha_fin', ''))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Rango de fechas inválido'}), 400
+    
+    # Respuesta por bloques: se envía mientras PostgreSQL la genera
+    return Response(
+        exportar_ventas(fecha_inicio, fecha_fin, formato),
+        mimetype='text/csv' if formato == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename=ventas_{fecha_inicio}_{fecha_fin}.{formato}'}
+    )
+
+# ===== MONITOREO =====
+@admin_bp.route('/api/pool-stats', methods=['GET'])
+def obtener_pool_stats():
+    empleado = verificar_admin()
+    if not empleado:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    return jsonify({'success': True, 'pool': get_pool_stats()})
+
+@admin_bp.route('/api/recibo-stats', methods=['GET'])
+def obtener_recibo_stats():
+    empleado = verificar_admin()
+    if not empleado:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    return jsonify({'success': True, 'recibos': get_recibo_stats(), 'cache': get_cache_recibos_stats()})
+
+@admin_bp.route('/api/pdf-stats', methods=['GET'])
+def obtener_pdf_stats():
+    empleado = verificar_admin()
+    if not empleado:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    return jsonify({'success': True, 'pdf': get_pdf_stats()})
+
+@admin_bp.route('/api/historial-ordenes-stats', methods=['GET'])
+def obtener_historial_stats():
+    empleado = verificar_admin()
+    if not empleado:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    return jsonify({'success': True, 'historial': get_historial_stats()})
+
+@admin_bp.route('/api/impresoras', methods=['GET'])
+def obtener_estado_impresoras():
+    empleado = verificar_admin()
+    if not empleado:
+        return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    
+    return jsonify({'success': True, 'impresoras': get_estado_impresoras()})
+
 # ===== CLIENTES =====
 @admin_bp.route('/api/clientes', methods=['GET'])
 def listar_clientes():
@@ -99,8 +229,14 @@ def listar_clientes():
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
     try:
-        clientes = get_all_clientes()
-        return jsonify({'success': True, 'clientes': clientes})
+        clientes, siguiente = get_all_clientes(
+            request.args.get('limite', type=int),
+            request.args.get('despues_de'),
+            request.args.get('busqueda', '').strip() or None
+        )
+        return jsonify({'success': True, 'clientes': clientes, 'siguiente': siguiente})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Error al obtener clientes: {e}")
         return jsonify({'success': False, 'message': 'Error al obtener clientes'}), 500
@@ -113,8 +249,7 @@ def listar_productos():
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
     try:
-        from database.db import get_all_productos
-        productos = get_all_productos()
+        productos = get_productos_catalogo()
         return jsonify({'success': True, 'productos': productos})
     except Exception as e:
         print(f"Error al obtener productos: {e}")
@@ -156,8 +291,13 @@ def listar_descuentos():
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
     try:
-        descuentos = get_all_descuentos()
-        return jsonify({'success': True, 'descuentos': descuentos})
+        descuentos, siguiente = get_all_descuentos(
+            request.args.get('limite', type=int),
+            request.args.get('despues_de')
+        )
+        return jsonify({'success': True, 'descuentos': descuentos, 'siguiente': siguiente})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Error al obtener descuentos: {e}")
         return jsonify({'success': False, 'message': 'Error al obtener descuentos'}), 500
@@ -212,19 +352,27 @@ def obtener_detalle_cliente(cliente_id):
         return jsonify({'success': False, 'message': 'No autorizado'}), 401
     
     try:
-        from database.db import get_cliente_by_id, get_ordenes_por_cliente
+        from database.db import get_cliente_by_id, get_ordenes_por_cliente, contar_ordenes_cliente
         
         cliente = get_cliente_by_id(cliente_id)
         if not cliente:
             return jsonify({'success': False, 'message': 'Cliente no encontrado'}), 404
         
-        ordenes = get_ordenes_por_cliente(cliente_id)
+        ordenes, siguiente = get_ordenes_por_cliente(
+            cliente_id,
+            request.args.get('limite', type=int),
+            request.args.get('despues_de')
+        )
         
         return jsonify({
             'success': True,
             'cliente': cliente,
-            'ordenes': ordenes
+            'ordenes': ordenes,
+            'total_ordenes': contar_ordenes_cliente(cliente_id),
+            'siguiente': siguiente
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Error al obtener detalle del cliente: {e}")
         import traceback
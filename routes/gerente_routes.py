@@ -7,6 +7,7 @@ from database.db import (
     get_all_categorias_admin
 )
 from database.redis_client import get_session
+from database.catalogo import get_productos_catalogo
 
 gerente_bp = Blueprint('gerente', __name__, url_prefix='/gerente')
 
@@ -36,7 +37,7 @@ def get_productos_gerente():
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     
     try:
-        productos = get_all_productos()
+        productos = get_productos_catalogo()
         return jsonify({
             'success': True,
             'productos': productos
@@ -208,8 +209,13 @@ def listar_descuentos():
     
     try:
         from database.db import get_all_descuentos
-        descuentos = get_all_descuentos()
-        return jsonify({'success': True, 'descuentos': descuentos})
+        descuentos, siguiente = get_all_descuentos(
+            request.args.get('limite', type=int),
+            request.args.get('despues_de')
+        )
+        return jsonify({'success': True, 'descuentos': descuentos, 'siguiente': siguiente})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Error al obtener descuentos: {e}")
         return jsonify({'success': False, 'message': 'Error al obtener descuentos'}), 500
@@ -277,8 +283,14 @@ def listar_clientes():
     
     try:
         from database.db import get_all_clientes
-        clientes = get_all_clientes()
-        return jsonify({'success': True, 'clientes': clientes})
+        clientes, siguiente = get_all_clientes(
+            request.args.get('limite', type=int),
+            request.args.get('despues_de'),
+            request.args.get('busqueda', '').strip() or None
+        )
+        return jsonify({'success': True, 'clientes': clientes, 'siguiente': siguiente})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Error al obtener clientes: {e}")
         return jsonify({'success': False, 'message': 'Error al obtener clientes'}), 500
\ No newline at end of file
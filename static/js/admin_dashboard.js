@@ -2,6 +2,17 @@
 let reportesData = [];
 let chartInstance = null;
 
+// Paginación (token de la siguiente página que regresa el servidor)
+let siguienteClientes = null;
+let clienteDetalleId = null;
+let siguienteOrdenesCliente = null;
+let busquedaClientesTimeout = null;
+let siguienteDescuentos = null;
+let busquedaClienteDescuentoTimeout = null;
+
+// Clientes que se ofrecen en el modal de descuento (búsqueda en el servidor)
+const CLIENTES_DESCUENTO_LIMITE = 20;
+
 // Navegación entre secciones
 document.addEventListener('DOMContentLoaded', function() {
     // Configurar navegación
@@ -312,58 +323,108 @@ async function exportarReportePDF() {
     }
     
     try {
-        const response = await fetch('/admin/api/exportar-reporte-pdf', {
+        // El PDF se genera en segundo plano: enviar el trabajo y consultar hasta que esté listo
+        const response = await fetch('/admin/api/exportar-reporte-pdf/trabajo', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                reportes: reportesData,
                 fecha_inicio: fechaInicio,
                 fecha_fin: fechaFin
             })
         });
+        const data = await response.json();
         
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = `reporte_empleados_${new Date().getTime()}.pdf`;
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
-            
-            alert('✅ Reporte exportado exitosamente');
-        } else {
-            alert('Error al exportar el reporte');
+        if (!data.success) {
+            alert(data.message || 'Error al exportar el reporte');
+            return;
+        }
+        
+        const trabajo = await esperarTrabajoPDF(data.trabajo_id);
+        if (trabajo.estado !== 'completado') {
+            alert(`Error al exportar el reporte (${trabajo.estado})`);
+            return;
         }
+        
+        const a = document.createElement('a');
+        a.href = `/api/pdf/trabajos/${data.trabajo_id}/descargar`;
+        a.download = `reporte_empleados_${new Date().getTime()}.pdf`;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        
+        alert('✅ Reporte exportado exitosamente');
     } catch (error) {
         console.error('Error al exportar PDF:', error);
         alert('Error al exportar el reporte');
     }
 }
 
+function exportarVentas(formato) {
+    const fechaInicio = document.getElementById('fecha-inicio-reporte').value;
+    const fechaFin = document.getElementById('fecha-fin-reporte').value;
+    
+    if (!fechaInicio || !fechaFin) {
+        alert('Selecciona el rango de fechas a exportar');
+        return;
+    }
+    
+    // La descarga llega por bloques; el navegador la guarda directo a disco
+    const params = new URLSearchParams({ fecha_inicio: fechaInicio, fecha_fin: fechaFin, formato });
+    const a = document.createElement('a');
+    a.href = `/admin/api/exportar-ventas?${params}`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+}
+
+async function esperarTrabajoPDF(trabajoId) {
+    while (true) {
+        const response = await fetch(`/api/pdf/trabajos/${trabajoId}`);
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.message);
+        }
+        if (!['en_cola', 'procesando'].includes(data.trabajo.estado)) {
+            return data.trabajo;
+        }
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
+}
+
 // ===== CLIENTES =====
-async function cargarClientes() {
+async function cargarClientes(agregar = false) {
+    const busqueda = document.getElementById('buscar-cliente')?.value.trim() || '';
+    const params = new URLSearchParams();
+    if (busqueda) params.set('busqueda', busqueda);
+    if (agregar && siguienteClientes) params.set('despues_de', siguienteClientes);
+    
     try {
-        const response = await fetch('/admin/api/clientes');
+        const response = await fetch(`/admin/api/clientes?${params.toString()}`);
         const data = await response.json();
         
         if (data.success) {
-            mostrarClientes(data.clientes);
+            siguienteClientes = data.siguiente;
+            mostrarClientes(data.clientes, agregar);
+            document.getElementById('btn-mas-clientes').style.display = siguienteClientes ? '' : 'none';
         }
     } catch (error) {
         console.error('Error al cargar clientes:', error);
     }
 }
 
-function mostrarClientes(clientes) {
+function cargarMasClientes() {
+    cargarClientes(true);
+}
+
+function mostrarClientes(clientes, agregar = false) {
     const tbody = document.querySelector('#tabla-clientes-admin tbody');
-    tbody.innerHTML = '';
+    if (!agregar) {
+        tbody.innerHTML = '';
+    }
     
-    if (clientes.length === 0) {
+    if (clientes.length === 0 && !agregar) {
         tbody.innerHTML = '<tr><td colspan="6" style="text-align: center; padding: 20px;">No hay clientes registrados</td></tr>';
         return;
     }
@@ -401,27 +462,38 @@ function mostrarClientes(clientes) {
 }
 
 // ===== DESCUENTOS =====
-async function cargarDescuentos() {
+async function cargarDescuentos(agregar = false) {
+    const params = new URLSearchParams();
+    if (agregar && siguienteDescuentos) params.set('despues_de', siguienteDescuentos);
+    
     try {
-        const response = await fetch('/admin/api/descuentos');
+        const response = await fetch(`/admin/api/descuentos?${params.toString()}`);
         const data = await response.json();
         
-        if (data.success) {
-            mostrarDescuentos(data.descuentos);
-        } else {
-            alert('Error al cargar descuentos: ' + data.message);
+        if (!data.success) {
+            throw new Error(data.message);
         }
+        
+        siguienteDescuentos = data.siguiente;
+        mostrarDescuentos(data.descuentos, agregar);
+        document.getElementById('btn-mas-descuentos').style.display = siguienteDescuentos ? '' : 'none';
     } catch (error) {
         console.error('Error al cargar descuentos:', error);
         alert('Error al cargar descuentos');
     }
 }
 
-function mostrarDescuentos(descuentos) {
+function cargarMasDescuentos() {
+    cargarDescuentos(true);
+}
+
+function mostrarDescuentos(descuentos, agregar = false) {
     const tbody = document.querySelector('#tabla-descuentos tbody');
-    tbody.innerHTML = '';
+    if (!agregar) {
+        tbody.innerHTML = '';
+    }
     
-    if (descuentos.length === 0) {
+    if (descuentos.length === 0 && !agregar) {
         tbody.innerHTML = '<tr><td colspan="7" style="text-align: center; padding: 20px;">No hay descuentos registrados</td></tr>';
         return;
     }
@@ -457,35 +529,51 @@ function mostrarDescuentos(descuentos) {
         tbody.appendChild(row);
     });
 }
-async function mostrarModalDescuento() {
-    // Primero cargar los clientes
+// Busca en el servidor solo los clientes que coinciden con lo escrito
+async function buscarClientesDescuento() {
+    const busqueda = document.getElementById('descuento-cliente-buscar').value.trim();
+    const params = new URLSearchParams({ limite: CLIENTES_DESCUENTO_LIMITE });
+    if (busqueda) params.set('busqueda', busqueda);
+    
     try {
-        const response = await fetch('/admin/api/clientes');
+        const response = await fetch(`/admin/api/clientes?${params.toString()}`);
         const data = await response.json();
         
-        if (data.success) {
-            const select = document.getElementById('descuento-cliente');
-            select.innerHTML = '<option value="">Seleccionar cliente</option>';
-            
-            data.clientes.forEach(cliente => {
-                const option = document.createElement('option');
-                option.value = cliente.id;
-                option.textContent = `${cliente.nombre} (${cliente.correo})`;
-                select.appendChild(option);
-            });
+        if (!data.success) {
+            throw new Error(data.message);
         }
+        
+        const select = document.getElementById('descuento-cliente');
+        select.innerHTML = '<option value="">Descuento general (sin cliente específico)</option>';
+        
+        data.clientes.forEach(cliente => {
+            const option = document.createElement('option');
+            option.value = cliente.id;
+            option.textContent = `${cliente.nombre} (${cliente.correo})`;
+            select.appendChild(option);
+        });
     } catch (error) {
-        console.error('Error al cargar clientes:', error);
+        console.error('Error al buscar clientes:', error);
     }
-    
+}
+
+async function mostrarModalDescuento() {
     // Limpiar formulario
     document.getElementById('form-descuento').reset();
     document.getElementById('modal-descuento-titulo').textContent = 'Nuevo Descuento';
     
+    // Primeros clientes; el resto se encuentra escribiendo en la búsqueda
+    await buscarClientesDescuento();
+    
     // Mostrar modal
     document.getElementById('modal-descuento').style.display = 'block';
 }
 
+document.getElementById('descuento-cliente-buscar')?.addEventListener('input', function() {
+    clearTimeout(busquedaClienteDescuentoTimeout);
+    busquedaClienteDescuentoTimeout = setTimeout(() => buscarClientesDescuento(), 300);
+});
+
 function cerrarModalDescuento() {
     document.getElementById('modal-descuento').style.display = 'none';
 }
@@ -584,19 +672,10 @@ async function cerrarSesion() {
     }
 }
 
-// Búsqueda de clientes
-document.getElementById('buscar-cliente')?.addEventListener('input', function(e) {
-    const busqueda = e.target.value.toLowerCase();
-    const filas = document.querySelectorAll('#tabla-clientes-admin tbody tr');
-    
-    filas.forEach(fila => {
-        const texto = fila.textContent.toLowerCase();
-        if (texto.includes(busqueda)) {
-            fila.style.display = '';
-        } else {
-            fila.style.display = 'none';
-        }
-    });
+// Búsqueda de clientes (en el servidor, para no depender de las páginas ya cargadas)
+document.getElementById('buscar-cliente')?.addEventListener('input', function() {
+    clearTimeout(busquedaClientesTimeout);
+    busquedaClientesTimeout = setTimeout(() => cargarClientes(), 300);
 });
 
 async function verDetalleCliente(clienteId) {
@@ -605,7 +684,9 @@ async function verDetalleCliente(clienteId) {
         const data = await response.json();
         
         if (data.success) {
-            mostrarModalDetalleCliente(data.cliente, data.ordenes);
+            clienteDetalleId = clienteId;
+            siguienteOrdenesCliente = data.siguiente;
+            mostrarModalDetalleCliente(data.cliente, data.ordenes, data.total_ordenes);
         } else {
             alert('Error al cargar detalle del cliente');
         }
@@ -616,7 +697,23 @@ async function verDetalleCliente(clienteId) {
 }
 
 
-function mostrarModalDetalleCliente(cliente, ordenes) {
+async function cargarMasOrdenesCliente() {
+    if (!clienteDetalleId || !siguienteOrdenesCliente) return;
+    
+    try {
+        const response = await fetch(`/admin/api/clientes/${clienteDetalleId}/detalle?despues_de=${encodeURIComponent(siguienteOrdenesCliente)}`);
+        const data = await response.json();
+        
+        if (data.success) {
+            siguienteOrdenesCliente = data.siguiente;
+            agregarOrdenesCliente(data.ordenes);
+        }
+    } catch (error) {
+        console.error('Error al cargar órdenes:', error);
+    }
+}
+
+function mostrarModalDetalleCliente(cliente, ordenes, totalOrdenes) {
     const modal = document.getElementById('modal-detalle-cliente');
     const clienteInfo = document.getElementById('cliente-info');
     
@@ -654,7 +751,7 @@ function mostrarModalDetalleCliente(cliente, ordenes) {
             <p><strong>Puntos Acumulados:</strong> ${cliente.puntos_acumulados}</p>
             <p><strong>Fecha de Registro:</strong> ${fechaRegistro}</p>
             <p><strong>Última Visita:</strong> ${ultimaVisita}</p>
-            <p><strong>Total de Órdenes:</strong> ${ordenes.length}</p>
+            <p><strong>Total de Órdenes:</strong> ${totalOrdenes ?? ordenes.length}</p>
         </div>
     `;
     
@@ -665,35 +762,44 @@ function mostrarModalDetalleCliente(cliente, ordenes) {
     if (ordenes.length === 0) {
         tbody.innerHTML = '<tr><td colspan="5" style="text-align: center;">No hay órdenes registradas</td></tr>';
     } else {
-        ordenes.forEach(orden => {
-            const fecha = new Date(orden.fecha_venta);
-            const fechaFormateada = fecha.toLocaleDateString('es-MX', {
-                year: 'numeric',
-                month: '2-digit',
-                day: '2-digit',
-                hour: '2-digit',
-                minute: '2-digit'
-            });
-            
-            const row = document.createElement('tr');
-            row.innerHTML = `
-                <td>${fechaFormateada}</td>
-                <td>${orden.orden_id}</td>
-                <td>$${parseFloat(orden.total).toFixed(2)}</td>
-                <td>${orden.cajero_nombre}</td>
-                <td>
-                    <button class="btn btn-primary btn-sm" onclick='verDetalleOrden("${orden.orden_id}", ${JSON.stringify(orden.items)})'>
-                        Ver Items
-                    </button>
-                </td>
-            `;
-            tbody.appendChild(row);
-        });
+        agregarOrdenesCliente(ordenes);
     }
     
+    document.getElementById('btn-mas-ordenes-cliente').style.display = siguienteOrdenesCliente ? '' : 'none';
     modal.style.display = 'block';
 }
 
+function agregarOrdenesCliente(ordenes) {
+    const tbody = document.querySelector('#tabla-ordenes-cliente tbody');
+    
+    ordenes.forEach(orden => {
+        const fecha = new Date(orden.fecha_venta);
+        const fechaFormateada = fecha.toLocaleDateString('es-MX', {
+            year: 'numeric',
+            month: '2-digit',
+            day: '2-digit',
+            hour: '2-digit',
+            minute: '2-digit'
+        });
+        
+        const row = document.createElement('tr');
+        row.innerHTML = `
+            <td>${fechaFormateada}</td>
+            <td>${orden.orden_id}</td>
+            <td>$${parseFloat(orden.total).toFixed(2)}</td>
+            <td>${orden.cajero_nombre}</td>
+            <td>
+                <button class="btn btn-primary btn-sm" onclick='verDetalleOrden("${orden.orden_id}", ${JSON.stringify(orden.items)})'>
+                    Ver Items
+                </button>
+            </td>
+        `;
+        tbody.appendChild(row);
+    });
+    
+    document.getElementById('btn-mas-ordenes-cliente').style.display = siguienteOrdenesCliente ? '' : 'none';
+}
+
 function verDetalleOrden(ordenId, items) {
     let itemsHTML = '<div style="margin-top: 10px;"><h4>Items de la orden ' + ordenId + ':</h4><ul style="list-style: none; padding: 0;">';
     
@@ -2,8 +2,54 @@ let cart = [];
 let ordenActualPago = null;
 let clienteSeleccionado = null;
 let todosLosClientes = [];
+let siguienteClientes = null;
+let busquedaClientesTimeout = null;
 let descuentoDisponible = null;
 let descuentoAplicado = false;
+
+// Órdenes activas sincronizadas por eventos de SocketIO
+let socket;
+let ordenesActivas = new Map();
+let ultimoSeq = null;
+
+// Idempotency-Key de la orden en captura: se conserva entre reintentos y
+// se renueva cuando cambia el carrito
+let claveOrden = null;
+
+function nuevaClaveIdempotencia() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+// POST con Idempotency-Key: si la red falla (o la primera petición sigue en
+// curso) se reintenta con la misma clave y el servidor no repite el trabajo
+async function postIdempotente(url, datos, clave, intentos = 3) {
+    for (let intento = 1; ; intento++) {
+        try {
+            const response = await fetch(url, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': clave
+                },
+                body: JSON.stringify(datos)
+            });
+            
+            if (response.status === 409 && response.headers.get('Retry-After') && intento < intentos) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                continue;
+            }
+            return response;
+        } catch (error) {
+            if (intento >= intentos) {
+                throw error;
+            }
+            await new Promise(resolve => setTimeout(resolve, 500 * intento));
+        }
+    }
+}
 function filterCategory(categoria) {
     const products = document.querySelectorAll('.product-card');
     const buttons = document.querySelectorAll('.category-btn');
@@ -56,6 +102,7 @@ function addToCart(producto) {
 }
 
 function updateCart() {
+    claveOrden = null;
     const cartItemsDiv = document.getElementById('cart-items');
     const totalSpan = document.getElementById('total');
     
@@ -137,21 +184,22 @@ async function guardarOrden() {
     
     try {
         const ordenData = {
-            items: cart,
+            // Solo ID y cantidad: el servidor pone el precio y completa el resto con el catálogo
+            items: cart.map(item => ({ id: item.id, cantidad: item.cantidad })),
             notas: notas || null,
             cliente_id: clienteSeleccionado ? clienteSeleccionado.id : null
         };
         
-        const response = await fetch('/api/crear-orden', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(ordenData)
-        });
+        claveOrden = claveOrden || nuevaClaveIdempotencia();
+        const response = await postIdempotente('/api/crear-orden', ordenData, claveOrden);
         
         const data = await response.json();
         
+        if (response.status === 422) {
+            // La orden cambió desde el intento anterior: el siguiente envío lleva clave nueva
+            claveOrden = null;
+        }
+        
         if (data.success) {
             alert('Orden guardada exitosamente');
             cart = [];
@@ -163,8 +211,6 @@ async function guardarOrden() {
             const clienteInfo = document.getElementById('cliente-seleccionado');
             clienteInfo.innerHTML = '<span class="cliente-nombre">Sin cliente</span>';
             clienteInfo.classList.remove('selected');
-            
-            loadOrdenes();
         } else {
             alert(data.message);
         }
@@ -174,38 +220,110 @@ async function guardarOrden() {
     }
 }
 
+function inicializarSocket() {
+    socket = io();
+    
+    socket.on('connect', function() {
+        // Al reconectar solo llegan los eventos que se perdieron
+        socket.emit('join_cajero', {
+            session_id: window.sessionId,
+            ultimo_seq: ultimoSeq
+        });
+    });
+    
+    // Foto completa (primera conexión o si ya no se pueden recuperar los eventos)
+    socket.on('ordenes_actuales', function(data) {
+        reemplazarOrdenes(data.ordenes, data.seq);
+    });
+    
+    socket.on('ordenes_eventos', function(data) {
+        data.eventos.forEach(aplicarEventoOrden);
+        renderizarOrdenes();
+    });
+    
+    socket.on('orden_evento', function(evento) {
+        if (ultimoSeq === null || evento.seq <= ultimoSeq) {
+            return;
+        }
+        
+        if (evento.seq > ultimoSeq + 1) {
+            // Hueco en la secuencia: pedir lo que falta
+            sincronizarOrdenes();
+            return;
+        }
+        
+        aplicarEventoOrden(evento);
+        renderizarOrdenes();
+    });
+}
+
+function sincronizarOrdenes() {
+    if (socket && socket.connected) {
+        socket.emit('sincronizar_ordenes', {
+            session_id: window.sessionId,
+            ultimo_seq: ultimoSeq
+        });
+    } else {
+        // Sin socket: respaldo por HTTP
+        loadOrdenes();
+    }
+}
+
 async function loadOrdenes() {
     try {
         const response = await fetch('/api/ordenes');
         const data = await response.json();
         
         if (data.success) {
-            // Enriquecer órdenes con información del cliente
-            const ordenesEnriquecidas = await Promise.all(
-                data.ordenes.map(async (orden) => {
-                    if (orden.cliente_id) {
-                        try {
-                            const clienteResponse = await fetch(`/api/cliente/${orden.cliente_id}`);
-                            const clienteData = await clienteResponse.json();
-                            if (clienteData.success) {
-                                orden.cliente_nombre = clienteData.cliente.nombre;
-                            }
-                        } catch (error) {
-                            console.error('Error al cargar cliente:', error);
-                        }
-                    }
-                    return orden;
-                })
-            );
-            
-            displayOrdenes(ordenesEnriquecidas);
-            const pendientes = ordenesEnriquecidas.filter(o => o.status === 'pendiente').length;
-            document.getElementById('ordenes-count').textContent = pendientes;
+            reemplazarOrdenes(data.ordenes, data.seq);
         }
     } catch (error) {
         console.error('Error al cargar órdenes:', error);
     }
 }
+
+function reemplazarOrdenes(ordenes, seq) {
+    ordenesActivas = new Map(ordenes.map(o => [o.orden_id, o]));
+    ultimoSeq = seq;
+    renderizarOrdenes();
+}
+
+function aplicarEventoOrden(evento) {
+    if (ultimoSeq !== null && evento.seq <= ultimoSeq) {
+        return;
+    }
+    ultimoSeq = evento.seq;
+    
+    switch (evento.tipo) {
+        case 'creada':
+            ordenesActivas.set(evento.orden_id, evento.orden);
+            break;
+        case 'vista':
+            if (ordenesActivas.has(evento.orden_id)) {
+                ordenesActivas.get(evento.orden_id).vista_por = evento.cocinero;
+            }
+            break;
+        case 'cobrando':
+        case 'reabierta':
+            if (ordenesActivas.has(evento.orden_id)) {
+                ordenesActivas.get(evento.orden_id).status = evento.tipo === 'cobrando' ? 'cobrando' : 'pendiente';
+            }
+            break;
+        case 'pagada':
+        case 'cancelada':
+        case 'expirada':
+            ordenesActivas.delete(evento.orden_id);
+            break;
+    }
+}
+
+function renderizarOrdenes() {
+    // Las órdenes ya traen nombre, puntos y descuento del cliente desde el servidor
+    const ordenes = Array.from(ordenesActivas.values());
+    document.getElementById('ordenes-count').textContent = ordenes.filter(o => o.status === 'pendiente').length;
+    displayOrdenes(ordenes);
+}
+
 function displayOrdenes(ordenes) {
     const ordenesListDiv = document.getElementById('ordenes-list');
     
@@ -234,8 +352,9 @@ function displayOrdenes(ordenes) {
                 </div>
                 <div class="orden-info">
                     <div class="orden-cajero">Cajero: ${cajero}</div>
-                    <div class="orden-cliente">Cliente: ${clienteNombre}</div>
+                    <div class="orden-cliente">Cliente: ${clienteNombre}${orden.cliente_nombre ? ` (${orden.cliente_puntos || 0} pts${orden.cliente_descuento ? `, ${orden.cliente_descuento}% desc.` : ''})` : ''}</div>
                     <div class="orden-fecha">${fecha}</div>
+                    ${orden.vista_por ? `<div class="orden-vista">👁️ Vista en cocina por ${orden.vista_por}</div>` : ''}
                 </div>
                 <div class="orden-items">
                     ${items.length > 0 ? items.map(item => {
@@ -260,7 +379,7 @@ function displayOrdenes(ordenes) {
                         ${status === 'pendiente' ? `
                             <button class="btn-pagar" onclick="pagarOrden('${ordenId}')">Pagar</button>
                             <button class="btn-cancelar" onclick="cancelarOrden('${ordenId}')">Cancelar</button>
-                        ` : '<button class="btn-pagar" disabled>Pagada</button>'}
+                        ` : `<button class="btn-pagar" disabled>${status === 'cobrando' ? 'Cobrando...' : 'Pagada'}</button>`}
                     </div>
                 </div>
             </div>
@@ -587,23 +706,20 @@ async function confirmarPago() {
             cliente_id: ordenActualPago.cliente_id || null
         };
         
-        // Si hay descuento APLICADO, incluirlo
+        // Si hay descuento APLICADO, incluirlo (el servidor calcula el monto)
         if (descuentoAplicado && ordenActualPago.descuento_id) {
             pagoData.descuento_id = ordenActualPago.descuento_id;
-            pagoData.descuento_porcentaje = ordenActualPago.descuento_porcentaje;
-            pagoData.total_original = ordenActualPago.total_original;
         }
         
-        const response = await fetch('/api/procesar-pago', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(pagoData)
-        });
+        ordenActualPago.clave_pago = ordenActualPago.clave_pago || nuevaClaveIdempotencia();
+        const response = await postIdempotente('/api/procesar-pago', pagoData, ordenActualPago.clave_pago);
         
         const data = await response.json();
         
+        if (response.status === 422) {
+            ordenActualPago.clave_pago = null;
+        }
+        
         if (data.success) {
             const cambio = data.cambio;
             let mensaje = 'Pago procesado exitosamente\n\n';
@@ -629,11 +745,12 @@ async function confirmarPago() {
             
             alert(mensaje);
             
-            // Descargar recibo PDF automáticamente
-            descargarRecibo(data.venta_id);
+            // Si el servidor ya lo mandó a la impresora térmica no hace falta el PDF
+            if (!data.trabajo_impresion) {
+                descargarRecibo(data.venta_id);
+            }
             
             cerrarModalPago();
-            loadOrdenes();
             
             // Actualizar puntos del cliente si existe
             if (clienteSeleccionado && data.puntos_nuevos) {
@@ -670,7 +787,7 @@ function toggleOrdenes() {
     const modal = document.getElementById('ordenes-modal');
     if (modal.style.display === 'none') {
         modal.style.display = 'flex';
-        loadOrdenes();
+        renderizarOrdenes();
     } else {
         modal.style.display = 'none';
     }
@@ -868,10 +985,10 @@ async function confirmarCierreCaja() {
 // Inicializar
 document.addEventListener('DOMContentLoaded', function() {
     updateCart();
-    loadOrdenes();
     
-    // Actualizar órdenes cada 30 segundos
-    setInterval(loadOrdenes, 30000);
+    // Las órdenes llegan por el socket; el latido solo recupera eventos perdidos
+    inicializarSocket();
+    setInterval(sincronizarOrdenes, 120000);
 });
 
 // Nueva función para regresar al menú de gerente
@@ -903,16 +1020,24 @@ function cerrarModalClientes() {
     ocultarFormularioCliente();
 }
 
-async function cargarClientes() {
+async function cargarClientes(agregar = false) {
     const listaDiv = document.getElementById('clientes-lista');
-    listaDiv.innerHTML = '<p class="loading-clientes">Cargando clientes...</p>';
+    const busqueda = document.getElementById('buscar-cliente-input').value.trim();
+    const params = new URLSearchParams();
+    if (busqueda) params.set('busqueda', busqueda);
+    if (agregar && siguienteClientes) params.set('despues_de', siguienteClientes);
+    
+    if (!agregar) {
+        listaDiv.innerHTML = '<p class="loading-clientes">Cargando clientes...</p>';
+    }
     
     try {
-        const response = await fetch('/api/clientes');
+        const response = await fetch(`/api/clientes?${params.toString()}`);
         const data = await response.json();
         
         if (data.success) {
-            todosLosClientes = data.clientes;
+            todosLosClientes = agregar ? todosLosClientes.concat(data.clientes) : data.clientes;
+            siguienteClientes = data.siguiente;
             mostrarClientes(todosLosClientes);
         } else {
             listaDiv.innerHTML = '<p class="empty-clientes">Error al cargar clientes</p>';
@@ -942,23 +1067,17 @@ function mostrarClientes(clientes) {
         `;
     });
     
+    if (siguienteClientes) {
+        html += '<button class="btn-secondary" style="width: 100%;" onclick="cargarClientes(true)">Cargar más</button>';
+    }
+    
     listaDiv.innerHTML = html;
 }
 
 function filtrarClientes() {
-    const busqueda = document.getElementById('buscar-cliente-input').value.toLowerCase();
-    
-    if (!busqueda) {
-        mostrarClientes(todosLosClientes);
-        return;
-    }
-    
-    const clientesFiltrados = todosLosClientes.filter(cliente => 
-        cliente.correo.toLowerCase().includes(busqueda) ||
-        cliente.nombre.toLowerCase().includes(busqueda)
-    );
-    
-    mostrarClientes(clientesFiltrados);
+    // La búsqueda se hace en el servidor: solo hay una página de clientes cargada
+    clearTimeout(busquedaClientesTimeout);
+    busquedaClientesTimeout = setTimeout(() => cargarClientes(), 300);
 }
 
 function seleccionarCliente(cliente) {
@@ -1237,20 +1356,19 @@ async function pagarConPuntos() {
     btnPagarPuntos.textContent = '💳 Procesando...';
     
     try {
-        const response = await fetch('/api/procesar-pago-puntos', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                orden_id: ordenActualPago.orden_id,
-                cliente_id: clienteSeleccionado.id,
-                puntos_necesarios: puntosNecesarios
-            })
-        });
+        ordenActualPago.clave_puntos = ordenActualPago.clave_puntos || nuevaClaveIdempotencia();
+        const response = await postIdempotente('/api/procesar-pago-puntos', {
+            orden_id: ordenActualPago.orden_id,
+            cliente_id: clienteSeleccionado.id,
+            puntos_necesarios: puntosNecesarios
+        }, ordenActualPago.clave_puntos);
         
         const data = await response.json();
         
+        if (response.status === 422) {
+            ordenActualPago.clave_puntos = null;
+        }
+        
         if (data.success) {
             // Mensaje más visual y detallado
             let mensaje = '✅ PAGO CON PUNTOS EXITOSO\n\n';
@@ -1264,8 +1382,10 @@ async function pagarConPuntos() {
             
             alert(mensaje);
             
-            // Descargar recibo PDF automáticamente
-            descargarRecibo(data.venta_id);
+            // Si el servidor ya lo mandó a la impresora térmica no hace falta el PDF
+            if (!data.trabajo_impresion) {
+                descargarRecibo(data.venta_id);
+            }
             
             // Actualizar puntos del cliente seleccionado
             clienteSeleccionado.puntos_acumulados = data.puntos_restantes;
@@ -1282,7 +1402,12 @@ async function pagarConPuntos() {
             }
             
             cerrarModalPago();
-            loadOrdenes();
+        } else if (data.puntos_necesarios) {
+            // El precio en puntos cambió en el menú: volver a abrir la orden con los puntos vigentes
+            alert('❌ ERROR\n\n' + data.message);
+            const ordenId = ordenActualPago.orden_id;
+            cerrarModalPago();
+            pagarOrden(ordenId);
         } else {
             alert('❌ ERROR\n\n' + data.message);
             btnPagarPuntos.disabled = false;
@@ -1315,7 +1440,6 @@ async function cancelarOrden(ordenId) {
         
         if (data.success) {
             alert('✅ Orden cancelada exitosamente');
-            loadOrdenes();
         } else {
             alert('❌ Error: ' + data.message);
         }
@@ -1,18 +1,18 @@
-let intervalActualizacion;
 let socket;
 let ordenesVistas = new Set(); // Para trackear órdenes ya vistas
 let ordenesCompletadas = 0;
 let audioNotificacion;
 
+// Estado sincronizado por eventos: órdenes pendientes y última secuencia aplicada
+let ordenesActivas = new Map();
+let ultimoSeq = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Crear audio de notificación
     audioNotificacion = new Audio('data:audio/wav;base64,UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUXrTp66hVFApGn+DyvmwhBTGH0fPTgjMGHm7A7+OZURE');
     
-    cargarOrdenes();
+    // Las órdenes llegan por el socket al unirse a la sala (foto o eventos pendientes)
     inicializarSocket();
-    
-    // Backup: Actualizar cada 60 segundos por si falla el socket
-    intervalActualizacion = setInterval(cargarOrdenes, 60000);
 });
 
 function inicializarSocket() {
@@ -23,9 +23,10 @@ function inicializarSocket() {
         console.log('✅ Conectado al servidor WebSocket');
         actualizarEstadoConexion(true);
         
-        // Unirse a la sala de cocineros
+        // Unirse a la sala de cocineros; al reconectar solo se reciben los eventos perdidos
         socket.emit('join_cocinero', {
-            session_id: window.sessionId
+            session_id: window.sessionId,
+            ultimo_seq: ultimoSeq
         });
     });
     
@@ -34,54 +35,41 @@ function inicializarSocket() {
         actualizarEstadoConexion(false);
     });
     
-    // Escuchar nuevas órdenes en tiempo real
-    socket.on('nueva_orden', function(data) {
-        console.log('🔔 Nueva orden recibida:', data);
-        
-        // Reproducir sonido de notificación
-        if (audioNotificacion) {
-            audioNotificacion.play().catch(e => console.log('No se pudo reproducir audio:', e));
+    // Foto completa (primera conexión o cuando el servidor ya no tiene los eventos perdidos)
+    socket.on('ordenes_actuales', function(data) {
+        console.log('📋 Órdenes actuales recibidas:', data.ordenes.length);
+        ordenesActivas = new Map(data.ordenes.map(o => [o.orden_id, o]));
+        ordenesActivas.forEach(orden => {
+            if (orden.vista_por) ordenesVistas.add(orden.orden_id);
+        });
+        ultimoSeq = data.seq;
+        renderizarOrdenes();
+    });
+    
+    // Eventos perdidos mientras estaba desconectado
+    socket.on('ordenes_eventos', function(data) {
+        console.log('🔄 Eventos pendientes recibidos:', data.eventos.length);
+        data.eventos.forEach(evento => aplicarEvento(evento, false));
+        renderizarOrdenes();
+    });
+    
+    // Cambios en tiempo real
+    socket.on('orden_evento', function(evento) {
+        if (ultimoSeq === null || evento.seq <= ultimoSeq) {
+            return; // Aún sin foto inicial, o ya aplicado
         }
         
-        // Mostrar notificación del navegador
-        if ('Notification' in window && Notification.permission === 'granted') {
-            new Notification('🔔 Nueva Orden', {
-                body: `Orden #${data.orden_id.substring(0, 8)} - ${data.orden.items.length} producto(s)`,
-                icon: '/static/img/orden-icon.png',
-                badge: '/static/img/badge-icon.png'
+        if (evento.seq > ultimoSeq + 1) {
+            // Hueco en la secuencia: pedir lo que falta
+            socket.emit('sincronizar_ordenes', {
+                session_id: window.sessionId,
+                ultimo_seq: ultimoSeq
             });
+            return;
         }
         
-        // Recargar órdenes
-        cargarOrdenes();
-        
-        // Incrementar contador de nuevas
-        const nuevasEl = document.getElementById('ordenes-nuevas');
-        nuevasEl.textContent = parseInt(nuevasEl.textContent) + 1;
-    });
-    
-    // Escuchar cuando una orden es vista por otro cocinero
-    socket.on('orden_vista', function(data) {
-        console.log(`👁️ Orden ${data.orden_id} vista por ${data.cocinero}`);
-        
-        // Agregar a vistas y actualizar UI
-        ordenesVistas.add(data.orden_id);
-        
-        // Actualizar la card visualmente
-        const card = document.querySelector(`[data-orden-id="${data.orden_id}"]`);
-        if (card && !card.classList.contains('vista')) {
-            card.classList.add('vista');
-            const badge = card.querySelector('.orden-badge-vista');
-            if (badge) {
-                badge.textContent = `✅ Vista por ${data.cocinero}`;
-            }
-        }
-    });
-    
-    // Recibir órdenes actuales al conectarse
-    socket.on('ordenes_actuales', function(data) {
-        console.log('📋 Órdenes actuales recibidas:', data.ordenes.length);
-        mostrarOrdenes(data.ordenes);
+        aplicarEvento(evento, true);
+        renderizarOrdenes();
     });
     
     socket.on('error', function(data) {
@@ -94,6 +82,66 @@ function inicializarSocket() {
     });
 }
 
+function aplicarEvento(evento, enVivo) {
+    if (ultimoSeq !== null && evento.seq <= ultimoSeq) {
+        return;
+    }
+    ultimoSeq = evento.seq;
+    
+    switch (evento.tipo) {
+        case 'creada':
+            ordenesActivas.set(evento.orden_id, evento.orden);
+            if (enVivo) notificarNuevaOrden(evento.orden);
+            break;
+        case 'vista':
+            ordenesVistas.add(evento.orden_id);
+            if (ordenesActivas.has(evento.orden_id)) {
+                ordenesActivas.get(evento.orden_id).vista_por = evento.cocinero;
+            }
+            break;
+        case 'cobrando':
+        case 'reabierta':
+            if (ordenesActivas.has(evento.orden_id)) {
+                ordenesActivas.get(evento.orden_id).status = evento.tipo === 'cobrando' ? 'cobrando' : 'pendiente';
+            }
+            break;
+        case 'pagada':
+        case 'cancelada':
+        case 'expirada':
+            ordenesActivas.delete(evento.orden_id);
+            break;
+    }
+}
+
+// Una orden que se está cobrando sigue pendiente de preparar
+function porPreparar(orden) {
+    return orden.status === 'pendiente' || orden.status === 'cobrando';
+}
+
+function notificarNuevaOrden(orden) {
+    console.log('🔔 Nueva orden recibida:', orden);
+    
+    // Reproducir sonido de notificación
+    if (audioNotificacion) {
+        audioNotificacion.play().catch(e => console.log('No se pudo reproducir audio:', e));
+    }
+    
+    // Mostrar notificación del navegador
+    if ('Notification' in window && Notification.permission === 'granted') {
+        new Notification('🔔 Nueva Orden', {
+            body: `Orden #${orden.orden_id.substring(0, 8)} - ${orden.items.length} producto(s)`,
+            icon: '/static/img/orden-icon.png',
+            badge: '/static/img/badge-icon.png'
+        });
+    }
+}
+
+function renderizarOrdenes() {
+    const ordenes = Array.from(ordenesActivas.values());
+    mostrarOrdenes(ordenes);
+    actualizarEstadisticas(ordenes);
+}
+
 function actualizarEstadoConexion(conectado) {
     const statusEl = document.getElementById('connection-status');
     if (conectado) {
@@ -105,26 +153,12 @@ function actualizarEstadoConexion(conectado) {
     }
 }
 
-async function cargarOrdenes() {
-    try {
-        const response = await fetch('/api/ordenes');
-        const data = await response.json();
-        
-        if (data.success) {
-            mostrarOrdenes(data.ordenes);
-            actualizarEstadisticas(data.ordenes);
-        }
-    } catch (error) {
-        console.error('Error al cargar órdenes:', error);
-    }
-}
-
 function mostrarOrdenes(ordenes) {
     const grid = document.getElementById('ordenes-grid');
     grid.innerHTML = '';
     
-    // Filtrar solo órdenes pendientes
-    const ordenesPendientes = ordenes.filter(o => o.status === 'pendiente');
+    // Filtrar solo órdenes por preparar
+    const ordenesPendientes = ordenes.filter(porPreparar);
     
     if (ordenesPendientes.length === 0) {
         grid.innerHTML = `
@@ -164,7 +198,7 @@ function crearOrdenCard(orden) {
         `<div class="orden-notas">📝 ${orden.notas}</div>` : '';
     
     const badgeVista = esVista ? 
-        `<div class="orden-badge-vista">✅ Vista</div>` : 
+        `<div class="orden-badge-vista">✅ ${orden.vista_por ? `Vista por ${orden.vista_por}` : 'Vista'}</div>` : 
         `<div class="orden-badge-nueva">🆕 Nueva</div>`;
     
     card.innerHTML = `
@@ -206,13 +240,13 @@ function calcularTiempoTranscurrido(fechaOrden) {
 }
 
 function actualizarEstadisticas(ordenes) {
-    const pendientes = ordenes.filter(o => o.status === 'pendiente').length;
+    const pendientes = ordenes.filter(porPreparar).length;
     document.getElementById('ordenes-pendientes').textContent = pendientes;
     document.getElementById('ordenes-completadas').textContent = ordenesCompletadas;
     
     // Contar nuevas (no vistas)
     const nuevas = ordenes.filter(o => 
-        o.status === 'pendiente' && !ordenesVistas.has(o.orden_id)
+        porPreparar(o) && !ordenesVistas.has(o.orden_id)
     ).length;
     document.getElementById('ordenes-nuevas').textContent = nuevas;
 }
@@ -229,7 +263,7 @@ function marcarComoVista(ordenId) {
     });
     
     // Actualizar UI inmediatamente
-    cargarOrdenes();
+    renderizarOrdenes();
 }
 
 async function cerrarSesion() {
@@ -244,11 +278,6 @@ async function cerrarSesion() {
             socket.disconnect();
         }
         
-        // Limpiar intervalo
-        if (intervalActualizacion) {
-            clearInterval(intervalActualizacion);
-        }
-        
         const response = await fetch('/api/cerrar-sesion', {
             method: 'POST'
         });
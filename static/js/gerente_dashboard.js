@@ -4,6 +4,13 @@ let categoriasData = [];
 let ordenActual = [];
 let clienteSeleccionado = null;
 
+// Paginación de descuentos (token de la siguiente página que regresa el servidor)
+let siguienteDescuentos = null;
+let busquedaClienteDescuentoTimeout = null;
+
+// Clientes que se ofrecen en el modal de descuento (búsqueda en el servidor)
+const CLIENTES_DESCUENTO_LIMITE = 20;
+
 // Inicialización
 document.addEventListener('DOMContentLoaded', function() {
     inicializarGerente();
@@ -435,27 +442,38 @@ window.onclick = function(event) {
 
 // ==================== GESTIÓN DE DESCUENTOS ====================
 
-async function cargarDescuentos() {
+async function cargarDescuentos(agregar = false) {
+    const params = new URLSearchParams();
+    if (agregar && siguienteDescuentos) params.set('despues_de', siguienteDescuentos);
+    
     try {
-        const response = await fetch('/gerente/api/descuentos');
+        const response = await fetch(`/gerente/api/descuentos?${params.toString()}`);
         const data = await response.json();
         
-        if (data.success) {
-            mostrarDescuentosGerente(data.descuentos);
-        } else {
-            alert('Error al cargar descuentos: ' + data.message);
+        if (!data.success) {
+            throw new Error(data.message);
         }
+        
+        siguienteDescuentos = data.siguiente;
+        mostrarDescuentosGerente(data.descuentos, agregar);
+        document.getElementById('btn-mas-descuentos-gerente').style.display = siguienteDescuentos ? '' : 'none';
     } catch (error) {
         console.error('Error al cargar descuentos:', error);
         alert('Error al cargar descuentos');
     }
 }
 
-function mostrarDescuentosGerente(descuentos) {
+function cargarMasDescuentos() {
+    cargarDescuentos(true);
+}
+
+function mostrarDescuentosGerente(descuentos, agregar = false) {
     const tbody = document.querySelector('#tabla-descuentos-gerente tbody');
-    tbody.innerHTML = '';
+    if (!agregar) {
+        tbody.innerHTML = '';
+    }
     
-    if (descuentos.length === 0) {
+    if (descuentos.length === 0 && !agregar) {
         tbody.innerHTML = '<tr><td colspan="7" style="text-align: center; padding: 20px;">No hay descuentos registrados</td></tr>';
         return;
     }
@@ -491,31 +509,49 @@ function mostrarDescuentosGerente(descuentos) {
     });
 }
 
-async function mostrarModalDescuentoGerente() {
+// Busca en el servidor solo los clientes que coinciden con lo escrito
+async function buscarClientesDescuentoGerente() {
+    const busqueda = document.getElementById('descuento-cliente-buscar-gerente').value.trim();
+    const params = new URLSearchParams({ limite: CLIENTES_DESCUENTO_LIMITE });
+    if (busqueda) params.set('busqueda', busqueda);
+    
     try {
-        const response = await fetch('/gerente/api/clientes');
+        const response = await fetch(`/gerente/api/clientes?${params.toString()}`);
         const data = await response.json();
         
-        if (data.success) {
-            const select = document.getElementById('descuento-cliente-gerente');
-            select.innerHTML = '<option value="">Descuento general (sin cliente específico)</option>';
-            
-            data.clientes.forEach(cliente => {
-                const option = document.createElement('option');
-                option.value = cliente.id;
-                option.textContent = `${cliente.nombre} (${cliente.correo})`;
-                select.appendChild(option);
-            });
+        if (!data.success) {
+            throw new Error(data.message);
         }
+        
+        const select = document.getElementById('descuento-cliente-gerente');
+        select.innerHTML = '<option value="">Descuento general (sin cliente específico)</option>';
+        
+        data.clientes.forEach(cliente => {
+            const option = document.createElement('option');
+            option.value = cliente.id;
+            option.textContent = `${cliente.nombre} (${cliente.correo})`;
+            select.appendChild(option);
+        });
     } catch (error) {
-        console.error('Error al cargar clientes:', error);
+        console.error('Error al buscar clientes:', error);
     }
-    
+}
+
+async function mostrarModalDescuentoGerente() {
     document.getElementById('form-descuento-gerente').reset();
     document.getElementById('modal-descuento-titulo').textContent = 'Nuevo Descuento';
+    
+    // Primeros clientes; el resto se encuentra escribiendo en la búsqueda
+    await buscarClientesDescuentoGerente();
+    
     document.getElementById('modal-descuento-gerente').style.display = 'block';
 }
 
+document.getElementById('descuento-cliente-buscar-gerente')?.addEventListener('input', function() {
+    clearTimeout(busquedaClienteDescuentoTimeout);
+    busquedaClienteDescuentoTimeout = setTimeout(() => buscarClientesDescuentoGerente(), 300);
+});
+
 function cerrarModalDescuentoGerente() {
     document.getElementById('modal-descuento-gerente').style.display = 'none';
 }
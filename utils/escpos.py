@@ -0,0 +1,201 @@
+from datetime import datetime
+from PIL import Image as PILImage, ImageOps
+import io
+import textwrap
+
+from utils.pdf_generator import get_configuracion_recibo, CONFIG_DEFAULT
+
+# Salida ESC/POS para impresoras térmicas de 80mm: mismos datos y misma
+# configuración del ticket que el PDF, pero como bytes que la impresora
+# imprime directamente (sin que el navegador tenga que rasterizar un PDF).
+ESC = b'\x1b'
+GS = b'\x1d'
+
+INICIALIZAR = ESC + b'@'
+CODIGO_PAGINA = ESC + b't\x02'      # PC850 (acentos, ñ, ¡, ¿)
+CODIFICACION = 'cp850'
+CORTE = GS + b'VB\x00'               # Avanzar y corte parcial
+
+IZQUIERDA, CENTRO, DERECHA = 0, 1, 2
+
+# Columnas de la fuente A en papel de 80mm (576 puntos)
+COLUMNAS_DEFAULT = 48
+
+def _alinear(alineacion):
+    return ESC + b'a' + bytes([alineacion])
+
+def _negrita(activar):
+    return ESC + b'E' + (b'\x01' if activar else b'\x00')
+
+def _tamano(doble_ancho=False, doble_alto=False):
+    return GS + b'!' + bytes([(0x10 if doble_ancho else 0) | (0x01 if doble_alto else 0)])
+
+def _avanzar(lineas):
+    return ESC + b'd' + bytes([lineas])
+
+def _texto(texto):
+    return str(texto).encode(CODIFICACION, errors='replace')
+
+class _Ticket:
+    """Acumula los comandos de un ticket"""
+
+    def __init__(self, columnas):
+        self.columnas = columnas
+        self.partes = [INICIALIZAR, CODIGO_PAGINA]
+
+    def linea(self, texto='', alineacion=IZQUIERDA, negrita=False, doble_ancho=False, doble_alto=False):
+        columnas = self.columnas // 2 if doble_ancho else self.columnas
+        self.partes += [_alinear(alineacion), _negrita(negrita), _tamano(doble_ancho, doble_alto)]
+        texto = str(texto)
+        # Los textos largos (dirección, notas) se parten en varias líneas
+        for fragmento in (textwrap.wrap(texto, columnas) if len(texto) > columnas else [texto]):
+            self.partes.append(_texto(fragmento) + b'\n')
+        if negrita or doble_ancho or doble_alto:
+            self.partes += [_negrita(False), _tamano()]
+
+    def separador(self, caracter='-'):
+        self.linea(caracter * self.columnas)
+
+    def columnas_izq_der(self, izquierda, derecha, negrita=False, doble_alto=False):
+        ancho = self.columnas - len(derecha)
+        self.linea(f"{str(izquierda)[:ancho - 1]:<{ancho}}{derecha}", negrita=negrita, doble_alto=doble_alto)
+
+    def imagen(self, raster):
+        self.partes += [_alinear(CENTRO), raster]
+
+    def cortar(self):
+        self.partes += [_avanzar(4), CORTE]
+
+    def bytes(self):
+        return b''.join(self.partes)
+
+def _raster_logo(logo):
+    """Convierte el logo cacheado (PNG ya escalado a la resolución de la impresora) a GS v 0"""
+    png = logo[0]
+    imagen = PILImage.open(io.BytesIO(png))
+    if imagen.mode in ('RGBA', 'LA'):
+        fondo = PILImage.new('RGBA', imagen.size, 'white')
+        imagen = PILImage.alpha_composite(fondo, imagen.convert('RGBA'))
+    # En ESC/POS un bit en 1 es un punto negro: invertir antes de pasar a 1 bit
+    imagen = ImageOps.invert(imagen.convert('L')).convert('1')
+
+    ancho_bytes = (imagen.width + 7) // 8
+    return (
+        GS + b'v0\x00'
+        + bytes([ancho_bytes % 256, ancho_bytes // 256, imagen.height % 256, imagen.height // 256])
+        + imagen.tobytes()
+    )
+
+def generar_recibo_escpos(venta_data, columnas=COLUMNAS_DEFAULT, config=None):
+    """
+    Genera el recibo de venta como bytes ESC/POS
+
+    Args:
+        venta_data: dict con los datos de la venta (los mismos de generar_recibo_pdf)
+        columnas: caracteres por línea de la impresora
+        config: configuración del ticket; por defecto la cacheada (con su logo)
+    """
+    logo = None
+    if config is None:
+        config, logo = get_configuracion_recibo()
+    ticket = _Ticket(columnas)
+
+    # ========== LOGO ==========
+    if logo:
+        try:
+            ticket.imagen(_raster_logo(logo))
+        except Exception as e:
+            print(f"Error al convertir logo a ESC/POS: {e}")
+
+    # ========== ENCABEZADO ==========
+    ticket.linea(config.get('nombre_negocio') or CONFIG_DEFAULT['nombre_negocio'], CENTRO,
+                 negrita=True, doble_ancho=True, doble_alto=True)
+    if config.get('direccion'):
+        ticket.linea(config['direccion'], CENTRO)
+    if config.get('telefono'):
+        ticket.linea(f"Tel: {config['telefono']}", CENTRO)
+    if config.get('rfc'):
+        ticket.linea(f"RFC: {config['rfc']}", CENTRO)
+
+    if config.get('encabezado'):
+        ticket.linea()
+        for linea in config['encabezado'].split('\n'):
+            if linea.strip():
+                ticket.linea(linea.strip(), CENTRO)
+
+    ticket.linea()
+    ticket.separador('=')
+    ticket.linea('TICKET DE COMPRA', CENTRO)
+    ticket.separador('=')
+
+    # ========== INFORMACIÓN DE LA VENTA ==========
+    fecha = datetime.strptime(venta_data['fecha_venta'], '%Y-%m-%d %H:%M:%S')
+    ticket.linea(f"Orden: {venta_data['orden_id'][:8].upper()}", negrita=True)
+    ticket.linea(f"Fecha: {fecha.strftime('%d/%m/%Y %I:%M %p')}")
+    ticket.linea(f"Cajero: {venta_data['cajero_nombre']}")
+    ticket.separador()
+
+    # ========== PRODUCTOS ==========
+    ancho_producto = columnas - 5 - 11
+    ticket.linea(f"{'Cant':<5}{'Producto':<{ancho_producto}}{'Importe':>11}", negrita=True)
+    for item in venta_data['items']:
+        cantidad = int(item['cantidad'])
+        subtotal = float(item['precio']) * cantidad
+        nombre = item['nombre'][:ancho_producto - 1]
+        ticket.linea(f"{cantidad:<5}{nombre:<{ancho_producto}}{f'${subtotal:.2f}':>11}")
+    ticket.separador()
+
+    # ========== TOTALES ==========
+    total = float(venta_data['total'])
+    cambio = float(venta_data['cambio'])
+    ticket.columnas_izq_der('Subtotal:', f"${total:.2f}")
+    ticket.columnas_izq_der('TOTAL:', f"${total:.2f}", negrita=True, doble_alto=True)
+    ticket.columnas_izq_der('Pagó con:', f"${float(venta_data['pago_con']):.2f}")
+    if cambio > 0:
+        ticket.columnas_izq_der('Su cambio:', f"${cambio:.2f}")
+    ticket.linea()
+
+    # ========== PIE DE PÁGINA ==========
+    if config.get('pie_pagina'):
+        ticket.separador('=')
+        for linea in config['pie_pagina'].split('\n'):
+            if linea.strip():
+                ticket.linea(linea.strip(), CENTRO)
+
+    # ========== MENSAJE DE AGRADECIMIENTO ==========
+    ticket.separador('=')
+    ticket.linea(config.get('mensaje_agradecimiento') or CONFIG_DEFAULT['mensaje_agradecimiento'], CENTRO, negrita=True)
+    ticket.linea('Esperamos verle pronto', CENTRO)
+
+    ticket.cortar()
+    return ticket.bytes()
+
+def generar_comanda_escpos(orden, columnas=COLUMNAS_DEFAULT):
+    """Genera la comanda de cocina de una orden como bytes ESC/POS"""
+    ticket = _Ticket(columnas)
+
+    ticket.linea('COMANDA', CENTRO, negrita=True, doble_ancho=True, doble_alto=True)
+    ticket.linea(f"Orden: {orden['orden_id'][:8].upper()}", CENTRO, negrita=True)
+    try:
+        fecha = datetime.fromisoformat(orden['fecha']).strftime('%d/%m/%Y %I:%M %p')
+    except (KeyError, TypeError, ValueError):
+        fecha = datetime.now().strftime('%d/%m/%Y %I:%M %p')
+    ticket.linea(fecha, CENTRO)
+    if orden.get('cajero'):
+        ticket.linea(f"Cajero: {orden['cajero']}", CENTRO)
+    ticket.separador('=')
+
+    for item in orden['items']:
+        ticket.linea(f"{int(item['cantidad'])} x {item['nombre']}", negrita=True, doble_alto=True)
+        if item.get('notas'):
+            ticket.linea(f"   * {item['notas']}")
+
+    if orden.get('notas'):
+        ticket.separador()
+        ticket.linea('NOTAS:', negrita=True)
+        for linea in str(orden['notas']).split('\n'):
+            if linea.strip():
+                ticket.linea(linea.strip())
+
+    ticket.cortar()
+    return ticket.bytes()
@@ -0,0 +1,97 @@
+"""
+Prueba de estrés del cobro: varias cajas intentan pagar la misma orden al
+mismo tiempo. Solo una debe cobrarla y en PostgreSQL debe quedar exactamente
+una venta con ese orden_id.
+
+Uso (requiere la aplicación corriendo, PostgreSQL y Redis):
+    python -m utils.estres_pago [--url http://127.0.0.1:5000 ...] [--cajas 4] [--intentos 20]
+
+Con varios --url las cajas se reparten entre los workers.
+"""
+import sys
+import time
+import argparse
+import threading
+
+import requests
+
+from database.pool import get_db_cursor
+
+def _abrir_caja(url, codigo):
+    """Inicia sesión como cajero y abre su caja con efectivo de sobra para el cambio"""
+    caja = requests.Session()
+    respuesta = caja.post(f"{url}/api/login", json={'codigo': codigo}).json()
+    if not respuesta.get('success'):
+        raise RuntimeError(f"No se pudo iniciar sesión con el código {codigo}: {respuesta.get('message')}")
+    caja.post(f"{url}/api/set-caja", json={'monto': 100000})
+    return caja
+
+def _crear_orden(url, caja):
+    """Crea una orden de un producto disponible y regresa (orden_id, total)"""
+    productos = caja.get(f"{url}/api/productos").json()['productos']
+    producto = next((p for p in productos if p['status'] == 'disponible'), None)
+    if not producto:
+        raise RuntimeError("No hay productos disponibles en el catálogo")
+
+    respuesta = caja.post(f"{url}/api/crear-orden", json={'items': [{'id': producto['id'], 'cantidad': 2}]}).json()
+    if not respuesta.get('success'):
+        raise RuntimeError(f"No se pudo crear la orden: {respuesta.get('message')}")
+    orden = caja.get(f"{url}/api/orden/{respuesta['orden_id']}").json()['orden']
+    return orden['orden_id'], float(orden['total'])
+
+def _contar_ventas(orden_id):
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM ventas WHERE orden_id = %s", (orden_id,))
+        return cursor.fetchone()[0]
+
+def estresar(urls, codigo='5678', cajas=4, intentos=20):
+    """Regresa True si de todos los cobros simultáneos quedó exactamente una venta"""
+    sesiones = [(urls[i % len(urls)], _abrir_caja(urls[i % len(urls)], codigo)) for i in range(cajas)]
+    orden_id, total = _crear_orden(*sesiones[0])
+    print(f"Orden {orden_id} por ${total:.2f}: {intentos} cobros simultáneos desde {cajas} cajas")
+
+    # Todos los hilos salen juntos de la barrera para maximizar el choque
+    barrera = threading.Barrier(intentos)
+    resultados = []
+    resultados_lock = threading.Lock()
+
+    def cobrar(i):
+        url, caja = sesiones[i % len(sesiones)]
+        barrera.wait()
+        inicio = time.perf_counter()
+        respuesta = caja.post(f"{url}/api/procesar-pago", json={'orden_id': orden_id, 'pago_con': total})
+        with resultados_lock:
+            resultados.append((respuesta.status_code, (time.perf_counter() - inicio) * 1000, respuesta.json().get('message')))
+
+    hilos = [threading.Thread(target=cobrar, args=(i,)) for i in range(intentos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    por_status = {}
+    for status, ms, mensaje in resultados:
+        datos = por_status.setdefault(status, {'cantidad': 0, 'ms': [], 'mensaje': mensaje})
+        datos['cantidad'] += 1
+        datos['ms'].append(ms)
+    for status, datos in sorted(por_status.items()):
+        print(f"  HTTP {status}: {datos['cantidad']:>3}  (máx {max(datos['ms']):.0f} ms)  {datos['mensaje']}")
+
+    ventas = _contar_ventas(orden_id)
+    exitosos = por_status.get(200, {}).get('cantidad', 0)
+    print(f"Ventas registradas para la orden: {ventas}")
+
+    if ventas == 1 and exitosos == 1:
+        print("OK: un solo cobro, una sola venta")
+        return True
+    print("FALLA: la orden se cobró más de una vez (o ninguna)")
+    return False
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cobros simultáneos de una misma orden')
+    parser.add_argument('--url', action='append', help='URL de un worker (se puede repetir)')
+    parser.add_argument('--codigo', default='5678', help='Código del cajero de prueba')
+    parser.add_argument('--cajas', type=int, default=4)
+    parser.add_argument('--intentos', type=int, default=20)
+    args = parser.parse_args()
+    sys.exit(0 if estresar(args.url or ['http://127.0.0.1:5000'], args.codigo, args.cajas, args.intentos) else 1)
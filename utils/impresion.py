@@ -0,0 +1,171 @@
+import os
+import time
+import uuid
+import queue
+import socket
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from config import Config
+from utils.escpos import generar_recibo_escpos, generar_comanda_escpos
+
+# Cola de impresión ESC/POS. Cada impresora configurada tiene su propia cola
+# y un hilo que envía los trabajos en orden, reintentando si la impresora no
+# responde. El estado de los trabajos es de este proceso (con varios workers
+# el balanceador debe mantener al cliente en el mismo, ver README).
+MAX_TRABAJOS_RECIENTES = 200
+
+_impresoras = None
+_colas = {}
+_colas_pid = None
+_trabajos = OrderedDict()
+_lock = threading.Lock()
+
+def get_impresoras():
+    """Obtiene las impresoras configuradas como {nombre: destino}"""
+    global _impresoras
+
+    if _impresoras is None:
+        impresoras = {}
+        for entrada in Config.IMPRESORAS.split(','):
+            if '=' in entrada:
+                nombre, destino = entrada.split('=', 1)
+                impresoras[nombre.strip()] = destino.strip()
+        _impresoras = impresoras
+    return _impresoras
+
+def impresora_configurada(nombre):
+    return nombre in get_impresoras()
+
+def _enviar(destino, datos):
+    """Envía los bytes al dispositivo: socket TCP (puerto 9100) o archivo/dispositivo"""
+    url = urlparse(destino)
+    if url.scheme == 'tcp':
+        with socket.create_connection((url.hostname, url.port or 9100), timeout=Config.IMPRESION_TIMEOUT) as conexion:
+            conexion.sendall(datos)
+    elif url.scheme == 'file':
+        with open(url.path, 'ab') as dispositivo:
+            dispositivo.write(datos)
+    else:
+        raise ValueError(f"Destino de impresora no soportado: {destino}")
+
+def _procesar_cola(nombre, cola):
+    """Hilo de una impresora: saca los trabajos en orden y los envía con reintentos"""
+    destino = get_impresoras()[nombre]
+
+    while True:
+        trabajo = cola.get()
+        trabajo['estado'] = 'imprimiendo'
+        try:
+            datos = trabajo.pop('generar')()
+        except Exception as e:
+            print(f"Error al generar trabajo de impresión {trabajo['id']}: {e}")
+            trabajo.update(estado='fallido', error=str(e))
+            continue
+
+        for intento in range(1, Config.IMPRESION_REINTENTOS + 1):
+            trabajo['intentos'] = intento
+            try:
+                _enviar(destino, datos)
+                trabajo.update(estado='impreso', error=None, bytes=len(datos), impreso_en=time.time())
+                break
+            except Exception as e:
+                trabajo['error'] = str(e)
+                print(f"Error al imprimir en {nombre} (intento {intento}): {e}")
+                if intento < Config.IMPRESION_REINTENTOS:
+                    time.sleep(min(2 ** (intento - 1), 10))
+        else:
+            trabajo['estado'] = 'fallido'
+
+def _get_cola(nombre):
+    """Obtiene la cola de la impresora, arrancando su hilo una vez por proceso"""
+    global _colas, _colas_pid
+
+    with _lock:
+        if _colas_pid != os.getpid():
+            _colas = {}
+            _colas_pid = os.getpid()
+        if nombre not in _colas:
+            cola = queue.Queue()
+            hilo = threading.Thread(target=_procesar_cola, args=(nombre, cola), name=f'impresora-{nombre}', daemon=True)
+            hilo.start()
+            _colas[nombre] = cola
+        return _colas[nombre]
+
+def encolar_impresion(impresora, generar, descripcion=''):
+    """
+    Encola un trabajo para la impresora y regresa su ID.
+
+    Args:
+        impresora: nombre de la impresora configurada
+        generar: función que regresa los bytes ESC/POS; se llama en el hilo de
+            la impresora para no ocupar la petición
+        descripcion: texto para identificar el trabajo
+    """
+    if not impresora_configurada(impresora):
+        raise ValueError(f"Impresora no configurada: {impresora}")
+
+    trabajo = {
+        'id': uuid.uuid4().hex,
+        'impresora': impresora,
+        'descripcion': descripcion,
+        'estado': 'en_cola',
+        'intentos': 0,
+        'error': None,
+        'creado_en': time.time(),
+        'generar': generar
+    }
+    with _lock:
+        _trabajos[trabajo['id']] = trabajo
+        while len(_trabajos) > MAX_TRABAJOS_RECIENTES:
+            _trabajos.popitem(last=False)
+
+    _get_cola(impresora).put(trabajo)
+    return trabajo['id']
+
+def imprimir_recibo(venta_id, impresora=None):
+    """Encola el recibo ESC/POS de una venta; la venta se consulta en el hilo de la impresora"""
+    from database.db import get_venta_by_id
+
+    def generar():
+        venta = get_venta_by_id(venta_id)
+        if not venta:
+            raise ValueError(f"Venta {venta_id} no encontrada")
+        return generar_recibo_escpos(venta, Config.IMPRESION_COLUMNAS)
+
+    return encolar_impresion(impresora or Config.IMPRESORA_RECIBOS, generar, f"Recibo venta {venta_id}")
+
+def imprimir_comanda(orden, impresora=None):
+    """Encola la comanda de cocina de una orden"""
+    orden = dict(orden)
+    return encolar_impresion(
+        impresora or Config.IMPRESORA_COCINA,
+        lambda: generar_comanda_escpos(orden, Config.IMPRESION_COLUMNAS),
+        f"Comanda {orden['orden_id'][:8].upper()}"
+    )
+
+def get_trabajo(trabajo_id):
+    """Obtiene el estado de un trabajo de impresión reciente (o None)"""
+    trabajo = _trabajos.get(trabajo_id)
+    if not trabajo:
+        return None
+    return {k: v for k, v in trabajo.items() if k != 'generar'}
+
+def get_estado_impresoras():
+    """Obtiene las impresoras configuradas con el tamaño de su cola en este proceso"""
+    colas = _colas if _colas_pid == os.getpid() else {}
+    with _lock:
+        trabajos = list(_trabajos.values())
+
+    estado = {}
+    for nombre, destino in get_impresoras().items():
+        propios = [t for t in trabajos if t['impresora'] == nombre]
+        estado[nombre] = {
+            'destino': destino,
+            'en_cola': colas[nombre].qsize() if nombre in colas else 0,
+            'impresos': sum(1 for t in propios if t['estado'] == 'impreso'),
+            'fallidos': sum(1 for t in propios if t['estado'] == 'fallido'),
+            'ultimo_error': next((t['error'] for t in reversed(propios) if t['error']), None)
+        }
+    return estado
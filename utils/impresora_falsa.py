@@ -0,0 +1,130 @@
+"""
+Impresora ESC/POS falsa: escucha por TCP como una impresora de red (puerto
+9100) y guarda los bytes de cada trabajo.
+
+Uso:
+    python -m utils.impresora_falsa [--puerto 9100] [--salida carpeta]
+        Deja la impresora corriendo; con --salida guarda cada trabajo en un .bin
+    python -m utils.impresora_falsa --probar
+        Verifica la cola de impresión contra la impresora falsa, incluyendo
+        el reintento cuando la impresora todavía no está encendida
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import socketserver
+
+class ImpresoraFalsa:
+    """Servidor TCP que registra los trabajos recibidos"""
+
+    def __init__(self, puerto=0, salida=None):
+        self.trabajos = []
+        self.salida = salida
+        self._recibido = threading.Condition()
+        impresora = self
+
+        class _Manejador(socketserver.BaseRequestHandler):
+            def handle(self):
+                partes = []
+                while True:
+                    datos = self.request.recv(65536)
+                    if not datos:
+                        break
+                    partes.append(datos)
+                impresora._registrar(b''.join(partes))
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._servidor = socketserver.ThreadingTCPServer(('127.0.0.1', puerto), _Manejador)
+        self.puerto = self._servidor.server_address[1]
+
+    def _registrar(self, datos):
+        with self._recibido:
+            self.trabajos.append(datos)
+            if self.salida:
+                ruta = os.path.join(self.salida, f"trabajo_{len(self.trabajos):04d}.bin")
+                with open(ruta, 'wb') as f:
+                    f.write(datos)
+            print(f"Impresora falsa: trabajo {len(self.trabajos)} ({len(datos)} bytes)")
+            self._recibido.notify_all()
+
+    def iniciar(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def esperar_trabajos(self, cantidad, timeout=10):
+        """Espera hasta haber recibido `cantidad` trabajos; regresa True si llegaron"""
+        with self._recibido:
+            return self._recibido.wait_for(lambda: len(self.trabajos) >= cantidad, timeout)
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def probar():
+    """Imprime una comanda con la impresora apagada y un recibo después; ambos deben llegar"""
+    from config import Config
+
+    puerto = _puerto_libre()
+    Config.IMPRESORAS = f"prueba=tcp://127.0.0.1:{puerto}"
+    Config.IMPRESION_REINTENTOS = 4
+
+    from utils import impresion
+    from utils.escpos import generar_recibo_escpos
+    from utils.pdf_generator import CONFIG_DEFAULT
+
+    orden = {
+        'orden_id': 'prueba-0001', 'cajero': 'Prueba', 'fecha': '2024-01-01T12:00:00',
+        'items': [{'nombre': 'Hamburguesa', 'cantidad': 2}], 'notas': 'Sin cebolla'
+    }
+    venta = {
+        'orden_id': 'prueba-0001', 'cajero_nombre': 'Prueba', 'fecha_venta': '2024-01-01 12:00:00',
+        'items': [{'nombre': 'Hamburguesa', 'cantidad': 2, 'precio': 85}],
+        'total': 170, 'pago_con': 200, 'cambio': 30
+    }
+    recibo = generar_recibo_escpos(venta, config=CONFIG_DEFAULT)
+
+    # La impresora aún no escucha: el primer intento falla y el hilo reintenta
+    comanda_id = impresion.imprimir_comanda(orden, 'prueba')
+    recibo_id = impresion.encolar_impresion('prueba', lambda: recibo, 'Recibo de prueba')
+    time.sleep(0.5)
+    impresora = ImpresoraFalsa(puerto).iniciar()
+
+    try:
+        if not impresora.esperar_trabajos(2, timeout=15):
+            print(f"FALLA: llegaron {len(impresora.trabajos)} de 2 trabajos")
+            return False
+        comanda = impresion.get_trabajo(comanda_id)
+        if impresora.trabajos[1] != recibo or b'COMANDA' not in impresora.trabajos[0]:
+            print("FALLA: los bytes recibidos no coinciden con los enviados")
+            return False
+        print(f"OK: 2 trabajos impresos en orden (la comanda tomó {comanda['intentos']} intentos)")
+        print(impresion.get_trabajo(recibo_id))
+        return True
+    finally:
+        impresora.detener()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Impresora ESC/POS falsa')
+    parser.add_argument('--puerto', type=int, default=9100)
+    parser.add_argument('--salida', help='Carpeta donde guardar cada trabajo')
+    parser.add_argument('--probar', action='store_true', help='Verificar la cola de impresión')
+    args = parser.parse_args()
+
+    if args.probar:
+        sys.exit(0 if probar() else 1)
+
+    impresora = ImpresoraFalsa(args.puerto, args.salida).iniciar()
+    print(f"Impresora falsa escuchando en tcp://127.0.0.1:{impresora.puerto}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        impresora.detener()
@@ -0,0 +1,109 @@
+"""
+Compara el tamaño y el costo de (de)serializar una orden con los renglones
+completos (como los mandaba el navegador) contra el formato compacto.
+
+Toma los productos del catálogo vigente, arma una orden típica y mide bytes
+del JSON, tiempo de json.dumps + json.loads y la memoria que ocupa la key en
+Redis (MEMORY USAGE).
+
+Uso (requiere PostgreSQL y Redis):
+    python -m utils.medir_ordenes [--renglones 6] [--repeticiones 20000]
+"""
+import sys
+import json
+import time
+import uuid
+import argparse
+from datetime import datetime
+
+from database.redis_client import redis_client
+from database.catalogo import get_catalogo, compactar_items, expandir_items
+
+# Como las guarda save_orden
+SEPARADORES = (',', ':')
+
+def _orden_base(items, total, **extra):
+    return {
+        'orden_id': str(uuid.uuid4()),
+        'cajero': 'Medición',
+        'cajero_id': 1,
+        'items': items,
+        'total': total,
+        'status': 'pendiente',
+        'fecha': datetime.now().isoformat(),
+        'notas': None,
+        'cliente_id': None,
+        **extra
+    }
+
+def _medir_json(orden, repeticiones):
+    """Microsegundos promedio de json.dumps + json.loads"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        json.loads(json.dumps(orden, separators=SEPARADORES))
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+def _memoria_redis(valor):
+    """Bytes que ocupa la key en Redis (None si el servidor no soporta MEMORY USAGE)"""
+    key = f"medir:orden:{uuid.uuid4().hex}"
+    try:
+        pipe = redis_client.pipeline()
+        pipe.set(key, valor, ex=60)
+        pipe.memory_usage(key, samples=0)
+        pipe.delete(key)
+        return pipe.execute()[1]
+    except Exception:
+        return None
+
+def medir(renglones=6, repeticiones=20000):
+    catalogo = get_catalogo()
+    productos = [p for p in catalogo['productos'] if catalogo['precios'][p['id']].disponible][:renglones]
+    if not productos:
+        print("El catálogo está vacío")
+        return None
+
+    # Renglones como los mandaba el navegador: el producto completo más la cantidad
+    completos = json.loads(json.dumps(
+        [{**producto, 'cantidad': i % 3 + 1} for i, producto in enumerate(productos)],
+        default=str
+    ))
+    for item in completos:
+        item['precio'] = float(item['precio'])
+        item['costo'] = float(item['costo'])
+
+    total = sum(item['precio'] * item['cantidad'] for item in completos)
+    antes = _orden_base(completos, total)
+    despues = _orden_base(compactar_items(completos), total, catalogo_version=catalogo['version'])
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        expandir_items(despues['items'])
+    expandir_us = (time.perf_counter() - inicio) / repeticiones * 1e6
+
+    # Los mismos separadores para las dos: la diferencia es solo el formato de los renglones
+    resultados = {}
+    for nombre, orden in (('completa', antes), ('compacta', despues)):
+        valor = json.dumps(orden, separators=SEPARADORES)
+        resultados[nombre] = {
+            'bytes': len(valor.encode('utf-8')),
+            'json_us': _medir_json(orden, repeticiones),
+            'redis_bytes': _memoria_redis(valor)
+        }
+
+    print(f"Orden de {len(productos)} renglones, {repeticiones} repeticiones")
+    print(f"{'':10}{'bytes':>10}{'json (µs)':>12}{'redis (bytes)':>16}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:10}{r['bytes']:>10}{r['json_us']:>12.1f}{str(r['redis_bytes'] or '-'):>16}")
+
+    completa, compacta = resultados['completa'], resultados['compacta']
+    print(f"Reducción: {100 - compacta['bytes'] * 100 / completa['bytes']:.0f}% en bytes, "
+          f"{100 - compacta['json_us'] * 100 / completa['json_us']:.0f}% en tiempo de JSON")
+    print(f"Expandir contra el catálogo (solo al mostrar o cobrar): {expandir_us:.1f} µs")
+    return resultados
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mide el formato compacto de órdenes')
+    parser.add_argument('--renglones', type=int, default=6)
+    parser.add_argument('--repeticiones', type=int, default=20000)
+    args = parser.parse_args()
+    sys.exit(0 if medir(args.renglones, args.repeticiones) else 1)
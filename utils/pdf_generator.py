@@ -1,298 +1,410 @@
-from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
-from reportlab.lib.units import mm
+from reportlab.lib.units import mm, inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from datetime import datetime
+from PIL import Image as PILImage
 import io
+import time
+import threading
 import requests
-from io import BytesIO
 
-def generar_recibo_pdf(venta_data):
+from database.redis_client import redis_client, sumar_contadores, leer_contadores
+
+# Motor de recibos. La configuración del ticket y el logo (ya descargado,
+# decodificado y escalado) se guardan por proceso junto con la versión de
+# Redis con la que se cargaron; actualizar la configuración incrementa la
+# versión y cada worker recarga en su siguiente recibo.
+TICKET_VERSION_KEY = "ticket:version"
+
+CONFIG_DEFAULT = {
+    'nombre_negocio': 'RESTAURANT LA SALLE',
+    'direccion': '',
+    'telefono': '',
+    'rfc': '',
+    'encabezado': '',
+    'mensaje_agradecimiento': '¡Gracias por su compra!',
+    'pie_pagina': '',
+    'mostrar_puntos': True,
+    'logo_url': None
+}
+
+# Tamaño de ticket de 80mm de ancho; la altura se ajusta al contenido
+TICKET_ANCHO = 80 * mm
+TICKET_MARGEN = 5 * mm
+# El Frame de SimpleDocTemplate agrega 6pt de relleno por lado
+_RELLENO_FRAME = 6
+ANCHO_CONTENIDO = TICKET_ANCHO - 2 * TICKET_MARGEN - 2 * _RELLENO_FRAME
+
+LOGO_ANCHO = 30 * mm
+LOGO_ALTO = 15 * mm
+LOGO_DPI = 203              # Resolución típica de impresoras térmicas
+LOGO_TIMEOUT = 5
+LOGO_REINTENTO = 300        # Segundos antes de volver a intentar un logo que falló
+
+ETAPAS = ('config', 'logo', 'layout', 'build')
+
+_recursos = None
+_recursos_lock = threading.Lock()
+_logos_descargando = set()  # URLs con descarga en curso (protegido por _recursos_lock)
+
+# Contadores en Redis: los recibos se generan en los procesos de render de PDF
+RECIBOS_RENDER_STATS_KEY = "recibos:stats:render"
+_STATS_INICIALES = {
+    'recibos': 0,
+    'recargas_config': 0,
+    'descargas_logo': 0,
+    'errores_logo': 0,
+    **{f'{etapa}_ms_total': 0.0 for etapa in ETAPAS}
+}
+
+def _crear_estilos():
+    """Crea una sola vez los estilos del ticket"""
+    normal = getSampleStyleSheet()['Normal']
+    return {
+        'titulo': ParagraphStyle('TituloTicket', parent=normal, fontSize=14, fontName='Helvetica-Bold',
+                                 textColor=colors.black, alignment=TA_CENTER, spaceAfter=3),
+        'info': ParagraphStyle('InfoTicket', parent=normal, fontSize=8, alignment=TA_CENTER,
+                               textColor=colors.black, spaceAfter=2),
+        'header': ParagraphStyle('HeaderTicket', parent=normal, fontSize=7, alignment=TA_CENTER,
+                                 textColor=colors.grey, spaceAfter=1),
+        'dato': ParagraphStyle('DatoTicket', parent=normal, fontSize=8, alignment=TA_LEFT, spaceAfter=1),
+        'dato_bold': ParagraphStyle('DatoBold', parent=normal, fontSize=8, alignment=TA_LEFT, spaceAfter=1),
+        'separador': ParagraphStyle('Separador', parent=normal, fontSize=8, alignment=TA_CENTER, spaceAfter=2),
+        'total_normal': ParagraphStyle('TotalNormal', parent=normal, fontSize=9, alignment=TA_RIGHT),
+        'total_bold': ParagraphStyle('TotalBold', parent=normal, fontSize=10, fontName='Helvetica-Bold',
+                                     alignment=TA_RIGHT),
+        'gracias': ParagraphStyle('Gracias', parent=normal, fontSize=10, fontName='Helvetica-Bold',
+                                  alignment=TA_CENTER, spaceAfter=2),
+    }
+
+ESTILOS = _crear_estilos()
+
+ESTILO_TABLA_PRODUCTOS = TableStyle([
+    # Encabezado
+    ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 8),
+    ('ALIGN', (0, 0), (0, 0), 'CENTER'),
+    ('ALIGN', (1, 0), (1, 0), 'LEFT'),
+    ('ALIGN', (2, 0), (2, 0), 'RIGHT'),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
+    ('TOPPADDING', (0, 0), (-1, 0), 2),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 2),
+
+    # Contenido
+    ('FONT', (0, 1), (-1, -1), 'Helvetica', 8),
+    ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+    ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+    ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
+    ('TOPPADDING', (0, 1), (-1, -1), 2),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
+])
+
+ESTILO_TABLA_TOTALES = TableStyle([
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ('LINEABOVE', (0, 1), (-1, 1), 1, colors.black),
+])
+
+def _sumar_stats(**valores):
+    sumar_contadores(RECIBOS_RENDER_STATS_KEY, **valores)
+
+def _leer_version():
+    """Obtiene la versión de la configuración del ticket desde Redis"""
+    version = redis_client.get(TICKET_VERSION_KEY)
+    return int(version) if version else 0
+
+def get_version_ticket():
+    """Obtiene la versión vigente de la configuración del ticket"""
+    return _leer_version()
+
+def _preparar_logo(contenido):
     """
-    Genera un PDF de recibo de venta para impresora de tickets (80mm)
-    
-    Args:
-        venta_data: dict con los datos de la venta
-            - orden_id: ID de la orden
-            - cajero_nombre: Nombre del cajero
-            - items: Lista de productos
-            - total: Total de la venta
-            - pago_con: Monto con el que pagó
-            - cambio: Cambio devuelto
-            - fecha_venta: Fecha de la venta
+    Decodifica el logo y lo escala a la resolución de la impresora dentro de la
+    caja de 30x15mm, conservando la proporción. Regresa (png, ancho, alto).
     """
-    from database.db import get_configuracion_ticket
-    
+    imagen = PILImage.open(io.BytesIO(contenido))
+    imagen.load()
+    if imagen.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        imagen = imagen.convert('RGBA')
+
+    max_px = (round(LOGO_ANCHO / inch * LOGO_DPI), round(LOGO_ALTO / inch * LOGO_DPI))
+    imagen.thumbnail(max_px, PILImage.LANCZOS)
+
+    escala = min(LOGO_ANCHO / imagen.width, LOGO_ALTO / imagen.height)
     buffer = io.BytesIO()
-    
-    # Obtener configuración del ticket
-    config = get_configuracion_ticket()
-    if not config:
-        config = {
-            'nombre_negocio': 'RESTAURANT LA SALLE',
-            'direccion': '',
-            'telefono': '',
-            'rfc': '',
-            'encabezado': '',
-            'mensaje_agradecimiento': '¡Gracias por su compra!',
-            'pie_pagina': '',
-            'mostrar_puntos': True,
-            'logo_url': None
-        }
-    
-    # Tamaño de ticket de 80mm de ancho (con márgenes mínimos)
-    ticket_width = 80 * mm
-    ticket_height = 297 * mm  # Altura variable
-    
-    # Crear documento PDF con tamaño de ticket
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=(ticket_width, ticket_height),
-        rightMargin=5*mm,
-        leftMargin=5*mm,
-        topMargin=5*mm,
-        bottomMargin=5*mm
-    )
-    
+    imagen.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue(), imagen.width * escala, imagen.height * escala
+
+def _descargar_logo(logo_url):
+    """Descarga y prepara el logo; regresa None si no se pudo"""
+    _sumar_stats(descargas_logo=1)
+    try:
+        response = requests.get(logo_url, timeout=LOGO_TIMEOUT)
+        if response.status_code == 200:
+            return _preparar_logo(response.content)
+        print(f"Error al cargar logo: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Error al cargar logo: {e}")
+    _sumar_stats(errores_logo=1)
+    return None
+
+def _get_recursos(tiempos):
+    """
+    Obtiene la configuración y el logo vigentes, recargándolos solo si la
+    versión en Redis cambió (o si el logo falló y ya toca reintentar).
+    """
+    global _recursos
+
+    inicio = time.perf_counter()
+    try:
+        version = _leer_version()
+    except Exception as e:
+        # Sin Redis seguimos con lo que tengamos en memoria
+        print(f"Error al leer versión del ticket: {e}")
+        version = _recursos['version'] if _recursos else 0
+
+    recursos = _recursos
+    if recursos is None or recursos['version'] != version:
+        with _recursos_lock:
+            recursos = _recursos
+            if recursos is None or recursos['version'] != version:
+                from database.db import get_configuracion_ticket
+
+                config = {**CONFIG_DEFAULT, **(get_configuracion_ticket() or {})}
+                recursos = {'version': version, 'config': config, 'logo': None, 'logo_reintento': 0}
+                _recursos = recursos
+                _sumar_stats(recargas_config=1)
+    tiempos['config'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    logo_url = recursos['config'].get('logo_url')
+    if logo_url and recursos['logo'] is None and time.time() >= recursos['logo_reintento']:
+        # Un solo hilo descarga cada URL y fuera del lock; mientras tanto los
+        # demás recibos salen sin logo en lugar de esperar hasta LOGO_TIMEOUT
+        with _recursos_lock:
+            descargar = (recursos['logo'] is None and time.time() >= recursos['logo_reintento']
+                         and logo_url not in _logos_descargando)
+            if descargar:
+                _logos_descargando.add(logo_url)
+
+        if descargar:
+            logo = None
+            try:
+                logo = _descargar_logo(logo_url)
+            finally:
+                with _recursos_lock:
+                    _logos_descargando.discard(logo_url)
+                    recursos['logo'] = logo
+                    if logo is None:
+                        recursos['logo_reintento'] = time.time() + LOGO_REINTENTO
+    tiempos['logo'] = time.perf_counter() - inicio
+
+    return recursos
+
+def get_configuracion_recibo():
+    """Obtiene la configuración del ticket y el logo cacheados: (config, logo)"""
+    recursos = _get_recursos({})
+    return recursos['config'], recursos['logo']
+
+def invalidar_configuracion_ticket():
+    """
+    Invalida la configuración y el logo en todos los workers. Se llama después
+    de guardar la configuración del ticket.
+    """
+    global _recursos
+
+    _recursos = None
+    try:
+        redis_client.incr(TICKET_VERSION_KEY)
+    except Exception as e:
+        print(f"Error al invalidar configuración del ticket: {e}")
+
+def _armar_elementos(venta_data, config, logo):
+    """Arma los elementos del ticket con los estilos precalculados"""
+    estilos = ESTILOS
     elementos = []
-    styles = getSampleStyleSheet()
-    
-    # Ancho disponible para contenido
-    ancho_contenido = ticket_width - 10*mm
-    
-    # ========== ESTILOS PERSONALIZADOS ==========
-    titulo_style = ParagraphStyle(
-        'TituloTicket',
-        parent=styles['Normal'],
-        fontSize=14,
-        fontName='Helvetica-Bold',
-        textColor=colors.black,
-        alignment=TA_CENTER,
-        spaceAfter=3
-    )
-    
-    info_style = ParagraphStyle(
-        'InfoTicket',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_CENTER,
-        textColor=colors.black,
-        spaceAfter=2
-    )
-    
-    header_style = ParagraphStyle(
-        'HeaderTicket',
-        parent=styles['Normal'],
-        fontSize=7,
-        alignment=TA_CENTER,
-        textColor=colors.grey,
-        spaceAfter=1
-    )
-    
-    dato_style = ParagraphStyle(
-        'DatoTicket',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_LEFT,
-        spaceAfter=1
-    )
-    
-    separador_style = ParagraphStyle(
-        'Separador',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_CENTER,
-        spaceAfter=2
-    )
-    
+
     # ========== LOGO ==========
-    if config.get('logo_url'):
-        try:
-            response = requests.get(config['logo_url'], timeout=5)
-            if response.status_code == 200:
-                img_buffer = BytesIO(response.content)
-                logo = Image(img_buffer, width=30*mm, height=15*mm)
-                logo.hAlign = 'CENTER'
-                elementos.append(logo)
-                elementos.append(Spacer(1, 2*mm))
-        except Exception as e:
-            print(f"Error al cargar logo: {e}")
-    
+    if logo:
+        png, ancho, alto = logo
+        imagen = Image(io.BytesIO(png), width=ancho, height=alto)
+        imagen.hAlign = 'CENTER'
+        elementos.append(imagen)
+        elementos.append(Spacer(1, 2*mm))
+
     # ========== ENCABEZADO - NOMBRE DEL NEGOCIO ==========
-    titulo = Paragraph(config.get('nombre_negocio', 'RESTAURANT LA SALLE'), titulo_style)
-    elementos.append(titulo)
-    
+    elementos.append(Paragraph(config.get('nombre_negocio') or CONFIG_DEFAULT['nombre_negocio'], estilos['titulo']))
+
     # ========== INFORMACIÓN DEL NEGOCIO ==========
     if config.get('direccion'):
-        elementos.append(Paragraph(config['direccion'], info_style))
+        elementos.append(Paragraph(config['direccion'], estilos['info']))
     if config.get('telefono'):
-        elementos.append(Paragraph(f"Tel: {config['telefono']}", info_style))
+        elementos.append(Paragraph(f"Tel: {config['telefono']}", estilos['info']))
     if config.get('rfc'):
-        elementos.append(Paragraph(f"RFC: {config['rfc']}", info_style))
-    
+        elementos.append(Paragraph(f"RFC: {config['rfc']}", estilos['info']))
+
     elementos.append(Spacer(1, 2*mm))
-    
+
     # ========== ENCABEZADO LEGAL ==========
     if config.get('encabezado'):
         for linea in config['encabezado'].split('\n'):
             if linea.strip():
-                elementos.append(Paragraph(linea.strip(), header_style))
+                elementos.append(Paragraph(linea.strip(), estilos['header']))
         elementos.append(Spacer(1, 2*mm))
-    
+
     # ========== SEPARADOR ==========
-    elementos.append(Paragraph('=' * 42, separador_style))
-    elementos.append(Paragraph('TICKET DE COMPRA', info_style))
-    elementos.append(Paragraph('=' * 42, separador_style))
+    elementos.append(Paragraph('=' * 42, estilos['separador']))
+    elementos.append(Paragraph('TICKET DE COMPRA', estilos['info']))
+    elementos.append(Paragraph('=' * 42, estilos['separador']))
     elementos.append(Spacer(1, 2*mm))
-    
+
     # ========== INFORMACIÓN DE LA VENTA ==========
     fecha_format = datetime.strptime(venta_data['fecha_venta'], '%Y-%m-%d %H:%M:%S')
     fecha_str = fecha_format.strftime('%d/%m/%Y %I:%M %p')
-    
-    dato_bold_style = ParagraphStyle(
-        'DatoBold',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_LEFT,
-        spaceAfter=1
-    )
-    
-    elementos.append(Paragraph(f"Orden: {venta_data['orden_id'][:8].upper()}", dato_bold_style))
-    elementos.append(Paragraph(f"Fecha: {fecha_str}", dato_style))
-    elementos.append(Paragraph(f"Cajero: {venta_data['cajero_nombre']}", dato_style))
-    
+
+    elementos.append(Paragraph(f"Orden: {venta_data['orden_id'][:8].upper()}", estilos['dato_bold']))
+    elementos.append(Paragraph(f"Fecha: {fecha_str}", estilos['dato']))
+    elementos.append(Paragraph(f"Cajero: {venta_data['cajero_nombre']}", estilos['dato']))
+
     elementos.append(Spacer(1, 2*mm))
-    elementos.append(Paragraph('-' * 42, separador_style))
-    
+    elementos.append(Paragraph('-' * 42, estilos['separador']))
+
     # ========== TABLA DE PRODUCTOS ==========
-    # Encabezado de productos
-    productos_header = [['Cant', 'Producto', 'Importe']]
-    
+    productos = [['Cant', 'Producto', 'Importe']]
+
     for item in venta_data['items']:
         cantidad = int(item['cantidad'])
-        nombre = item['nombre']
-        precio = float(item['precio'])
-        subtotal = precio * cantidad
-        
+        subtotal = float(item['precio']) * cantidad
         # Limitar nombre a 20 caracteres para que quepa
-        nombre_corto = nombre[:20] if len(nombre) > 20 else nombre
-        
-        productos_header.append([
-            str(cantidad),
-            nombre_corto,
-            f"${subtotal:.2f}"
-        ])
-    
-    # Crear tabla con anchos específicos para ticket de 80mm
-    tabla_productos = Table(
-        productos_header, 
-        colWidths=[10*mm, 40*mm, 20*mm]
-    )
-    
-    tabla_productos.setStyle(TableStyle([
-        # Encabezado
-        ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 8),
-        ('ALIGN', (0, 0), (0, 0), 'CENTER'),
-        ('ALIGN', (1, 0), (1, 0), 'LEFT'),
-        ('ALIGN', (2, 0), (2, 0), 'RIGHT'),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.black),
-        ('TOPPADDING', (0, 0), (-1, 0), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 2),
-        
-        # Contenido
-        ('FONT', (0, 1), (-1, -1), 'Helvetica', 8),
-        ('ALIGN', (0, 1), (0, -1), 'CENTER'),
-        ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-        ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-        ('TOPPADDING', (0, 1), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 2),
-    ]))
-    
+        productos.append([str(cantidad), item['nombre'][:20], f"${subtotal:.2f}"])
+
+    tabla_productos = Table(productos, colWidths=[10*mm, 40*mm, 20*mm])
+    tabla_productos.setStyle(ESTILO_TABLA_PRODUCTOS)
+
     elementos.append(tabla_productos)
     elementos.append(Spacer(1, 2*mm))
-    elementos.append(Paragraph('-' * 42, separador_style))
-    
+    elementos.append(Paragraph('-' * 42, estilos['separador']))
+
     # ========== TOTALES ==========
     total = float(venta_data['total'])
     pago_con = float(venta_data['pago_con'])
     cambio = float(venta_data['cambio'])
-    
-    # Estilo para totales normales
-    total_normal_style = ParagraphStyle(
-        'TotalNormal',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=TA_RIGHT
-    )
-    
-    # Estilo para TOTAL en negrita
-    total_bold_style = ParagraphStyle(
-        'TotalBold',
-        parent=styles['Normal'],
-        fontSize=10,
-        fontName='Helvetica-Bold',
-        alignment=TA_RIGHT
-    )
-    
+    normal, bold = estilos['total_normal'], estilos['total_bold']
+
     totales_data = [
-        [Paragraph('Subtotal:', total_normal_style), Paragraph(f"${total:.2f}", total_normal_style)],
-        [Paragraph('TOTAL:', total_bold_style), Paragraph(f"${total:.2f}", total_bold_style)],
-        [Paragraph('Pagó con:', total_normal_style), Paragraph(f"${pago_con:.2f}", total_normal_style)]
+        [Paragraph('Subtotal:', normal), Paragraph(f"${total:.2f}", normal)],
+        [Paragraph('TOTAL:', bold), Paragraph(f"${total:.2f}", bold)],
+        [Paragraph('Pagó con:', normal), Paragraph(f"${pago_con:.2f}", normal)]
     ]
-    
+
     if cambio > 0:
-        totales_data.append([
-            Paragraph('Su cambio:', total_normal_style), 
-            Paragraph(f"${cambio:.2f}", total_normal_style)
-        ])
-    
+        totales_data.append([Paragraph('Su cambio:', normal), Paragraph(f"${cambio:.2f}", normal)])
+
     tabla_totales = Table(totales_data, colWidths=[40*mm, 30*mm])
-    tabla_totales.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('LINEABOVE', (0, 1), (-1, 1), 1, colors.black),
-    ]))
-    
+    tabla_totales.setStyle(ESTILO_TABLA_TOTALES)
+
     elementos.append(tabla_totales)
     elementos.append(Spacer(1, 3*mm))
-    
+
     # ========== PIE DE PÁGINA ==========
     if config.get('pie_pagina'):
-        elementos.append(Paragraph('=' * 42, separador_style))
+        elementos.append(Paragraph('=' * 42, estilos['separador']))
         for linea in config['pie_pagina'].split('\n'):
             if linea.strip():
-                elementos.append(Paragraph(linea.strip(), header_style))
+                elementos.append(Paragraph(linea.strip(), estilos['header']))
         elementos.append(Spacer(1, 2*mm))
-    
+
     # ========== MENSAJE DE AGRADECIMIENTO ==========
-    elementos.append(Paragraph('=' * 42, separador_style))
-    
-    mensaje_gracias_style = ParagraphStyle(
-        'Gracias',
-        parent=styles['Normal'],
-        fontSize=10,
-        fontName='Helvetica-Bold',
-        alignment=TA_CENTER,
-        spaceAfter=2
-    )
-    
+    elementos.append(Paragraph('=' * 42, estilos['separador']))
     elementos.append(Paragraph(
-        config.get('mensaje_agradecimiento', '¡Gracias por su compra!'), 
-        mensaje_gracias_style
+        config.get('mensaje_agradecimiento') or CONFIG_DEFAULT['mensaje_agradecimiento'],
+        estilos['gracias']
     ))
-    elementos.append(Paragraph('Esperamos verle pronto', info_style))
-    
+    elementos.append(Paragraph('Esperamos verle pronto', estilos['info']))
     elementos.append(Spacer(1, 5*mm))
-    
-    # Construir PDF
+
+    return elementos
+
+def _altura_ticket(elementos):
+    """Calcula la altura de página justa para el contenido (en vez de 297mm fijos)"""
+    altura = 2 * TICKET_MARGEN + 2 * _RELLENO_FRAME + 2 * mm
+    for elemento in elementos:
+        _, alto = elemento.wrap(ANCHO_CONTENIDO, 10000 * mm)
+        altura += alto + elemento.getSpaceBefore() + elemento.getSpaceAfter()
+    return altura
+
+def renderizar_recibo(venta_data):
+    """
+    Genera el PDF del recibo y regresa (pdf, tiempos), con los tiempos de
+    cada etapa (config, logo, layout, build) en milisegundos.
+    """
+    tiempos = {}
+    inicio_total = time.perf_counter()
+
+    recursos = _get_recursos(tiempos)
+
+    inicio = time.perf_counter()
+    elementos = _armar_elementos(venta_data, recursos['config'], recursos['logo'])
+    altura = _altura_ticket(elementos)
+    tiempos['layout'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=(TICKET_ANCHO, altura),
+        rightMargin=TICKET_MARGEN,
+        leftMargin=TICKET_MARGEN,
+        topMargin=TICKET_MARGEN,
+        bottomMargin=TICKET_MARGEN
+    )
     doc.build(elementos)
-    
-    # Obtener el valor del buffer
     pdf = buffer.getvalue()
     buffer.close()
-    
-    return pdf
\ No newline at end of file
+    tiempos['build'] = time.perf_counter() - inicio
+    tiempos['total'] = time.perf_counter() - inicio_total
+
+    tiempos = {etapa: round(segundos * 1000, 2) for etapa, segundos in tiempos.items()}
+    _sumar_stats(recibos=1, **{f'{etapa}_ms_total': tiempos[etapa] for etapa in ETAPAS})
+    return pdf, tiempos
+
+def generar_recibo_pdf(venta_data):
+    """
+    Genera un PDF de recibo de venta para impresora de tickets (80mm)
+
+    Args:
+        venta_data: dict con los datos de la venta
+            - orden_id: ID de la orden
+            - cajero_nombre: Nombre del cajero
+            - items: Lista de productos
+            - total: Total de la venta
+            - pago_con: Monto con el que pagó
+            - cambio: Cambio devuelto
+            - fecha_venta: Fecha de la venta
+    """
+    pdf, _ = renderizar_recibo(venta_data)
+    return pdf
+
+def get_recibo_stats():
+    """
+    Obtiene las estadísticas del motor de recibos de todos los procesos; la
+    versión de la configuración y el logo son los de este proceso.
+    """
+    try:
+        stats = leer_contadores(RECIBOS_RENDER_STATS_KEY, _STATS_INICIALES)
+    except Exception as e:
+        print(f"Error al leer estadísticas de recibos: {e}")
+        stats = dict(_STATS_INICIALES)
+
+    recibos = stats['recibos']
+    for etapa in ETAPAS:
+        total = stats.pop(f'{etapa}_ms_total')
+        stats[f'{etapa}_ms_promedio'] = round(total / recibos, 2) if recibos else 0
+
+    recursos = _recursos
+    stats['version_config'] = recursos['version'] if recursos else None
+    stats['logo_en_cache'] = bool(recursos and recursos['logo'])
+    return stats
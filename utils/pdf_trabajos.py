@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import uuid
+import queue
+import itertools
+import threading
+import multiprocessing
+
+from config import Config
+from database.redis_client import redis_client, redis_binario
+
+# Generación de PDFs fuera del proceso web. ReportLab es Python puro y retiene
+# el GIL: un reporte grande dentro del hilo de la petición frena a las cajas.
+# Los trabajos entran a una cola con prioridad (recibos antes que reportes) y
+# los atienden PDF_PROCESOS hilos, cada uno con su propio proceso de render;
+# si un trabajo pasa su timeout se mata solo ese proceso y se levanta otro.
+# El estado y el PDF resultante viven en Redis con TTL para que cualquier
+# worker pueda responder el poll y la descarga.
+PDF_TRABAJO_KEY = "pdf:trabajo:{}"
+PDF_RESULTADO_KEY = "pdf:trabajo:{}:pdf"
+
+PRIORIDADES = {'recibo': 0, 'reporte_empleados': 1}
+
+_cola = None
+_cola_pid = None
+_cola_lock = threading.Lock()
+_secuencia = itertools.count()
+_terminados = {}
+
+_stats_lock = threading.Lock()
+_stats = {
+    'enviados': 0,
+    'rechazados': 0,
+    'en_proceso': 0,
+    'completados': 0,
+    'fallidos': 0,
+    'expirados': 0,
+    'procesos_reiniciados': 0
+}
+_latencias = {tipo: {'trabajos': 0, 'espera_ms': 0.0, 'render_ms': 0.0} for tipo in PRIORIDADES}
+
+def _sumar_stats(**valores):
+    with _stats_lock:
+        for nombre, valor in valores.items():
+            _stats[nombre] += valor
+
+# ===== TAREAS (corren en el proceso de render) =====
+# Regresan (pdf, tiempos por etapa en ms o None)
+
+def _tarea_recibo(venta_id):
+    from utils.recibo_cache import obtener_recibo
+
+    # Quien encoló el recibo ya contó su búsqueda en la caché
+    pdf, tiempos = obtener_recibo(venta_id, contar=False)
+    if pdf is None:
+        raise ValueError(f"Venta {venta_id} no encontrada")
+    return pdf, tiempos
+
+def _tarea_reporte_empleados(fecha_inicio, fecha_fin):
+    from database.reportes import get_reportes_empleados
+    from utils.pdf_reports import generar_reporte_empleados_pdf
+
+    reportes = get_reportes_empleados(fecha_inicio, fecha_fin)
+    return generar_reporte_empleados_pdf(reportes, fecha_inicio, fecha_fin), None
+
+_TAREAS = {
+    'recibo': _tarea_recibo,
+    'reporte_empleados': _tarea_reporte_empleados,
+}
+
+def _timeout(tipo):
+    return Config.PDF_TIMEOUT_RECIBO if tipo == 'recibo' else Config.PDF_TIMEOUT_REPORTE
+
+# ===== ESTADO EN REDIS =====
+
+def _guardar_estado(trabajo_id, **campos):
+    key = PDF_TRABAJO_KEY.format(trabajo_id)
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={k: '' if v is None else v for k, v in campos.items()})
+    pipe.expire(key, Config.PDF_TRABAJO_TTL)
+    pipe.execute()
+
+def _terminar(trabajo, estado, pdf=None, tiempos=None, error=None):
+    """Registra el resultado del trabajo y despierta a quien lo esté esperando"""
+    ahora = time.time()
+    render_ms = round((ahora - trabajo['iniciado']) * 1000, 2)
+    espera_ms = round((trabajo['iniciado'] - trabajo['creado']) * 1000, 2)
+
+    try:
+        if pdf is not None:
+            redis_binario.set(PDF_RESULTADO_KEY.format(trabajo['id']), pdf, ex=Config.PDF_TRABAJO_TTL)
+        _guardar_estado(
+            trabajo['id'], estado=estado, error=error, terminado=ahora,
+            espera_ms=espera_ms, render_ms=render_ms, bytes=len(pdf) if pdf is not None else 0,
+            tiempos=json.dumps(tiempos) if tiempos else None
+        )
+    except Exception as e:
+        print(f"Error al guardar resultado del trabajo PDF {trabajo['id']}: {e}")
+
+    with _stats_lock:
+        _stats['en_proceso'] -= 1
+        _stats[{'completado': 'completados', 'expirado': 'expirados'}.get(estado, 'fallidos')] += 1
+        if estado == 'completado':
+            latencia = _latencias[trabajo['tipo']]
+            latencia['trabajos'] += 1
+            latencia['espera_ms'] += espera_ms
+            latencia['render_ms'] += render_ms
+
+    evento = _terminados.pop(trabajo['id'], None)
+    if evento:
+        evento.set()
+
+# ===== DESPACHADORES =====
+
+def _crear_proceso():
+    # spawn: el proceso web tiene hilos (SocketIO, pool de conexiones) y un fork
+    # podría heredar locks tomados
+    return multiprocessing.get_context('spawn').Pool(processes=1)
+
+def _despachar(cola):
+    """Hilo despachador: toma el trabajo más prioritario y lo corre en su proceso"""
+    proceso = _crear_proceso()
+
+    while True:
+        _, _, trabajo = cola.get()
+        trabajo['iniciado'] = time.time()
+        _sumar_stats(en_proceso=1)
+        try:
+            _guardar_estado(trabajo['id'], estado='procesando', iniciado=trabajo['iniciado'])
+        except Exception as e:
+            print(f"Error al actualizar trabajo PDF {trabajo['id']}: {e}")
+
+        resultado = proceso.apply_async(_TAREAS[trabajo['tipo']], kwds=trabajo['params'])
+        try:
+            pdf, tiempos = resultado.get(timeout=_timeout(trabajo['tipo']))
+            _terminar(trabajo, 'completado', pdf=pdf, tiempos=tiempos)
+        except multiprocessing.TimeoutError:
+            print(f"Trabajo PDF {trabajo['id']} ({trabajo['tipo']}) excedió {_timeout(trabajo['tipo'])}s")
+            _terminar(trabajo, 'expirado', error='Tiempo de generación excedido')
+            # El proceso sigue ocupado con el PDF: matarlo y levantar otro
+            proceso.terminate()
+            proceso = _crear_proceso()
+            _sumar_stats(procesos_reiniciados=1)
+        except Exception as e:
+            print(f"Error en trabajo PDF {trabajo['id']} ({trabajo['tipo']}): {e}")
+            _terminar(trabajo, 'fallido', error=str(e))
+
+def _get_cola():
+    """Obtiene la cola de trabajos, arrancando los despachadores una vez por proceso"""
+    global _cola, _cola_pid
+
+    if _cola_pid == os.getpid():
+        return _cola
+
+    with _cola_lock:
+        if _cola_pid != os.getpid():
+            cola = queue.PriorityQueue()
+            for i in range(Config.PDF_PROCESOS):
+                threading.Thread(target=_despachar, args=(cola,), name=f'pdf-{i}', daemon=True).start()
+            _cola = cola
+            _cola_pid = os.getpid()
+    return _cola
+
+# ===== API =====
+
+def enviar_trabajo(tipo, **params):
+    """
+    Encola la generación de un PDF y regresa el ID del trabajo, o None si la
+    cola está llena.
+
+    Args:
+        tipo: 'recibo' (venta_id) o 'reporte_empleados' (fecha_inicio, fecha_fin)
+        params: argumentos de la tarea
+    """
+    if tipo not in _TAREAS:
+        raise ValueError(f"Tipo de PDF desconocido: {tipo}")
+
+    cola = _get_cola()
+    if cola.qsize() >= Config.PDF_COLA_MAX:
+        _sumar_stats(rechazados=1)
+        return None
+
+    trabajo = {
+        'id': uuid.uuid4().hex,
+        'tipo': tipo,
+        'params': params,
+        'creado': time.time()
+    }
+    _guardar_estado(trabajo['id'], tipo=tipo, estado='en_cola', creado=trabajo['creado'])
+    _terminados[trabajo['id']] = threading.Event()
+    cola.put((PRIORIDADES[tipo], next(_secuencia), trabajo))
+    _sumar_stats(enviados=1)
+    return trabajo['id']
+
+def get_estado_trabajo(trabajo_id):
+    """Obtiene el estado de un trabajo (en_cola, procesando, completado, fallido o expirado)"""
+    estado = redis_client.hgetall(PDF_TRABAJO_KEY.format(trabajo_id))
+    if not estado:
+        return None
+
+    estado['id'] = trabajo_id
+    for campo in ('creado', 'iniciado', 'terminado', 'espera_ms', 'render_ms'):
+        if estado.get(campo):
+            estado[campo] = float(estado[campo])
+    if estado.get('bytes'):
+        estado['bytes'] = int(estado['bytes'])
+    if estado.get('tiempos'):
+        estado['tiempos'] = json.loads(estado['tiempos'])
+    return {k: (v if v != '' else None) for k, v in estado.items()}
+
+def get_pdf_trabajo(trabajo_id):
+    """Obtiene los bytes del PDF de un trabajo completado (o None)"""
+    return redis_binario.get(PDF_RESULTADO_KEY.format(trabajo_id))
+
+def esperar_trabajo(trabajo_id, timeout):
+    """
+    Espera a que termine un trabajo enviado desde este proceso y regresa su
+    estado final (o el estado actual si se agotó el tiempo).
+    """
+    evento = _terminados.get(trabajo_id)
+    if evento:
+        evento.wait(timeout)
+    return get_estado_trabajo(trabajo_id)
+
+def generar_pdf(tipo, **params):
+    """
+    Encola un PDF y espera el resultado (para las rutas que responden el PDF
+    directamente). Regresa (pdf, estado); pdf es None si el trabajo no se
+    completó y estado es None si la cola estaba llena.
+    """
+    trabajo_id = enviar_trabajo(tipo, **params)
+    if not trabajo_id:
+        return None, None
+
+    # Margen para la espera en cola además del tiempo de render
+    estado = esperar_trabajo(trabajo_id, 2 * _timeout(tipo))
+    if not estado or estado['estado'] != 'completado':
+        return None, estado or {'id': trabajo_id, 'estado': 'en_cola'}
+    return get_pdf_trabajo(trabajo_id), estado
+
+def get_pdf_stats():
+    """Obtiene la profundidad de la cola y la latencia de render de este proceso"""
+    with _stats_lock:
+        stats = dict(_stats)
+        latencias = {tipo: dict(valores) for tipo, valores in _latencias.items()}
+
+    stats['pid'] = os.getpid()
+    stats['procesos'] = Config.PDF_PROCESOS
+    stats['en_cola'] = _cola.qsize() if _cola is not None and _cola_pid == os.getpid() else 0
+    stats['latencia'] = {
+        tipo: {
+            'trabajos': valores['trabajos'],
+            'espera_ms_promedio': round(valores['espera_ms'] / valores['trabajos'], 2) if valores['trabajos'] else 0,
+            'render_ms_promedio': round(valores['render_ms'] / valores['trabajos'], 2) if valores['trabajos'] else 0
+        }
+        for tipo, valores in latencias.items()
+    }
+    return stats
@@ -0,0 +1,161 @@
+import time
+
+from config import Config
+from database.redis_client import redis_binario, sumar_contadores, leer_contadores
+from utils.pdf_generator import renderizar_recibo, get_version_ticket
+
+# Caché de PDFs de recibos. Una venta no cambia después de guardarse, así que
+# el PDF queda determinado por (venta_id, versión de la configuración del
+# ticket). Los PDFs viven en Redis con un índice LRU acotado por tamaño total:
+#   recibo:pdf:{venta_id}:{version} -> bytes del PDF
+#   recibos:lru      (zset)  key -> último acceso en ms
+#   recibos:tamanos  (hash)  key -> tamaño en bytes
+#   recibos:bytes            total de bytes en caché
+RECIBO_PDF_KEY = "recibo:pdf:{}:{}"
+RECIBOS_LRU_KEY = "recibos:lru"
+RECIBOS_TAMANOS_KEY = "recibos:tamanos"
+RECIBOS_BYTES_KEY = "recibos:bytes"
+
+# Guarda el PDF y expulsa los menos usados hasta quedar bajo el límite.
+# Regresa cuántos recibos se expulsaron.
+_GUARDAR_RECIBO_LUA = """
+local anterior = tonumber(redis.call('HGET', KEYS[3], KEYS[1]) or '0')
+local tamano = string.len(ARGV[1])
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[3], KEYS[1], tamano)
+redis.call('ZADD', KEYS[2], ARGV[2], KEYS[1])
+local total = redis.call('INCRBY', KEYS[4], tamano - anterior)
+local maximo = tonumber(ARGV[3])
+local expulsados = 0
+while total > maximo do
+    local viejo = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+    if not viejo then break end
+    local t = tonumber(redis.call('HGET', KEYS[3], viejo) or '0')
+    redis.call('DEL', viejo)
+    redis.call('HDEL', KEYS[3], viejo)
+    redis.call('ZREM', KEYS[2], viejo)
+    total = redis.call('DECRBY', KEYS[4], t)
+    expulsados = expulsados + 1
+end
+return expulsados
+"""
+
+_guardar_recibo = redis_binario.register_script(_GUARDAR_RECIBO_LUA)
+
+# Contadores en Redis: la caché se consulta tanto en los workers web como en
+# los procesos de render de PDF
+RECIBOS_CACHE_STATS_KEY = "recibos:stats:cache"
+_STATS_INICIALES = {
+    'hits': 0,
+    'misses': 0,
+    'expulsados': 0,
+    'precalentados': 0,
+    'errores': 0
+}
+
+def _sumar_stats(**valores):
+    sumar_contadores(RECIBOS_CACHE_STATS_KEY, **valores)
+
+def _ahora_ms():
+    return int(time.time() * 1000)
+
+def _leer_cache(key):
+    """Lee el PDF y, si existe, lo marca como usado recientemente (una sola ida a Redis)"""
+    pipe = redis_binario.pipeline(transaction=False)
+    pipe.get(key)
+    pipe.zadd(RECIBOS_LRU_KEY, {key: _ahora_ms()}, xx=True)
+    pdf, _ = pipe.execute()
+    return pdf
+
+def _guardar_cache(key, pdf):
+    max_bytes = int(Config.RECIBOS_CACHE_MAX_MB * 1024 * 1024)
+    expulsados = _guardar_recibo(
+        keys=[key, RECIBOS_LRU_KEY, RECIBOS_TAMANOS_KEY, RECIBOS_BYTES_KEY],
+        args=[pdf, _ahora_ms(), max_bytes]
+    )
+    if expulsados:
+        _sumar_stats(expulsados=expulsados)
+
+def _key_recibo(venta_id):
+    return RECIBO_PDF_KEY.format(venta_id, get_version_ticket())
+
+def buscar_recibo(venta_id, contar=True):
+    """
+    Busca el PDF del recibo solo en la caché. Regresa (pdf, tiempos) en un
+    hit, con la etapa 'cache' en los tiempos, o (None, None). Con
+    contar=False no suma al hit/miss (la búsqueda ya se contó antes).
+    """
+    inicio = time.perf_counter()
+    try:
+        pdf = _leer_cache(_key_recibo(venta_id))
+    except Exception as e:
+        # Sin Redis se genera el recibo igual, solo que sin caché
+        print(f"Error al leer caché de recibos: {e}")
+        _sumar_stats(errores=1)
+        pdf = None
+
+    if pdf is None:
+        if contar:
+            _sumar_stats(misses=1)
+        return None, None
+
+    if contar:
+        _sumar_stats(hits=1)
+    return pdf, {'cache': round((time.perf_counter() - inicio) * 1000, 2)}
+
+def obtener_recibo(venta_id, contar=True):
+    """
+    Obtiene el PDF del recibo de una venta desde la caché o generándolo.
+    Regresa (pdf, tiempos) o (None, None) si la venta no existe.
+    """
+    from database.db import get_venta_by_id
+
+    pdf, tiempos = buscar_recibo(venta_id, contar)
+    if pdf is not None:
+        return pdf, tiempos
+
+    venta = get_venta_by_id(venta_id)
+    if not venta:
+        return None, None
+
+    pdf, tiempos = renderizar_recibo(venta)
+
+    try:
+        _guardar_cache(_key_recibo(venta_id), pdf)
+    except Exception as e:
+        print(f"Error al guardar recibo en caché: {e}")
+        _sumar_stats(errores=1)
+
+    return pdf, tiempos
+
+def precalentar_recibo(venta_id):
+    """
+    Encola la generación del recibo de una venta recién pagada para que la
+    primera descarga ya salga de la caché. No bloquea la respuesta del pago y
+    nunca falla: la venta ya quedó registrada y el recibo se puede generar al
+    descargarlo.
+    """
+    from utils.pdf_trabajos import enviar_trabajo
+
+    try:
+        if enviar_trabajo('recibo', venta_id=venta_id):
+            _sumar_stats(precalentados=1)
+    except Exception as e:
+        print(f"Error al precalentar recibo: {e}")
+
+def get_cache_recibos_stats():
+    """Obtiene las estadísticas de la caché de recibos (contadores de todos los procesos)"""
+    stats = dict(_STATS_INICIALES)
+    try:
+        stats.update(leer_contadores(RECIBOS_CACHE_STATS_KEY, _STATS_INICIALES))
+        pipe = redis_binario.pipeline(transaction=False)
+        pipe.zcard(RECIBOS_LRU_KEY)
+        pipe.get(RECIBOS_BYTES_KEY)
+        recibos, total = pipe.execute()
+        stats['recibos_en_cache'] = recibos
+        stats['bytes_en_cache'] = int(total or 0)
+    except Exception as e:
+        print(f"Error al leer estadísticas de caché de recibos: {e}")
+
+    stats['max_bytes'] = int(Config.RECIBOS_CACHE_MAX_MB * 1024 * 1024)
+    return stats
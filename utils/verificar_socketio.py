@@ -0,0 +1,106 @@
+"""
+Verifica que los eventos de SocketIO crucen entre procesos por la cola de Redis.
+
+Levanta dos workers locales, conecta un cocinero a cada uno y marca una orden
+como vista desde el segundo; el cocinero del primero debe recibir el evento.
+
+Uso (requiere Redis corriendo):
+    python -m utils.verificar_socketio
+"""
+import os
+import sys
+import time
+import uuid
+import socket
+import threading
+import subprocess
+
+import socketio
+
+from config import Config
+from database.redis_client import save_session, delete_session, save_orden, delete_orden
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _esperar_puerto(puerto, timeout=15):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(('127.0.0.1', puerto), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def _conectar(puerto, session_id):
+    """Conecta un cliente y lo une a la sala de cocineros"""
+    cliente = socketio.Client()
+    unido = threading.Event()
+    cliente.on('ordenes_actuales', lambda data: unido.set())
+    cliente.connect(f"http://127.0.0.1:{puerto}", transports=['polling'])
+    cliente.emit('join_cocinero', {'session_id': session_id})
+    if not unido.wait(10):
+        raise RuntimeError(f"El worker del puerto {puerto} no unió al cocinero a la sala")
+    return cliente
+
+def verificar():
+    """Regresa True si un evento emitido en un worker llega a un cliente de otro"""
+    if not Config.SOCKETIO_MESSAGE_QUEUE:
+        print("SOCKETIO_MESSAGE_QUEUE está vacío: no hay cola entre procesos")
+        return False
+
+    puertos = [_puerto_libre(), _puerto_libre()]
+    session_id = f"verificar-{uuid.uuid4()}"
+    orden_id = f"verificar-{uuid.uuid4().hex[:8]}"
+    save_session(session_id, {'id': 0, 'nombre': 'Verificación', 'rol': 'cocinero'})
+
+    workers = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, 'app.py'), '--puerto', str(puerto), '--worker'],
+            cwd=RAIZ,
+            stdin=subprocess.DEVNULL
+        )
+        for puerto in puertos
+    ]
+    clientes = []
+
+    try:
+        for puerto in puertos:
+            if not _esperar_puerto(puerto):
+                raise RuntimeError(f"El worker del puerto {puerto} no arrancó")
+
+        recibido = threading.Event()
+        save_orden(orden_id, {'orden_id': orden_id, 'items': [], 'total': 0, 'status': 'pendiente'})
+
+        receptor = _conectar(puertos[0], session_id)
+        receptor.on('orden_evento', lambda data: data.get('orden_id') == orden_id and data.get('tipo') == 'vista' and recibido.set())
+        emisor = _conectar(puertos[1], session_id)
+        clientes = [receptor, emisor]
+
+        # El worker 2 hace socketio.emit(..., room='cocineros'); debe llegar al cliente del worker 1
+        inicio = time.monotonic()
+        emisor.emit('marcar_orden_vista', {'orden_id': orden_id, 'session_id': session_id})
+
+        if recibido.wait(10):
+            print(f"OK: evento entregado entre procesos en {(time.monotonic() - inicio) * 1000:.0f} ms")
+            return True
+
+        print("FALLA: el evento emitido en el worker 2 no llegó al cliente del worker 1")
+        return False
+    finally:
+        for cliente in clientes:
+            cliente.disconnect()
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+        delete_session(session_id)
+        delete_orden(orden_id)
+
+if __name__ == '__main__':
+    sys.exit(0 if verificar() else 1)